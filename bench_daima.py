@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import daima
+
+# --- 打包性能基准 ---
+# 用合成的 FILE_MAPPING 测量 generate_and_zip_project 的吞吐 (MB/s) 与延迟分位数，
+# 结果写成 JSON，发布流程可据此设门槛。固定随机种子，同一台机器上重复运行结果可比。
+
+KB = 1024
+MB = 1024 * KB
+
+# 场景: (名称, 成员数, 单个成员大小)。按总数据量控制规模，避免 10 万 x 50 MB 这类无意义组合
+PROFILES = {
+    'quick': [
+        ('10x1KB', 10, 1 * KB),
+        ('1kx1KB', 1000, 1 * KB),
+        ('10x1MB', 10, 1 * MB),
+    ],
+    'full': [
+        ('10x1KB', 10, 1 * KB),
+        ('1kx1KB', 1000, 1 * KB),
+        ('1kx64KB', 1000, 64 * KB),
+        ('100kx1KB', 100000, 1 * KB),
+        ('10x1MB', 10, 1 * MB),
+        ('10x10MB', 10, 10 * MB),
+        ('2x50MB', 2, 50 * MB),
+    ],
+}
+# 选菜采样器基准：菜品数与抽样次数
+SAMPLER_DISHES = 100000
+SAMPLER_PICKS = 20000
+# 编排系统会在大量短生命周期进程中导入 daima，导入耗时（含其依赖的标准库，已有字节码缓存）不应超过该预算
+IMPORT_TIME_BUDGET_MS = 50.0
+
+COMPRESSION_MODES = ['stored', 'deflate-1', 'deflate', 'deflate-9', 'bzip2', 'lzma', 'auto']
+PATHS = ['streaming', 'temp-dir']
+
+_WORDS = ['const', 'return', 'menu', 'food', 'breakfast', 'lunch', 'dinner', 'view', 'class',
+          'template', '早餐', '午餐', '晚餐', '鸡蛋', '米饭', '番茄', '<view>', '</view>', '{', '}',
+          'import', 'export', 'default', 'function', 'this.', 'storage', 'nutrition', '\n']
+
+
+def _text_block(rng, size):
+    # 生成接近真实源码压缩率的文本：随机词序列，而非完全随机字节
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        parts.append(word)
+        length += len(word.encode('utf-8')) + 1
+    return ' '.join(parts).encode('utf-8')[:size].decode('utf-8', 'ignore')
+
+
+def synthetic_file_map(count, member_size, seed=0):
+    # 先生成一块 64 KB 的文本，再按不同偏移拼接，避免大成员的生成时间淹没被测逻辑
+    rng = random.Random(seed)
+    block = _text_block(rng, min(member_size, 64 * KB) * 2)
+    file_map = {}
+    for i in range(count):
+        offset = rng.randrange(len(block) // 2 or 1)
+        chunk = block[offset:] + block[:offset]
+        repeats = member_size // len(chunk) + 1
+        suffix = '.js' if i % 3 else '.vue'
+        file_map[f'src/gen/{i // 1000:03d}/file_{i:06d}{suffix}'] = (chunk * repeats)[:member_size]
+    return file_map
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_import_time(repeat=7):
+    # 每次在全新的解释器中计时 `import daima`，取中位数（毫秒）。
+    # 第一次运行用于生成字节码缓存，不计入结果
+    code = 'import time; t = time.perf_counter(); import daima; print(time.perf_counter() - t)'
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    cwd = os.path.dirname(os.path.abspath(daima.__file__))
+    samples = []
+    for _ in range(repeat + 1):
+        output = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output) * 1000)
+    return round(statistics.median(samples[1:]), 3)
+
+
+def synthetic_menu(count, seed=0):
+    # 与 DEFAULT_MENU 结构相同的合成菜单，菜品平均分到三个餐次
+    rng = random.Random(seed)
+    levels = ['低', '中', '高']
+    tags = [f'标签{i}' for i in range(50)]
+    menu = {'breakfast': [], 'lunch': [], 'dinner': []}
+    meals = list(menu)
+    for i in range(count):
+        menu[meals[i % 3]].append({
+            'name': f'菜品{i:06d}',
+            'materials': [f'食材{rng.randrange(500)}' for _ in range(4)],
+            'nutrition': {key: rng.choice(levels) for key in daima.MENU_NUTRITION_KEYS},
+            'tags': rng.sample(tags, 2),
+        })
+    return menu
+
+
+def _legacy_pick(dishes, recent, rng):
+    # 旧版 pickFood：每次过滤出不在最近列表中的候选，再等概率选择
+    available = [d for d in dishes if d['name'] not in recent]
+    candidates = available or dishes
+    choice = candidates[rng.randrange(len(candidates))]
+    recent.append(choice['name'])
+    if len(recent) > daima.RECENT_SIZE:
+        recent.pop(0)
+    return choice
+
+
+def measure_sampler(dishes=SAMPLER_DISHES, picks=SAMPLER_PICKS, seed=0):
+    # 比较 FoodPicker（树状数组 + 环形缓冲）与旧版逐次过滤的选菜吞吐。
+    # dishes 为三个餐次合计的菜品数，抽样依次轮流覆盖全部餐次
+    menu = synthetic_menu(dishes, seed)
+    meals = list(menu)
+    weights = {'tags': {'标签0': 5.0, '标签1': 0.0}, 'nutrition': {'calorie': {'低': 2.0}}}
+
+    started = time.perf_counter()
+    picker = daima.FoodPicker(menu, weights=weights, rng=random.Random(seed))
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(picks):
+        picker.pick(meals[i % len(meals)])
+    sampler_s = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    recent = {meal: [] for meal in meals}
+    legacy_picks = max(1, picks // 100)
+    started = time.perf_counter()
+    for i in range(legacy_picks):
+        meal = meals[i % len(meals)]
+        _legacy_pick(menu[meal], recent[meal], rng)
+    legacy_s = time.perf_counter() - started
+
+    picks_per_s = picks / sampler_s if sampler_s else None
+    legacy_per_s = legacy_picks / legacy_s if legacy_s else None
+    return {
+        'dishes': dishes,
+        'dishes_per_meal': {meal: len(menu[meal]) for meal in meals},
+        'picks': picks,
+        'build_s': round(build_s, 6),
+        'picks_per_s': round(picks_per_s, 1) if picks_per_s else None,
+        'legacy_picks_per_s': round(legacy_per_s, 1) if legacy_per_s else None,
+        'speedup': round(picks_per_s / legacy_per_s, 1) if picks_per_s and legacy_per_s else None,
+    }
+
+
+def run_case(file_map, compression, use_temp_dir, repeat, workdir):
+    summaries = []
+    zip_filename = os.path.join(workdir, 'bench.zip')
+    temp_dir = os.path.join(workdir, 'bench_tmp') if use_temp_dir else None
+
+    def collect(event):
+        if event['event'] == 'build':
+            summaries.append(event)
+
+    for _ in range(repeat):
+        daima.generate_and_zip_project(file_map, use_temp_dir=use_temp_dir,
+                                       zip_filename=zip_filename, temp_dir=temp_dir,
+                                       verbose=False, compression=compression, on_event=collect)
+
+    seconds = [s['seconds'] for s in summaries]
+    bytes_in = summaries[-1]['bytes_in']
+    median = statistics.median(seconds)
+    return {
+        'runs': repeat,
+        'bytes_in': bytes_in,
+        'bytes_out': summaries[-1]['bytes_out'],
+        'ratio': summaries[-1]['ratio'],
+        'throughput_mb_s': round(bytes_in / MB / median, 3) if median else None,
+        'latency_s': {
+            'min': round(min(seconds), 6),
+            'p50': round(median, 6),
+            'p90': round(_percentile(seconds, 90), 6),
+            'p99': round(_percentile(seconds, 99), 6),
+            'max': round(max(seconds), 6),
+        },
+        'phases_p50_s': {
+            name: round(statistics.median(s['phases'].get(name, 0.0) for s in summaries), 6)
+            for name in summaries[-1]['phases']
+        },
+        'peak_rss_kb': max((s['peak_rss_kb'] or 0) for s in summaries) or None,
+    }
+
+
+def run_benchmark(profile='quick', compressions=None, paths=None, repeat=5, seed=0,
+                  progress=None):
+    compressions = compressions or COMPRESSION_MODES
+    paths = paths or PATHS
+    results = []
+    with tempfile.TemporaryDirectory(prefix='daima_bench_') as workdir:
+        for scenario, count, member_size in PROFILES[profile]:
+            file_map = synthetic_file_map(count, member_size, seed)
+            for path in paths:
+                for compression in compressions:
+                    case = run_case(file_map, compression, path == 'temp-dir', repeat, workdir)
+                    case.update({'scenario': scenario, 'members': count,
+                                 'member_size': member_size, 'path': path,
+                                 'compression': compression})
+                    results.append(case)
+                    if progress is not None:
+                        progress(case)
+    return {
+        'profile': profile,
+        'import_time_ms': measure_import_time(),
+        'sampler': measure_sampler(seed=seed),
+        'seed': seed,
+        'repeat': repeat,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def _print_case(case):
+    print(f"{case['scenario']:>10} {case['path']:>9} {case['compression']:>9}  "
+          f"{case['throughput_mb_s'] or 0:>9.2f} MB/s  p50 {case['latency_s']['p50'] * 1000:>9.2f} ms  "
+          f"p99 {case['latency_s']['p99'] * 1000:>9.2f} ms  比例 {case['ratio']:.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='daima.py 打包性能基准')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick',
+                        help='场景规模：quick（默认，适合每次提交）或 full（含 10 万成员与 50 MB 成员）')
+    parser.add_argument('--compression', action='append', choices=COMPRESSION_MODES,
+                        help='只测指定的压缩策略，可重复；默认全部')
+    parser.add_argument('--path', action='append', choices=PATHS,
+                        help='只测指定的打包路径，可重复；默认 streaming 与 temp-dir')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的重复次数（默认 5）')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--output', default='bench_results.json', help='结果 JSON 文件路径')
+    parser.add_argument('--min-throughput', type=float, metavar='MB/S',
+                        help='任一用例吞吐低于该值时以非零状态退出，用于发布门禁')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_TIME_BUDGET_MS, metavar='MS',
+                        help=f'import daima 的耗时预算（默认 {IMPORT_TIME_BUDGET_MS:g} ms），超出时以非零状态退出')
+    parser.add_argument('--import-only', action='store_true',
+                        help='只测量 import daima 的耗时，不跑打包基准')
+    parser.add_argument('--sampler-only', action='store_true',
+                        help=f'只测量选菜采样器（三个餐次合计 {SAMPLER_DISHES} 道菜）的吞吐，不跑打包基准')
+    args = parser.parse_args(argv)
+
+    if args.sampler_only:
+        result = measure_sampler(seed=args.seed)
+        print(f"🎲 {result['dishes']} 道菜（{len(result['dishes_per_meal'])} 个餐次轮流抽）: 建树 {result['build_s'] * 1000:.1f} ms，"
+              f"{result['picks_per_s']:.0f} 次/s（旧版 {result['legacy_picks_per_s']:.0f} 次/s，"
+              f"快 {result['speedup']} 倍）")
+        return 0
+
+    if args.import_only:
+        import_ms = measure_import_time()
+        print(f"⏱️ import daima: {import_ms:.2f} ms（预算 {args.import_budget:g} ms）")
+        return 0 if import_ms <= args.import_budget else 1
+
+    report = run_benchmark(args.profile, args.compression, args.path, args.repeat, args.seed,
+                           progress=_print_case)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📊 基准结果已写入 '{args.output}'")
+
+    failed = False
+    if report['import_time_ms'] > args.import_budget:
+        print(f"❌ import daima 耗时 {report['import_time_ms']} ms，超出预算 {args.import_budget:g} ms")
+        failed = True
+    if args.min_throughput is not None:
+        slow = [c for c in report['results']
+                if (c['throughput_mb_s'] or 0) < args.min_throughput]
+        for case in slow:
+            print(f"❌ {case['scenario']} / {case['path']} / {case['compression']}: "
+                  f"{case['throughput_mb_s']} MB/s < {args.min_throughput} MB/s")
+        failed = failed or bool(slow)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
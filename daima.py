@@ -1,37 +1,724 @@
 import os
+import re
+import sys
 import json
+import zlib
+import stat
+import struct
+import hashlib
+import time
+import shutil
 import zipfile
+import functools
+import threading
+from contextlib import contextmanager
+
+# 本模块会被大量短生命周期的进程导入，只在导入时加载必需的标准库：
+# 进程池/线程池、argparse、cProfile、gzip、brotli、tempfile 等都在用到的函数里再导入，
+# 模板渲染与 package.json 的读取也推迟到首次访问（见第 2 节）
+
 
 # --- 1. 定义文件内容 ---
 
+# 1.0 模板引擎
+# 各文件内容写成模板，占位符语法为 [[name]] 或 [[name|filter]]（不会与 Vue 的 {{ }}、JS 的 ${} 冲突）。
+# 模板只解析一次并缓存；渲染时按模板实际用到的参数值做缓存，参数未变化的模板直接复用上次的渲染结果。
+_PLACEHOLDER_RE = re.compile(r'\[\[\s*(\w+)\s*(?:\|\s*(\w+)\s*)?\]\]')
+TEMPLATE_RENDER_CACHE_SIZE = 256
+
+
+def _html_escape(value):
+    import html
+    return html.escape(value)
+
+
+def _js_string(value):
+    # 用于单引号 JS 字符串内部
+    return (value.replace('\\', '\\\\').replace("'", "\\'")
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+TEMPLATE_FILTERS = {
+    'raw': str,
+    'js': lambda value: _js_string(str(value)),
+    'json': lambda value: json.dumps(str(value), ensure_ascii=False)[1:-1],
+    'html': lambda value: _html_escape(str(value)),
+}
+
+
+class CompiledTemplate:
+    __slots__ = ('literals', 'fields', 'names', '_rendered')
+
+    def __init__(self, source):
+        self.literals = []
+        self.fields = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(source):
+            name, filter_name = match.group(1), match.group(2) or 'raw'
+            if filter_name not in TEMPLATE_FILTERS:
+                raise ValueError(f'未知的模板过滤器: {filter_name}')
+            self.literals.append(source[position:match.start()])
+            self.fields.append((name, TEMPLATE_FILTERS[filter_name]))
+            position = match.end()
+        self.literals.append(source[position:])
+        self.names = tuple(sorted({name for name, _ in self.fields}))
+        self._rendered = {}
+
+    def render(self, params):
+        try:
+            key = tuple(params[name] for name in self.names)
+        except KeyError as e:
+            raise KeyError(f'模板缺少参数: {e.args[0]}') from None
+        rendered = self._rendered.get(key)
+        if rendered is not None:
+            return rendered
+
+        parts = [self.literals[0]]
+        for (name, apply_filter), literal in zip(self.fields, self.literals[1:]):
+            parts.append(apply_filter(params[name]))
+            parts.append(literal)
+        rendered = ''.join(parts)
+
+        if len(self._rendered) >= TEMPLATE_RENDER_CACHE_SIZE:
+            self._rendered.clear()
+        self._rendered[key] = rendered
+        return rendered
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(source):
+    return CompiledTemplate(source)
+
+
+def render_template(source, params):
+    return compile_template(source).render(params)
+
+
+def _js_list(values):
+    return '[' + ', '.join(f"'{_js_string(v)}'" for v in values) + ']'
+
+
+def _json_list(values):
+    return '[' + ', '.join(json.dumps(v, ensure_ascii=False) for v in values) + ']'
+
+
+def menu_to_js(menu):
+    # 把 Python 菜单数据渲染成 food.js 中 defaultMenu 的 JS 对象字面量（格式与手写版本一致）
+    lines = ['{']
+    meals = list(menu.items())
+    for index, (meal, dishes) in enumerate(meals):
+        lines.append(f'  {meal}: [')
+        for dish in dishes:
+            nutrition = ', '.join(f'{k}: {json.dumps(v, ensure_ascii=False)}'
+                                  for k, v in dish['nutrition'].items())
+            lines.append(f"    {{ name: '{_js_string(dish['name'])}', "
+                         f"materials: {_js_list(dish['materials'])}, "
+                         f"nutrition: {{ {nutrition} }}, tags: {_json_list(dish['tags'])} }},")
+        lines.append('  ],' if index < len(meals) - 1 else '  ]')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def _append_position(postings, key, position):
+    # 倒排表中的下标保持升序且不重复（同一道菜重复的标签只记一次）
+    positions = postings.setdefault(key, [])
+    if not positions or positions[-1] != position:
+        positions.append(position)
+
+
+def compile_menu_index(menu):
+    # 构建时预先为每个餐次建立索引，下标均指向该餐次列表中的位置：
+    # byName 菜名 -> 下标；tags / materials 标签、食材 -> 下标列表；
+    # nutrition 营养项 -> 等级 -> 下标列表；size 用于运行时校验索引与菜单是否对应
+    index = {}
+    for meal, dishes in menu.items():
+        by_name, tags, materials, nutrition = {}, {}, {}, {}
+        for position, dish in enumerate(dishes):
+            by_name.setdefault(dish['name'], position)
+            for tag in dish.get('tags', ()):
+                _append_position(tags, tag, position)
+            for material in dish.get('materials', ()):
+                _append_position(materials, material, position)
+            for key, level in dish.get('nutrition', {}).items():
+                _append_position(nutrition.setdefault(key, {}), level, position)
+        index[meal] = {'size': len(dishes), 'byName': by_name, 'tags': tags,
+                       'materials': materials, 'nutrition': nutrition}
+    return index
+
+
+def menu_index_to_js(index):
+    # 紧凑 JSON 即合法的 JS 字面量；U+2028/U+2029 在旧版 JS 字符串中不合法，需要转义
+    return (json.dumps(index, ensure_ascii=False, separators=(',', ':'))
+            .replace('\u2028', '\\u2028').replace('\u2029', '\\u2029'))
+
+
+def menu_template_params(menu):
+    # 由菜单数据生成 food.js 模板需要的两个参数；变体替换菜单时应使用它，保证索引与菜单一致
+    return {'default_menu': menu_to_js(menu),
+            'default_menu_index': menu_index_to_js(compile_menu_index(menu))}
+
+
+# 紧凑菜单编码：列式 + 字典编码，大菜单的分片与本地存储都用它（解码器见 food.js 的 _decodeMenu）。
+# 食材与标签共用一个按出现频率排序的字符串表，菜品中只存下标；每道菜的各项营养等级
+# 打包成一个整数（第 j 项等级下标 + 1 乘以 base ** j，0 表示缺失）；每个餐次按列存放
+MENU_COMPACT_FORMAT = 'menu-columnar'
+MENU_ENCODINGS = ('compact', 'json')
+
+
+def _by_frequency(counts):
+    # 出现越多的字符串下标越小，JSON 中的数字也越短；同频按字典序，保证输出稳定
+    return sorted(counts, key=lambda value: (-counts[value], value))
+
+
+def encode_menu_compact(menu):
+    string_counts, level_counts, keys = {}, {}, {}
+    for dishes in menu.values():
+        for dish in dishes:
+            for value in [*dish['materials'], *dish['tags']]:
+                string_counts[value] = string_counts.get(value, 0) + 1
+            for key, level in dish['nutrition'].items():
+                keys.setdefault(key, None)
+                level_counts[level] = level_counts.get(level, 0) + 1
+    strings, levels, keys = _by_frequency(string_counts), _by_frequency(level_counts), list(keys)
+    base = len(levels) + 1
+    if base ** len(keys) > 2 ** 53:
+        raise ValueError('营养项或等级过多，无法打包成 JS 安全整数')
+    string_ids = {value: i for i, value in enumerate(strings)}
+    level_ids = {level: i + 1 for i, level in enumerate(levels)}
+
+    meals = {}
+    for meal, dishes in menu.items():
+        columns = {'name': [], 'materials': [], 'materialCount': [], 'tags': [], 'tagCount': [],
+                   'nutrition': []}
+        for dish in dishes:
+            columns['name'].append(dish['name'])
+            columns['materials'].extend(string_ids[value] for value in dish['materials'])
+            columns['materialCount'].append(len(dish['materials']))
+            columns['tags'].extend(string_ids[value] for value in dish['tags'])
+            columns['tagCount'].append(len(dish['tags']))
+            nutrition = dish['nutrition']
+            columns['nutrition'].append(sum(level_ids[nutrition[key]] * base ** j
+                                            for j, key in enumerate(keys) if key in nutrition))
+        meals[meal] = columns
+    return {'format': MENU_COMPACT_FORMAT, 'version': 1, 'strings': strings, 'levels': levels,
+            'nutritionKeys': keys, 'meals': meals}
+
+
+def decode_menu_compact(payload):
+    # encode_menu_compact 的逆过程；非紧凑格式原样返回
+    if not isinstance(payload, dict) or payload.get('format') != MENU_COMPACT_FORMAT:
+        return payload
+    strings, levels, keys = payload['strings'], payload['levels'], payload['nutritionKeys']
+    base = len(levels) + 1
+    menu = {}
+    for meal, columns in payload['meals'].items():
+        materials, tags = iter(columns['materials']), iter(columns['tags'])
+        dishes = []
+        for name, material_count, tag_count, packed in zip(
+                columns['name'], columns['materialCount'], columns['tagCount'], columns['nutrition']):
+            nutrition = {}
+            for key in keys:
+                packed, level = divmod(packed, base)
+                if level:
+                    nutrition[key] = levels[level - 1]
+            dishes.append({'name': name,
+                           'materials': [strings[next(materials)] for _ in range(material_count)],
+                           'nutrition': nutrition,
+                           'tags': [strings[next(tags)] for _ in range(tag_count)]})
+        menu[meal] = dishes
+    return menu
+
+
+# 默认菜单数据 (包含详细食材和营养估算)，渲染进 src/stores/food.js 的 defaultMenu
+DEFAULT_MENU = {
+    'breakfast': [
+        {'name': '香菇鸡肉粥', 'materials': ['大米', '鸡胸肉', '干香菇', '姜', '葱花'], 'nutrition': {'calorie': '低', 'protein': '高', 'fat': '低'}, 'tags': ['清淡', '养胃']},
+        {'name': '蔬菜鸡蛋卷', 'materials': ['鸡蛋', '面粉', '生菜', '胡萝卜丝', '低脂沙拉酱'], 'nutrition': {'calorie': '中', 'protein': '中', 'fat': '低'}, 'tags': ['均衡', '快手']},
+        {'name': '全麦牛肉三明治', 'materials': ['全麦面包', '牛肉片', '芝士片', '番茄', '生菜'], 'nutrition': {'calorie': '中', 'protein': '高', 'fat': '中'}, 'tags': ['饱腹', '西方']},
+        {'name': '红薯牛奶燕麦粥', 'materials': ['红薯', '燕麦片', '纯牛奶', '少量蜂蜜'], 'nutrition': {'calorie': '中', 'protein': '中', 'fat': '低'}, 'tags': ['高纤', '健康', '素食']},
+        {'name': '豆腐脑配油条', 'materials': ['豆腐脑', '黄豆', '面粉', '油条', '榨菜'], 'nutrition': {'calorie': '高', 'protein': '中', 'fat': '高'}, 'tags': ['传统', '油炸']},
+    ],
+    'lunch': [
+        {'name': '宫保鸡丁', 'materials': ['鸡腿肉', '花生米', '干辣椒', '花椒', '黄瓜丁', '米饭'], 'nutrition': {'calorie': '高', 'protein': '高', 'fat': '中'}, 'tags': ['川菜', '下饭', '重口']},
+        {'name': '清炒虾仁配青豆玉米', 'materials': ['鲜虾', '青豆', '玉米粒', '鸡蛋清', '姜片', '米饭'], 'nutrition': {'calorie': '低', 'protein': '高', 'fat': '低'}, 'tags': ['清淡', '高蛋白', '健康']},
+        {'name': '土豆牛肉咖喱饭', 'materials': ['牛肉', '土豆', '胡萝卜', '洋葱', '咖喱块', '米饭'], 'nutrition': {'calorie': '高', 'protein': '中', 'fat': '中'}, 'tags': ['日式', '便捷']},
+        {'name': '番茄鸡蛋面', 'materials': ['挂面', '番茄', '鸡蛋', '葱花', '清汤'], 'nutrition': {'calorie': '中', 'protein': '中', 'fat': '低'}, 'tags': ['家常', '暖胃']},
+        {'name': '酸辣土豆丝', 'materials': ['土豆', '醋', '干辣椒', '花椒', '葱'], 'nutrition': {'calorie': '低', 'protein': '低', 'fat': '低'}, 'tags': ['素菜', '开胃']},
+    ],
+    'dinner': [
+        {'name': '红烧肉', 'materials': ['五花肉', '冰糖', '酱油', '八角', '桂皮', '米饭'], 'nutrition': {'calorie': '极高', 'protein': '中', 'fat': '高'}, 'tags': ['硬菜', '重口', '高热量']},
+        {'name': '蒜蓉西兰花', 'materials': ['西兰花', '大蒜', '蚝油'], 'nutrition': {'calorie': '低', 'protein': '低', 'fat': '低'}, 'tags': ['清淡', '低卡', '素食']},
+        {'name': '酸菜鱼', 'materials': ['巴沙鱼片', '酸菜', '花椒', '干辣椒', '姜片'], 'nutrition': {'calorie': '中', 'protein': '高', 'fat': '低'}, 'tags': ['川菜', '高蛋白']},
+        {'name': '麻辣小龙虾', 'materials': ['小龙虾', '花椒', '干辣椒', '啤酒', '大蒜'], 'nutrition': {'calorie': '高', 'protein': '高', 'fat': '中'}, 'tags': ['宵夜', '海鲜', '麻辣']},
+        {'name': '三文鱼牛油果沙拉', 'materials': ['三文鱼', '牛油果', '生菜', '小番茄', '柠檬汁'], 'nutrition': {'calorie': '中', 'protein': '高', 'fat': '高'}, 'tags': ['轻食', '健康', '西方']},
+    ],
+}
+
+# 模板参数的默认值；多租户/多主题变体只需覆盖其中一部分。
+# 完整的 DEFAULT_TEMPLATE_PARAMS（含渲染后的 default_menu）在首次访问时生成
+_BASE_TEMPLATE_PARAMS = {
+    'app_title': '今天吃什么',
+    'primary_color': '#ff69b4',
+    'accent_color': '#ffd1dc',
+    'background_color': '#fff7fb',
+    'breakfast_label': '早餐',
+    'lunch_label': '午餐',
+    'dinner_label': '晚餐',
+    'menu_manifest': 'null',
+    'meal_plan': 'null',
+}
+
 # 1.1 Pinia Store 文件 (src/stores/food.js) - 保持不变
-FOOD_STORE_CONTENT = """
+FOOD_STORE_TEMPLATE = """
 import { defineStore } from 'pinia'
 
 // --- 默认菜单数据 (包含详细食材和营养估算) ---
-const defaultMenu = {
-  breakfast: [
-    { name: '香菇鸡肉粥', materials: ['大米', '鸡胸肉', '干香菇', '姜', '葱花'], nutrition: { calorie: "低", protein: "高", fat: "低" }, tags: ["清淡", "养胃"] },
-    { name: '蔬菜鸡蛋卷', materials: ['鸡蛋', '面粉', '生菜', '胡萝卜丝', '低脂沙拉酱'], nutrition: { calorie: "中", protein: "中", fat: "低" }, tags: ["均衡", "快手"] },
-    { name: '全麦牛肉三明治', materials: ['全麦面包', '牛肉片', '芝士片', '番茄', '生菜'], nutrition: { calorie: "中", protein: "高", fat: "中" }, tags: ["饱腹", "西方"] },
-    { name: '红薯牛奶燕麦粥', materials: ['红薯', '燕麦片', '纯牛奶', '少量蜂蜜'], nutrition: { calorie: "中", protein: "中", fat: "低" }, tags: ["高纤", "健康", "素食"] },
-    { name: '豆腐脑配油条', materials: ['豆腐脑', '黄豆', '面粉', '油条', '榨菜'], nutrition: { calorie: "高", protein: "中", fat: "高" }, tags: ["传统", "油炸"] },
-  ],
-  lunch: [
-    { name: '宫保鸡丁', materials: ['鸡腿肉', '花生米', '干辣椒', '花椒', '黄瓜丁', '米饭'], nutrition: { calorie: "高", protein: "高", fat: "中" }, tags: ["川菜", "下饭", "重口"] },
-    { name: '清炒虾仁配青豆玉米', materials: ['鲜虾', '青豆', '玉米粒', '鸡蛋清', '姜片', '米饭'], nutrition: { calorie: "低", protein: "高", fat: "低" }, tags: ["清淡", "高蛋白", "健康"] },
-    { name: '土豆牛肉咖喱饭', materials: ['牛肉', '土豆', '胡萝卜', '洋葱', '咖喱块', '米饭'], nutrition: { calorie: "高", protein: "中", fat: "中" }, tags: ["日式", "便捷"] },
-    { name: '番茄鸡蛋面', materials: ['挂面', '番茄', '鸡蛋', '葱花', '清汤'], nutrition: { calorie: "中", protein: "中", fat: "低" }, tags: ["家常", "暖胃"] },
-    { name: '酸辣土豆丝', materials: ['土豆', '醋', '干辣椒', '花椒', '葱'], nutrition: { calorie: "低", protein: "低", fat: "低" }, tags: ["素菜", "开胃"] },
-  ],
-  dinner: [
-    { name: '红烧肉', materials: ['五花肉', '冰糖', '酱油', '八角', '桂皮', '米饭'], nutrition: { calorie: "极高", protein: "中", fat: "高" }, tags: ["硬菜", "重口", "高热量"] },
-    { name: '蒜蓉西兰花', materials: ['西兰花', '大蒜', '蚝油'], nutrition: { calorie: "低", protein: "低", fat: "低" }, tags: ["清淡", "低卡", "素食"] },
-    { name: '酸菜鱼', materials: ['巴沙鱼片', '酸菜', '花椒', '干辣椒', '姜片'], nutrition: { calorie: "中", protein: "高", fat: "低" }, tags: ["川菜", "高蛋白"] },
-    { name: '麻辣小龙虾', materials: ['小龙虾', '花椒', '干辣椒', '啤酒', '大蒜'], nutrition: { calorie: "高", protein: "高", fat: "中" }, tags: ["宵夜", "海鲜", "麻辣"] },
-    { name: '三文鱼牛油果沙拉', materials: ['三文鱼', '牛油果', '生菜', '小番茄', '柠檬汁'], nutrition: { calorie: "中", protein: "高", fat: "高" }, tags: ["轻食", "健康", "西方"] },
-  ]
-};
+const defaultMenu = [[default_menu]];
+
+// --- 预编译的菜单索引 (构建时由 daima.py 根据 defaultMenu 生成，null 表示运行时再建) ---
+// byName: 菜名 -> 下标；tags / materials: 标签、食材 -> 下标列表；nutrition: 营养项 -> 等级 -> 下标列表
+const defaultMenuIndex = [[default_menu_index]];
+
+// --- 外部菜单数据集的分片清单 (构建时由 daima.py --menu 生成，null 表示菜单全部内嵌在 defaultMenu 中) ---
+// meals: 餐次 -> { count, shards: [URL] }；某个餐次第一次用到时才并行下载它的分片。
+// 分片 URL 相对于 baseUrl（--menu-base-url，运行时可用 setMenuBaseUrl 修改）。分片文件名带内容哈希，
+// 可以长期缓存，所以每次启动都重新下载；本地只保存用户在数据集之上的改动（见 menuOverlays）
+const menuManifest = [[menu_manifest]];
+const mealLoads = {}
+// 本次运行中已下载并合并进菜单的餐次
+let loadedMeals = {}
+let menuBaseUrl = (menuManifest && menuManifest.baseUrl) || ''
+
+// --- 预先排好的每日菜单 (构建时由 daima.py --meal-plan 生成，见 meal_planner.py；null 表示没有) ---
+// start: 第一天 (YYYY-MM-DD)；dishes: 餐次 -> 计划用到的菜名；days: 餐次 -> 每天的菜名下标
+const mealPlan = [[meal_plan]];
+const DAY_MS = 24 * 60 * 60 * 1000
+
+// --- 紧凑菜单编码 (列式 + 字典编码，与 daima.py 的 encode_menu_compact 对应) ---
+// 大菜单的分片和本地存储都使用它：重复的食材、标签、营养等级只存一次，菜品中只存下标
+const MENU_COMPACT_FORMAT = 'menu-columnar'
+
+function _decodeMenu(payload) {
+  if (!payload || payload.format !== MENU_COMPACT_FORMAT) return payload
+  const { strings, levels, nutritionKeys } = payload
+  const base = levels.length + 1
+  const menu = {}
+  for (const type of Object.keys(payload.meals)) {
+    const columns = payload.meals[type]
+    const list = new Array(columns.name.length)
+    let m = 0
+    let t = 0
+    for (let i = 0; i < list.length; i++) {
+      const materials = new Array(columns.materialCount[i])
+      for (let j = 0; j < materials.length; j++) materials[j] = strings[columns.materials[m++]]
+      const tags = new Array(columns.tagCount[i])
+      for (let j = 0; j < tags.length; j++) tags[j] = strings[columns.tags[t++]]
+      const nutrition = {}
+      let packed = columns.nutrition[i]
+      for (const key of nutritionKeys) {
+        const level = packed % base
+        packed = (packed - level) / base
+        if (level) nutrition[key] = levels[level - 1]
+      }
+      list[i] = { name: columns.name[i], materials, nutrition, tags }
+    }
+    menu[type] = list
+  }
+  return menu
+}
+
+function _encodeMenu(menu) {
+  const strings = []
+  const stringIds = new Map()
+  const levels = []
+  const levelIds = new Map()
+  const nutritionKeys = []
+  const intern = (value, table, ids) => {
+    if (!ids.has(value)) {
+      ids.set(value, table.length)
+      table.push(value)
+    }
+    return ids.get(value)
+  }
+  for (const type of Object.keys(menu)) {
+    for (const dish of menu[type]) {
+      for (const key of Object.keys(dish.nutrition || {})) {
+        if (!nutritionKeys.includes(key)) nutritionKeys.push(key)
+        intern(dish.nutrition[key], levels, levelIds)
+      }
+    }
+  }
+  const base = levels.length + 1
+  const meals = {}
+  for (const type of Object.keys(menu)) {
+    const columns = { name: [], materials: [], materialCount: [], tags: [], tagCount: [], nutrition: [] }
+    for (const dish of menu[type]) {
+      const materials = dish.materials || []
+      const tags = dish.tags || []
+      const nutrition = dish.nutrition || {}
+      columns.name.push(dish.name)
+      for (const value of materials) columns.materials.push(intern(value, strings, stringIds))
+      columns.materialCount.push(materials.length)
+      for (const value of tags) columns.tags.push(intern(value, strings, stringIds))
+      columns.tagCount.push(tags.length)
+      let packed = 0
+      nutritionKeys.forEach((key, j) => {
+        if (_has(nutrition, key)) packed += (levelIds.get(nutrition[key]) + 1) * Math.pow(base, j)
+      })
+      columns.nutrition.push(packed)
+    }
+    meals[type] = columns
+  }
+  return { format: MENU_COMPACT_FORMAT, version: 1, strings, levels, nutritionKeys, meals }
+}
+
+// 设置分片 URL 的基地址（CDN 或 H5 站点地址）。小程序 / App 中没有页面地址，相对 URL 无法请求，必须设置
+export function setMenuBaseUrl(url) {
+  menuBaseUrl = url || ''
+}
+
+function _isAbsoluteUrl(url) {
+  return url.startsWith('//') || /^[a-z][a-z0-9+.-]*:/i.test(url)
+}
+
+function _resolveUrl(url) {
+  if (_isAbsoluteUrl(url) || !menuBaseUrl) return url
+  return `${menuBaseUrl.replace(/\\/+$/, '')}/${url.replace(/^\\/+/, '')}`
+}
+
+function _fetchJson(path) {
+  const url = _resolveUrl(path)
+  if (typeof fetch !== 'undefined') {
+    return fetch(url).then(res => {
+      if (!res.ok) throw new Error(`${url}: HTTP ${res.status}`)
+      return res.json()
+    })
+  }
+  if (!_isAbsoluteUrl(url)) {
+    return Promise.reject(new Error(`${url}: 请先用 setMenuBaseUrl 或 --menu-base-url 设置分片地址`))
+  }
+  return new Promise((resolve, reject) => {
+    uni.request({ url, success: res => resolve(res.data), fail: reject })
+  })
+}
+
+function _has(obj, key) {
+  return Object.prototype.hasOwnProperty.call(obj, key)
+}
+
+function _appendPosition(postings, key, position) {
+  if (!_has(postings, key)) {
+    postings[key] = []
+  }
+  const positions = postings[key]
+  if (!positions.length || positions[positions.length - 1] !== position) {
+    positions.push(position)
+  }
+}
+
+function _indexDish(index, dish, position) {
+  if (!_has(index.byName, dish.name)) {
+    index.byName[dish.name] = position
+  }
+  for (const tag of dish.tags || []) _appendPosition(index.tags, tag, position)
+  for (const material of dish.materials || []) _appendPosition(index.materials, material, position)
+  const nutrition = dish.nutrition || {}
+  for (const key of Object.keys(nutrition)) {
+    if (!_has(index.nutrition, key)) {
+      index.nutrition[key] = {}
+    }
+    _appendPosition(index.nutrition[key], nutrition[key], position)
+  }
+  index.size = position + 1
+}
+
+function _buildMealIndex(list) {
+  const index = { size: 0, byName: {}, tags: {}, materials: {}, nutrition: {} }
+  list.forEach((dish, position) => _indexDish(index, dish, position))
+  return index
+}
+
+// 在升序数组 list 中从 from 开始找第一个 >= value 的位置：先按 1、2、4… 的步长向前跳，再在最后一步内二分
+function _gallop(list, value, from) {
+  let high = from
+  let step = 1
+  while (high < list.length && list[high] < value) {
+    from = high + 1
+    high += step
+    step *= 2
+  }
+  high = Math.min(high, list.length)
+  while (from < high) {
+    const middle = (from + high) >> 1
+    if (list[middle] < value) {
+      from = middle + 1
+    } else {
+      high = middle
+    }
+  }
+  return from
+}
+
+// 按 { tag, material, nutrition: { calorie: '低' } } 取候选下标（升序）：
+// 倒排表都是升序的，逐个取最短表中的下标，在其他表中从上次的位置向前跳跃查找（不建 Set）。
+// 最短表长为 k 时耗时 O(k log(n / k))，不会按较长的表线性扫描
+function _filterPositions(index, filter) {
+  const postings = []
+  if (filter.tag) postings.push(index.tags[filter.tag] || [])
+  if (filter.material) postings.push(index.materials[filter.material] || [])
+  const nutrition = filter.nutrition || {}
+  for (const key of Object.keys(nutrition)) {
+    const buckets = index.nutrition[key] || {}
+    postings.push(buckets[nutrition[key]] || [])
+  }
+  if (!postings.length) return null
+  postings.sort((a, b) => a.length - b.length)
+  const cursors = new Array(postings.length).fill(0)
+  const result = []
+  for (const position of postings[0]) {
+    let matched = true
+    for (let j = 1; j < postings.length; j++) {
+      const list = postings[j]
+      cursors[j] = _gallop(list, position, cursors[j])
+      // 某个表已经走完，之后不会再有交集
+      if (cursors[j] === list.length) return result
+      if (list[cursors[j]] !== position) {
+        matched = false
+        break
+      }
+    }
+    if (matched) result.push(position)
+  }
+  return result
+}
+
+// --- 加权随机选菜 (与 daima.py 中的 FenwickSampler / FoodPicker 逐步对应) ---
+// 每个餐次一棵树状数组（Fenwick tree）：按权重抽样、修改单道菜的权重都是 O(log n)，抽样不分配内存；
+// 菜单会增删，别名表每次变动都要 O(n) 重建，因此不用。
+// 最近 RECENT_SIZE 次选中的菜记在环形缓冲区里，期间它们在树中的权重为 0，被挤出时恢复
+const RECENT_SIZE = 3
+
+class _Sampler {
+  constructor(list, index, weightOf) {
+    this.list = list
+    this.index = index
+    this.size = list.length
+    this.capacity = Math.max(16, list.length + (list.length >> 1))
+    this.topStep = 1
+    while (this.topStep * 2 <= this.capacity) this.topStep *= 2
+    this.weights = new Float64Array(this.capacity)
+    this.tree = new Float64Array(this.capacity + 1)
+    for (let i = 0; i < this.size; i++) {
+      this.weights[i] = weightOf(list[i])
+      this.tree[i + 1] = this.weights[i]
+    }
+    // O(n) 建树：每个节点把自己的和加到父节点上
+    for (let i = 1; i <= this.capacity; i++) {
+      const parent = i + (i & -i)
+      if (parent <= this.capacity) this.tree[parent] += this.tree[i]
+    }
+  }
+
+  _add(position, delta) {
+    for (let i = position + 1; i <= this.capacity; i += i & -i) this.tree[i] += delta
+  }
+
+  set(position, weight) {
+    this._add(position, weight - this.weights[position])
+    this.weights[position] = weight
+  }
+
+  // 容量已满时返回 false，由调用方重建
+  push(weight) {
+    if (this.size === this.capacity) return false
+    this.weights[this.size] = weight
+    this._add(this.size, weight)
+    this.size++
+    return true
+  }
+
+  total() {
+    let sum = 0
+    for (let i = this.capacity; i > 0; i -= i & -i) sum += this.tree[i]
+    return sum
+  }
+
+  // random ∈ [0, 1)；返回按权重抽中的下标，总权重为 0 时返回 -1
+  sample(random) {
+    const total = this.total()
+    if (!(total > 0)) return -1
+    let target = random * total
+    let position = 0
+    for (let step = this.topStep; step > 0; step >>= 1) {
+      const next = position + step
+      if (next <= this.capacity && this.tree[next] <= target) {
+        position = next
+        target -= this.tree[next]
+      }
+    }
+    // 浮点误差可能让结果落在权重为 0 的位置上，就近找一个有效位置
+    while (position < this.size && this.weights[position] <= 0) position++
+    if (position >= this.size) {
+      position = this.size - 1
+      while (position >= 0 && this.weights[position] <= 0) position--
+    }
+    return position
+  }
+}
+
+// 选菜偏好：{ tags: { 川菜: 2 }, materials: { 香菜: 0 }, nutrition: { calorie: { 低: 3 } } }，
+// 一道菜的权重为所有命中的系数之积（默认 1，系数为 0 表示不再选到）
+let pickWeights = null
+let samplers = {}
+const recentRing = new Array(RECENT_SIZE)
+const recentCounts = new Map()
+let recentStart = 0
+let recentCount = 0
+
+function _dishWeight(dish) {
+  if (!pickWeights) return 1
+  let weight = 1
+  const { tags, materials, nutrition } = pickWeights
+  if (tags) {
+    for (const tag of dish.tags || []) if (_has(tags, tag)) weight *= tags[tag]
+  }
+  if (materials) {
+    for (const material of dish.materials || []) if (_has(materials, material)) weight *= materials[material]
+  }
+  if (nutrition && dish.nutrition) {
+    for (const key of Object.keys(nutrition)) {
+      const level = dish.nutrition[key]
+      if (level !== undefined && _has(nutrition[key], level)) weight *= nutrition[key][level]
+    }
+  }
+  return weight
+}
+
+function _effectiveWeight(dish) {
+  return recentCounts.has(dish.name) ? 0 : _dishWeight(dish)
+}
+
+// 某道菜进入 / 离开最近列表时，同步所有已建好的餐次采样器中同名菜的权重
+function _setRecentWeight(name, recent) {
+  for (const type of Object.keys(samplers)) {
+    const sampler = samplers[type]
+    if (!_has(sampler.index.byName, name)) continue
+    const position = sampler.index.byName[name]
+    if (position < sampler.size) {
+      sampler.set(position, recent ? 0 : _dishWeight(sampler.list[position]))
+    }
+  }
+}
+
+function _pushRecent(name) {
+  if (recentCount === RECENT_SIZE) {
+    const evicted = recentRing[recentStart]
+    recentRing[recentStart] = undefined
+    recentStart = (recentStart + 1) % RECENT_SIZE
+    recentCount--
+    const left = recentCounts.get(evicted) - 1
+    if (left) {
+      recentCounts.set(evicted, left)
+    } else {
+      recentCounts.delete(evicted)
+      _setRecentWeight(evicted, false)
+    }
+  }
+  recentRing[(recentStart + recentCount) % RECENT_SIZE] = name
+  recentCount++
+  recentCounts.set(name, (recentCounts.get(name) || 0) + 1)
+  if (recentCounts.get(name) === 1) _setRecentWeight(name, true)
+}
+
+function _clearRecent() {
+  const names = Array.from(recentCounts.keys())
+  recentRing.fill(undefined)
+  recentCounts.clear()
+  recentStart = 0
+  recentCount = 0
+  names.forEach(name => _setRecentWeight(name, false))
+}
+
+// --- 买菜清单 (与 daima.py 中的 ShoppingList 对应) ---
+// 倒排索引：规范化后的食材名 -> { 出现次数, 菜名 -> 次数 }。加入或移除一道菜只处理这道菜自己的食材，
+// 不重新扫描已加入的菜；同一道菜可以加入多次（例如一周内吃两次），同一道菜里重复的食材只算一次
+const QUANTITY_PREFIXES = ['少量', '适量', '少许', '若干']
+
+function _normalizeMaterial(name) {
+  let key = String(name)
+  if (key.normalize) key = key.normalize('NFKC')
+  key = key.replace(/\\s+/g, ' ').trim().toLowerCase()
+  for (const prefix of QUANTITY_PREFIXES) {
+    if (key.length > prefix.length && key.startsWith(prefix)) {
+      key = key.slice(prefix.length).trim()
+      break
+    }
+  }
+  return key
+}
+
+class _ShoppingList {
+  constructor() {
+    this.items = new Map()
+    // 菜名 -> { keys: 加入时的规范化食材, times }；移除时按加入时的食材回退，菜品之后被修改也不受影响
+    this.dishes = new Map()
+    this.dishCount = 0
+  }
+
+  add(dish) {
+    let entry = this.dishes.get(dish.name)
+    if (!entry) {
+      const keys = new Set()
+      for (const material of dish.materials || []) {
+        const key = _normalizeMaterial(material)
+        if (key) keys.add(key)
+      }
+      entry = { keys: Array.from(keys), times: 0 }
+      this.dishes.set(dish.name, entry)
+    }
+    entry.times++
+    this.dishCount++
+    for (const key of entry.keys) {
+      let item = this.items.get(key)
+      if (!item) {
+        item = { name: key, count: 0, dishes: new Map() }
+        this.items.set(key, item)
+      }
+      item.count++
+      item.dishes.set(dish.name, (item.dishes.get(dish.name) || 0) + 1)
+    }
+  }
+
+  // 移除一次；没有加入过这道菜时返回 false
+  remove(name) {
+    const entry = this.dishes.get(name)
+    if (!entry) return false
+    for (const key of entry.keys) {
+      const item = this.items.get(key)
+      item.count--
+      const times = item.dishes.get(name) - 1
+      if (times) {
+        item.dishes.set(name, times)
+      } else {
+        item.dishes.delete(name)
+      }
+      if (!item.count) this.items.delete(key)
+    }
+    entry.times--
+    this.dishCount--
+    if (!entry.times) this.dishes.delete(name)
+    return true
+  }
+
+  // [{ name, count, dishes: [菜名] }]，按出现次数从多到少，同次数按名称排序
+  list() {
+    return Array.from(this.items.values(), item => ({
+      name: item.name, count: item.count, dishes: Array.from(item.dishes.keys()),
+    })).sort((a, b) => b.count - a.count || (a.name < b.name ? -1 : a.name > b.name ? 1 : 0))
+  }
+}
+
+let shopping = new _ShoppingList()
 
 // --- 跨平台存储工具 (用于数据持久化，确保用户添加的菜单不丢失) ---
 const storage = {
@@ -58,82 +745,499 @@ const storage = {
   }
 }
 
-function _saveMenuToStorage(menu) {
-  storage.setItem('user-menu-data', menu);
+// --- 写回式菜单持久化 ---
+// 每个餐次单独存一个键（user-menu-data:<餐次>），user-menu-data 本身只记录有哪些餐次。
+// 修改菜单只标记对应餐次为脏，最多 MENU_SAVE_DELAY 毫秒后统一写入一次，且只序列化脏的餐次；
+// 页面隐藏 / 应用切到后台时立即写入（见文件末尾与 App.vue 的 onHide）。
+// 来自外部数据集的餐次不保存整份列表（十万级菜品会超出单键与总容量上限），只保存改动：
+// menuOverlays: 餐次 -> { added: 菜名 -> 用户新加的菜, removed: 用户删掉的数据集菜名 }，下载分片后据此还原
+const MENU_KEY = 'user-menu-data'
+const MENU_SPLIT_FORMAT = 'menu-split'
+const MENU_OVERLAY_FORMAT = 'menu-overlay'
+const MENU_LOADED_KEY = 'user-menu-loaded'
+const MENU_SAVE_DELAY = 300
+const dirtyMeals = new Set()
+const menuOverlays = {}
+let pendingMenu = null
+let saveTimer = null
+
+function _isDatasetMeal(type) {
+  return !!(menuManifest && menuManifest.meals[type] && menuManifest.meals[type].count)
+}
+
+function _mealOverlay(type) {
+  if (!menuOverlays[type]) menuOverlays[type] = { added: new Map(), removed: new Set() }
+  return menuOverlays[type]
+}
+
+// 旧版本把下载过的数据集餐次整份存在本地（并在 user-menu-loaded 中记录）；这份列表先全部当作用户的菜，
+// 下载分片后再换算成改动（见 ensureMeal）。换算之前不覆盖旧的存储
+const legacyLoaded = (() => {
+  const stored = JSON.parse(storage.getItem(MENU_LOADED_KEY) || 'null')
+  return (menuManifest && stored && stored.version === menuManifest.version && stored.meals) || {}
+})()
+
+function _adoptLegacyMeal(type, list) {
+  const overlay = _mealOverlay(type)
+  list.forEach(dish => overlay.added.set(dish.name, dish))
+  overlay.legacy = !!legacyLoaded[type]
+  if (!overlay.legacy) dirtyMeals.add(type)
+}
+
+function _loadMenuFromStorage() {
+  const stored = JSON.parse(storage.getItem(MENU_KEY) || 'null')
+  if (!stored || stored.format !== MENU_SPLIT_FORMAT) {
+    // 旧版本把整个菜单（对象或紧凑编码）存在一个键里；下次写入时整体迁移为按餐次存储
+    const menu = _decodeMenu(stored)
+    if (menu) {
+      for (const type of Object.keys(menu)) {
+        if (_isDatasetMeal(type)) {
+          _adoptLegacyMeal(type, menu[type])
+        } else {
+          dirtyMeals.add(type)
+        }
+      }
+    }
+    return { menu, meals: [] }
+  }
+  const menu = {}
+  for (const type of stored.meals) {
+    const saved = JSON.parse(storage.getItem(`${MENU_KEY}:${type}`) || 'null')
+    if (saved && saved.format === MENU_OVERLAY_FORMAT) {
+      const added = _decodeMenu(saved.added)[type] || []
+      menuOverlays[type] = { added: new Map(added.map(dish => [dish.name, dish])), removed: new Set(saved.removed) }
+      menu[type] = added
+    } else {
+      const meal = _decodeMenu(saved)
+      menu[type] = (meal && meal[type]) || []
+      if (_isDatasetMeal(type)) _adoptLegacyMeal(type, menu[type])
+    }
+  }
+  return { menu, meals: stored.meals }
+}
+
+const loadedStorage = _loadMenuFromStorage()
+let persistedMeals = loadedStorage.meals
+
+function _mealRecord(type, list) {
+  const overlay = menuOverlays[type]
+  if (!_isDatasetMeal(type) || (overlay && overlay.legacy)) {
+    return _encodeMenu({ [type]: list })
+  }
+  const { added, removed } = overlay || { added: new Map(), removed: new Set() }
+  return {
+    format: MENU_OVERLAY_FORMAT,
+    added: _encodeMenu({ [type]: Array.from(added.values()) }),
+    removed: Array.from(removed),
+  }
+}
+
+function _flushMenu() {
+  if (!pendingMenu || !dirtyMeals.size) return
+  const meals = Object.keys(pendingMenu)
+  // 还没有单独存过的餐次也要写入，否则索引里列出的餐次下次启动会读成空列表
+  meals.forEach(type => { if (!persistedMeals.includes(type)) dirtyMeals.add(type) })
+  for (const type of dirtyMeals) {
+    if (pendingMenu[type]) {
+      storage.setItem(`${MENU_KEY}:${type}`, _mealRecord(type, pendingMenu[type]))
+    }
+  }
+  for (const type of persistedMeals) {
+    if (!meals.includes(type)) storage.removeItem(`${MENU_KEY}:${type}`)
+  }
+  storage.setItem(MENU_KEY, { format: MENU_SPLIT_FORMAT, meals })
+  if (Object.keys(legacyLoaded).length && !Object.values(menuOverlays).some(overlay => overlay.legacy)) {
+    storage.removeItem(MENU_LOADED_KEY)
+    Object.keys(legacyLoaded).forEach(type => delete legacyLoaded[type])
+  }
+  persistedMeals = meals
+  dirtyMeals.clear()
+}
+
+// 把菜单与历史记录中尚未写入的修改落盘（名称沿用，App.vue 的 onHide 依赖它）
+export function flushMenuStorage() {
+  if (saveTimer !== null) {
+    clearTimeout(saveTimer)
+    saveTimer = null
+  }
+  try {
+    _flushHistory()
+    _flushMenu()
+  } catch (err) {
+    // 超出存储上限等写入失败时保留脏标记与未写入的日志：修改仍在内存中，下一次写入时重试
+    console.error('保存菜单失败', err)
+  }
+}
+
+function _scheduleFlush() {
+  if (saveTimer === null) {
+    saveTimer = setTimeout(flushMenuStorage, MENU_SAVE_DELAY)
+  }
+}
+
+// types 省略时表示所有餐次都已改变（例如重置菜单）
+function _saveMenuToStorage(menu, types) {
+  pendingMenu = menu
+  for (const type of types || Object.keys(menu)) dirtyMeals.add(type)
+  _scheduleFlush()
+}
+
+const storedMenu = loadedStorage.menu;
+
+// --- 有界历史记录 ---
+// historyEntries: 菜名 -> 最后一次选中的时间（毫秒），按最后选中时间从旧到新排列，兼作 Set 索引，
+// 判断是否吃过为 O(1)；超过 HISTORY_CAPACITY 条时淘汰最旧的，超过 HISTORY_TTL 的自动过期。
+// 持久化只追加：选菜记录先放在 pendingHistory 中，随菜单一起延迟写入（见 flushMenuStorage），
+// 每次写入一个独立的小键 today-food-history:<序号>，内容为这段时间的 [[菜名, 时间]...]；
+// 累积 HISTORY_COMPACT_EVERY 个小键后合并进快照 today-food-history 并删除它们，写入量与使用时长无关
+const HISTORY_KEY = 'today-food-history'
+const HISTORY_FORMAT = 'history-log'
+const HISTORY_CAPACITY = 500
+const HISTORY_TTL = 30 * 24 * 3600 * 1000
+const HISTORY_COMPACT_EVERY = 50
+const historyEntries = new Map()
+const pendingHistory = []
+let historyBase = 0
+let historyNext = 0
+
+function _touchHistory(name, at) {
+  historyEntries.delete(name)
+  historyEntries.set(name, at)
+}
+
+function _evictHistory(now) {
+  for (const [name, at] of historyEntries) {
+    if (historyEntries.size <= HISTORY_CAPACITY && now - at <= HISTORY_TTL) break
+    historyEntries.delete(name)
+  }
+}
+
+function _loadHistory() {
+  const stored = JSON.parse(storage.getItem(HISTORY_KEY) || 'null')
+  const now = Date.now()
+  const legacy = Array.isArray(stored)
+  if (legacy) {
+    // 旧版本只保存了菜名数组，没有时间，按现在计
+    stored.forEach(name => _touchHistory(name, now))
+  } else if (stored && stored.format === HISTORY_FORMAT) {
+    stored.entries.forEach(([name, at]) => _touchHistory(name, at))
+    historyBase = historyNext = stored.base
+  }
+  // 回放快照之后追加的日志；早期版本每个小键只有一条 [菜名, 时间]
+  for (;;) {
+    const entry = JSON.parse(storage.getItem(`${HISTORY_KEY}:${historyNext}`) || 'null')
+    if (!entry) break
+    const entries = Array.isArray(entry[0]) ? entry : [entry]
+    entries.forEach(([name, at]) => _touchHistory(name, at))
+    historyNext++
+  }
+  _evictHistory(now)
+  // 旧格式立即转存为快照，记下补上的时间，否则每次启动都会重新按现在计，永远不会过期
+  if (legacy) _compactHistory()
+}
+
+function _compactHistory() {
+  // 先写入新快照再删除日志；中途中断时残留的旧日志序号小于 base，不会被重复回放
+  storage.setItem(HISTORY_KEY, { format: HISTORY_FORMAT, base: historyNext, entries: Array.from(historyEntries) })
+  for (let seq = historyBase; seq < historyNext; seq++) storage.removeItem(`${HISTORY_KEY}:${seq}`)
+  historyBase = historyNext
+}
+
+function _flushHistory() {
+  if (!pendingHistory.length) return
+  storage.setItem(`${HISTORY_KEY}:${historyNext}`, pendingHistory)
+  pendingHistory.length = 0
+  historyNext++
+  if (historyNext - historyBase >= HISTORY_COMPACT_EVERY) _compactHistory()
+}
+
+function _appendHistory(name, at) {
+  _touchHistory(name, at)
+  _evictHistory(at)
+  pendingHistory.push([name, at])
+  _scheduleFlush()
+}
+
+function _clearHistoryStorage() {
+  pendingHistory.length = 0
+  for (let seq = historyBase; seq < historyNext; seq++) storage.removeItem(`${HISTORY_KEY}:${seq}`)
+  storage.removeItem(HISTORY_KEY)
+  historyEntries.clear()
+  historyBase = historyNext = 0
 }
 
-const storedMenu = JSON.parse(storage.getItem('user-menu-data') || 'null');
+_loadHistory()
+
+// 索引不放进 state：它是派生数据，不需要响应式，也不需要持久化。
+// 使用默认菜单时直接沿用预编译索引，用户菜单则在首次用到某个餐次时再建
+let menuIndex = (!storedMenu && defaultMenuIndex) || {}
 
 // --- Pinia Store 定义 ---
 export const useFoodStore = defineStore('food', {
   state: () => ({
-    menu: storedMenu || defaultMenu, 
-    history: JSON.parse(storage.getItem('today-food-history') || '[]'),
-    recentHistory: [] 
+    // 使用副本，避免修改菜单时改动 defaultMenu 本身（resetMenu 依赖它保持初始值）
+    menu: storedMenu || JSON.parse(JSON.stringify(defaultMenu)),
+    // 历史条目本身在 historyEntries 中（不需要响应式），界面只用到条数
+    historySize: historyEntries.size,
+    // 买菜清单中的菜品数（清单本身在 shopping 中）
+    shoppingDishes: 0,
   }),
 
   actions: {
-    pickFood(currentType) {
-      const list = this.menu[currentType]
-      const available = list.filter(f => !this.recentHistory.includes(f.name))
-      const candidates = available.length ? available : list
-      const choice = candidates[Math.floor(Math.random() * candidates.length)]
-
-      this.recentHistory.push(choice.name)
-      if (this.recentHistory.length > 3) {
-        this.recentHistory.shift()
+    // 取某个餐次的索引；还没有索引或与菜单长度对不上时按当前菜单重建
+    mealIndex(type) {
+      const list = this.menu[type] || []
+      let index = menuIndex[type]
+      if (!index || index.size !== list.length) {
+        index = _buildMealIndex(list)
+        menuIndex[type] = index
+      }
+      return index
+    },
+
+    // 按需加载外部数据集中某个餐次的分片；没有数据集或该餐次已加载过时立即完成
+    ensureMeal(type) {
+      const meal = menuManifest && menuManifest.meals[type]
+      if (!meal || !meal.count || loadedMeals[type]) {
+        return Promise.resolve()
+      }
+      if (!mealLoads[type]) {
+        mealLoads[type] = Promise.all(meal.shards.map(_fetchJson)).then(shards => {
+          const loaded = [].concat(...shards.map(shard => Array.isArray(shard) ? shard : _decodeMenu(shard)[type]))
+          const names = new Set(loaded.map(dish => dish.name))
+          const current = this.menu[type] || []
+          const overlay = _mealOverlay(type)
+          let changed = false
+          if (overlay.legacy) {
+            // 旧版本存下的整份列表：其中没有的数据集菜就是用户删掉的，其余同名的菜来自数据集
+            const kept = new Set(current.map(dish => dish.name))
+            loaded.forEach(dish => { if (!kept.has(dish.name)) overlay.removed.add(dish.name) })
+            overlay.legacy = false
+            changed = true
+          }
+          // 用户新加的菜保留在后面；同名时以数据集为准，除非用户删掉了数据集中的那道再重新加入
+          for (const name of overlay.added.keys()) {
+            if (names.has(name) && !overlay.removed.has(name)) {
+              overlay.added.delete(name)
+              changed = true
+            }
+          }
+          this.menu[type] = loaded.filter(dish => !overlay.removed.has(dish.name))
+            .concat(current.filter(dish => overlay.added.has(dish.name) || !names.has(dish.name)))
+          loadedMeals[type] = true
+          // 旧索引对应加载前的列表，长度可能恰好相同，不能靠 mealIndex 的长度检查发现
+          delete menuIndex[type]
+          // 加载本身不触发写入；只有改动记录变了（例如迁移旧格式）才保存
+          if (changed) _saveMenuToStorage(this.menu, [type])
+        }, err => {
+          delete mealLoads[type]
+          throw err
+        })
+      }
+      return mealLoads[type]
+    },
+
+    // 取某个餐次的采样器：菜单被替换、删菜重建索引后整体重建，新增的菜增量追加
+    mealSampler(type) {
+      const list = this.menu[type] || []
+      const index = this.mealIndex(type)
+      let sampler = samplers[type]
+      if (!sampler || sampler.list !== list || sampler.index !== index || sampler.size > list.length) {
+        sampler = new _Sampler(list, index, _effectiveWeight)
+        samplers[type] = sampler
       }
+      while (sampler.size < list.length) {
+        if (!sampler.push(_effectiveWeight(list[sampler.size]))) {
+          sampler = new _Sampler(list, index, _effectiveWeight)
+          samplers[type] = sampler
+        }
+      }
+      return sampler
+    },
+
+    // 设置选菜偏好（格式见 pickWeights），传 null 恢复等概率
+    setPickWeights(weights) {
+      pickWeights = weights || null
+      samplers = {}
+    },
+
+    findFood(type, name) {
+      const index = this.mealIndex(type)
+      return _has(index.byName, name) ? this.menu[type][index.byName[name]] : null
+    },
+
+    // 计划中某天（默认今天）某个餐次的菜；没有计划、超出计划范围或这道菜已从菜单删除时返回 null
+    plannedFood(type, date = new Date()) {
+      if (!mealPlan || !mealPlan.days[type]) return null
+      const day = Math.floor((Date.UTC(date.getFullYear(), date.getMonth(), date.getDate()) - Date.parse(mealPlan.start)) / DAY_MS)
+      const slot = day >= 0 ? mealPlan.days[type][day] : undefined
+      return slot === undefined ? null : this.findFood(type, mealPlan.dishes[type][slot])
+    },
+
+    // filter 可选：{ tag, material, nutrition: { calorie: '低' } }，没有符合条件的菜时返回 null
+    pickFood(currentType, filter) {
+      const list = this.menu[currentType] || []
+      const sampler = this.mealSampler(currentType)
+      const pool = filter ? _filterPositions(sampler.index, filter) : null
+      const size = pool ? pool.length : list.length
+      if (!size) return null
 
-      if (!this.history.includes(choice.name)) {
-        this.history.push(choice.name)
-        storage.setItem('today-food-history', this.history)
+      let position = -1
+      if (!pool) {
+        position = sampler.sample(Math.random())
+      } else {
+        // 带条件时只在命中的 k 道菜里按权重抽：O(k)
+        let total = 0
+        for (const p of pool) total += sampler.weights[p]
+        let target = Math.random() * total
+        for (const p of pool) {
+          const weight = sampler.weights[p]
+          if (weight > 0) {
+            position = p
+            target -= weight
+            if (target < 0) break
+          }
+        }
       }
+      // 候选都在最近列表里（或权重都为 0）时，退回到在全部候选中等概率选择
+      if (position === -1) {
+        const slot = Math.floor(Math.random() * size)
+        position = pool ? pool[slot] : slot
+      }
+      const choice = list[position]
+      _pushRecent(choice.name)
+
+      _appendHistory(choice.name, Date.now())
+      this.historySize = historyEntries.size
       return choice
     },
+
+    addToShoppingList(dish) {
+      shopping.add(dish)
+      this.shoppingDishes = shopping.dishCount
+    },
+
+    removeFromShoppingList(name) {
+      const removed = shopping.remove(name)
+      this.shoppingDishes = shopping.dishCount
+      return removed
+    },
+
+    shoppingItems() {
+      return shopping.list()
+    },
+
+    clearShoppingList() {
+      shopping = new _ShoppingList()
+      this.shoppingDishes = 0
+    },
+
+    hasEaten(name) {
+      _evictHistory(Date.now())
+      this.historySize = historyEntries.size
+      return historyEntries.has(name)
+    },
+
+    // 最近吃过的菜，最新的在前：[{ name, at }]
+    historyList(limit = HISTORY_CAPACITY) {
+      _evictHistory(Date.now())
+      this.historySize = historyEntries.size
+      const entries = Array.from(historyEntries, ([name, at]) => ({ name, at }))
+      return entries.reverse().slice(0, limit)
+    },
     
     clearHistory() {
       // 尽管历史记录不显示了，但清空逻辑和存储仍然保留，以防将来需要
-      this.history = []
-      this.recentHistory = []
-      storage.removeItem('today-food-history')
+      _clearHistoryStorage()
+      this.historySize = 0
+      _clearRecent()
     },
     
     addFoodItem(type, name, materials, nutrition, tags) {
       if (!this.menu[type]) {
         this.menu[type] = [];
       }
-      if (this.menu[type].some(item => item.name === name)) {
+      const mealIndex = this.mealIndex(type);
+      if (_has(mealIndex.byName, name)) {
         console.warn(`${name} 已经存在于 ${type} 菜单中`);
         return;
       }
 
-      this.menu[type].push({ name, materials, nutrition, tags });
-      _saveMenuToStorage(this.menu);
+      const dish = { name, materials, nutrition, tags };
+      this.menu[type].push(dish);
+      _indexDish(mealIndex, dish, this.menu[type].length - 1);
+      if (_isDatasetMeal(type)) _mealOverlay(type).added.set(name, dish);
+      _saveMenuToStorage(this.menu, [type]);
     },
 
-    removeFoodItem(type, name) {
-      if (this.menu[type]) {
-        const index = this.menu[type].findIndex(item => item.name === name);
-        if (index !== -1) {
-          this.menu[type].splice(index, 1);
-          _saveMenuToStorage(this.menu);
-        }
+    // 批量导入 [{ name, materials, nutrition, tags }]：逐条去重后一次性追加，只触发一次写入；返回实际新增数
+    addFoodItems(type, dishes) {
+      if (!this.menu[type]) {
+        this.menu[type] = [];
       }
-    },
+      const mealIndex = this.mealIndex(type);
+      const added = [];
+      for (const { name, materials, nutrition, tags } of dishes) {
+        if (_has(mealIndex.byName, name)) continue;
+        const dish = { name, materials, nutrition, tags };
+        added.push(dish);
+        _indexDish(mealIndex, dish, this.menu[type].length + added.length - 1);
+        if (_isDatasetMeal(type)) _mealOverlay(type).added.set(name, dish);
+      }
+      if (added.length) {
+        this.menu[type].push(...added);
+        _saveMenuToStorage(this.menu, [type]);
+      }
+      return added.length;
+    },
+
+    removeFoodItem(type, name) {
+      if (this.menu[type]) {
+        const mealIndex = this.mealIndex(type);
+        if (_has(mealIndex.byName, name)) {
+          if (_isDatasetMeal(type)) {
+            const overlay = _mealOverlay(type);
+            if (!overlay.added.delete(name)) overlay.removed.add(name);
+          }
+          this.menu[type].splice(mealIndex.byName[name], 1);
+          // 删除后其后的下标整体前移，重建该餐次的索引（删除是低频操作）
+          menuIndex[type] = _buildMealIndex(this.menu[type]);
+          _saveMenuToStorage(this.menu, [type]);
+        }
+      }
+    },
     
+    flushStorage() {
+      flushMenuStorage();
+    },
+
     resetMenu() {
         this.menu = JSON.parse(JSON.stringify(defaultMenu)); 
+        menuIndex = {};
+        loadedMeals = {};
+        for (const type of Object.keys(mealLoads)) delete mealLoads[type];
+        for (const type of Object.keys(menuOverlays)) delete menuOverlays[type];
         _saveMenuToStorage(this.menu);
     }
   }
 })
+
+// 页面隐藏或关闭前把尚未写入的修改落盘（H5）；uni-app 应用切到后台时由 App.vue 的 onHide 调用
+if (typeof document !== 'undefined' && document.addEventListener) {
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushMenuStorage()
+  })
+}
+if (typeof window !== 'undefined' && window.addEventListener) {
+  window.addEventListener('pagehide', flushMenuStorage)
+}
 """
 
 # 1.2 主页文件 (src/pages/index/index.vue) - 【菜单管理按钮位置修复】
-INDEX_VUE_CONTENT = """
+INDEX_VUE_TEMPLATE = """
 <template>
   <view class="container">
-    <view class="h1">🍓 今天吃什么</view>
+    <view class="h1">🍓 [[app_title|html]]</view>
 
     <button class="manage-menu" @click="goToSettings" :disabled="isShuffling">
         ⚙️ 管理菜单
@@ -153,6 +1257,7 @@ INDEX_VUE_CONTENT = """
 
     <transition name="shuffle">
       <view class="card" v-if="food" :key="food.name">
+        <view class="plan-badge" v-if="isPlanned">📅 今日计划</view>
         <view class="food-name">{{ food.name }}</view>
         
         <view class="nutrition-indicators">
@@ -188,6 +1293,10 @@ INDEX_VUE_CONTENT = """
         <view class="food-name blinking">{{ shufflingText || '🤔 随机中...' }}</view>
       </view>
 
+      <view class="card shuffling-card" v-else-if="loading">
+        <view class="food-name blinking">⏳ 菜单加载中...</view>
+      </view>
+
        <view class="card" v-else-if="!isShuffling && (!foodStore.menu[current] || foodStore.menu[current].length === 0)">
             <view class="food-name">当前菜单为空 🥺</view>
             <view class="materials-title">请点击 **管理菜单** 添加菜品</view>
@@ -195,20 +1304,21 @@ INDEX_VUE_CONTENT = """
     </transition>
 
     <view class="btn-group">
-      <button class="pick" @click="pickFood" :disabled="isShuffling || !foodStore.menu[current] || foodStore.menu[current].length === 0">
+      <button class="pick" @click="pickFood" :disabled="isShuffling || loading || !foodStore.menu[current] || foodStore.menu[current].length === 0">
         <view v-if="isShuffling">⏳ 随机中...</view>
         <view v-else>🎲 随机一个</view>
       </button>
       <button class="shopping" @click="generateShoppingList" :disabled="isShuffling || !food">🛒 买菜清单</button>
-      <button class="clear-history" @click="clearHistory" :disabled="isShuffling || foodStore.history.length === 0">🗑️ 清空历史</button>
+      <button class="clear-history" @click="clearHistory" :disabled="isShuffling || foodStore.historySize === 0">🗑️ 清空历史</button>
     </view>
 
     <view class="shopping-modal-overlay" v-if="shoppingList.length" @click="shoppingList=[]">
       <view class="shopping-modal" @click.stop>
-        <view class="h3">🛒 购买清单</view>
+        <view class="h3">🛒 购买清单（{{ foodStore.shoppingDishes }} 道菜）</view>
         <view class="materials-list">
-          <view v-for="m in shoppingList" :key="m" class="materials-item">• {{ m }}</view>
+          <view v-for="m in shoppingList" :key="m.name" class="materials-item">• {{ m.name }}<text v-if="m.count > 1"> ×{{ m.count }}</text></view>
         </view>
+        <button class="close-modal" @click="clearShoppingList">清空清单</button>
         <button class="close-modal" @click="shoppingList=[]">关闭</button>
       </view>
     </view>
@@ -226,18 +1336,42 @@ export default {
   data() {
     return {
       tabs: [
-        { key: 'breakfast', label: '早餐' },
-        { key: 'lunch', label: '午餐' },
-        { key: 'dinner', label: '晚餐' }
+        { key: 'breakfast', label: '[[breakfast_label|js]]' },
+        { key: 'lunch', label: '[[lunch_label|js]]' },
+        { key: 'dinner', label: '[[dinner_label|js]]' }
       ],
       current: 'breakfast',
       food: null,
       shoppingList: [],
+      shoppingFood: null,
+      isPlanned: false,
       isShuffling: false, 
       shufflingText: '',
+      loading: false,
     }
   },
+  created() {
+    this.loadMeal(this.current)
+  },
   methods: {
+    // 使用外部菜单数据集时，餐次的菜品在第一次切换到该餐次时才下载；
+    // 加载完成后如果有预先排好的计划，直接展示今天这一餐
+    loadMeal(key) {
+      this.loading = true
+      const done = () => {
+        if (this.current !== key) return
+        this.loading = false
+        if (!this.food && !this.isShuffling) {
+          this.food = this.foodStore.plannedFood(key)
+          this.isPlanned = !!this.food
+        }
+      }
+      this.foodStore.ensureMeal(key).then(done, err => {
+        console.error(`加载 ${key} 菜单失败`, err)
+        done()
+      })
+    },
+
     // 辅助方法：将营养等级文字转换为图标数量
     getLevelCount(level) {
       const map = {
@@ -252,10 +1386,12 @@ export default {
     
     // 随机选菜逻辑 (不变)
     pickFood() {
-      if (this.isShuffling) return;
+      // 分片还没合并进菜单时只能抽到加载前的部分菜品
+      if (this.isShuffling || this.loading) return;
       
       this.isShuffling = true;
       this.food = null; 
+      this.isPlanned = false;
 
       let count = 0;
       const shuffleInterval = setInterval(() => {
@@ -277,13 +1413,26 @@ export default {
     switchTab(key) {
       this.current = key
       this.food = null
+      this.isPlanned = false
       this.shoppingList = []
       this.isShuffling = false
+      this.loadMeal(key)
     },
     
+    // 把当前这道菜加入买菜清单（同一次随机结果只加一次），展示合并后的清单
     generateShoppingList() {
       if (!this.food) return
-      this.shoppingList = this.food.materials
+      if (this.shoppingFood !== this.food) {
+        this.foodStore.addToShoppingList(this.food)
+        this.shoppingFood = this.food
+      }
+      this.shoppingList = this.foodStore.shoppingItems()
+    },
+
+    clearShoppingList() {
+      this.foodStore.clearShoppingList()
+      this.shoppingFood = null
+      this.shoppingList = []
     },
     
     clearHistory() {
@@ -317,7 +1466,7 @@ export default {
 .h1 {
   font-size: 28px;
   font-weight: bold;
-  color: #ff69b4;
+  color: [[primary_color]];
   /* 标题居中 */
   margin: 0 auto 20px auto; 
   text-align: center; 
@@ -335,8 +1484,8 @@ export default {
   border: none;
   padding: 10px 20px;
   border-radius: 25px;
-  background: #ffd1dc;
-  color: #ff69b4;
+  background: [[accent_color]];
+  color: [[primary_color]];
   font-size: 14px;
   margin-top: -10px; /* <-- 调整为 -10px，使其更低 */
   margin-bottom: 20px; 
@@ -363,13 +1512,13 @@ export default {
   border: none;
   padding: 8px 16px;
   border-radius: 20px;
-  background: #ffd1dc;
+  background: [[accent_color]];
   color: #333;
   transition: background 0.2s, transform 0.1s;
   line-height: normal;
 }
 .tabs button.active {
-  background: #ff69b4;
+  background: [[primary_color]];
   color: white;
 }
 .tabs button:active {
@@ -395,6 +1544,12 @@ export default {
   margin-bottom: 15px;
 }
 
+.plan-badge {
+  font-size: 12px;
+  color: #999;
+  margin-bottom: 6px;
+}
+
 /* 营养指标样式 */
 .nutrition-indicators {
     display: flex;
@@ -427,7 +1582,7 @@ export default {
 /* 食材列表 */
 .materials-title {
   font-size: 14px;
-  color: #ff69b4;
+  color: [[primary_color]];
   margin-bottom: 8px;
 }
 .materials-list {
@@ -462,7 +1617,7 @@ export default {
 .btn-group button:active {
   transform: scale(0.95);
 }
-.btn-group .pick { background: #ff69b4; }
+.btn-group .pick { background: [[primary_color]]; }
 .btn-group .shopping { background: #55acee; }
 .btn-group .clear-history { background: #aaaaaa; }
 .btn-group button[disabled] { background: #ccc; cursor: not-allowed; }
@@ -470,7 +1625,7 @@ export default {
 /* 洗牌动画 */
 .shuffling-card {
     background-color: #f7f7f7;
-    border: 2px dashed #ff69b4;
+    border: 2px dashed [[primary_color]];
 }
 @keyframes blink {
   0% { opacity: 1; }
@@ -479,7 +1634,7 @@ export default {
 }
 .blinking {
   animation: blink 0.5s infinite;
-  color: #ff69b4 !important;
+  color: [[primary_color]] !important;
   font-size: 26px !important;
 }
 
@@ -506,7 +1661,7 @@ export default {
 }
 .close-modal {
     margin-top: 15px;
-    background: #ff69b4;
+    background: [[primary_color]];
     color: white;
     border: none;
     border-radius: 8px;
@@ -528,7 +1683,7 @@ export default {
 """
 
 # 1.3 菜单管理页文件 (src/pages/settings/settings.vue) - 保持不变
-SETTINGS_VUE_CONTENT = """
+SETTINGS_VUE_TEMPLATE = """
 <template>
   <view class="settings-container">
     <view class="h2">🍽️ 菜单管理</view>
@@ -572,18 +1727,26 @@ SETTINGS_VUE_CONTENT = """
       
       <button class="reset-btn" @click="resetMenu">重置为默认菜单</button>
 
-      <view v-for="t in tabs" :key="t.key" class="menu-category">
-        <view class="h4">{{ t.label }} ({{ foodStore.menu[t.key] ? foodStore.menu[t.key].length : 0 }})</view>
-        
+      <view class="menu-tabs">
+        <button v-for="t in tabs" :key="t.key" class="menu-tab" :class="{ active: t.key === activeTab }" @click="selectTab(t.key)">
+          {{ t.label }} ({{ foodStore.menu[t.key] ? foodStore.menu[t.key].length : 0 }})
+        </button>
+      </view>
+
+      <view class="menu-category">
         <view class="food-items-list">
-          <view v-if="foodStore.menu[t.key] && foodStore.menu[t.key].length > 0">
-              <view v-for="food in foodStore.menu[t.key]" :key="food.name" class="food-item-card">
+          <view v-if="loading" class="empty-list">⏳ 菜单加载中...</view>
+          <view v-else-if="activeFoods.length > 0">
+              <view v-for="food in visibleFoods" :key="food.name" class="food-item-card">
                 <view class="food-info">
                     <view class="food-name-text">{{ food.name }}</view>
                     <view class="materials-text">食材：{{ food.materials.join('、') }}</view>
                 </view>
-                <button class="delete-btn" @click="removeFood(t.key, food.name)">删除</button>
+                <button class="delete-btn" @click="removeFood(activeTab, food.name)">删除</button>
               </view>
+              <button v-if="visibleFoods.length < activeFoods.length" class="more-btn" @click="showMore">
+                显示更多（还有 {{ activeFoods.length - visibleFoods.length }} 道）
+              </button>
           </view>
           <view v-else class="empty-list">该餐次暂无菜品</view>
         </view>
@@ -594,19 +1757,44 @@ SETTINGS_VUE_CONTENT = """
 </template>
 
 <script>
-import { reactive, computed } from 'vue';
+import { ref, reactive, computed } from 'vue';
 import { useFoodStore } from '../../stores/food';
 
+// 列表每次多显示的菜品数；外部数据集可能有几十万道菜，不一次性渲染
+const PAGE_SIZE = 50;
+
 export default {
   setup() {
     const foodStore = useFoodStore();
 
     const tabs = [
-      { key: 'breakfast', label: '早餐' },
-      { key: 'lunch', label: '午餐' },
-      { key: 'dinner', label: '晚餐' }
+      { key: 'breakfast', label: '[[breakfast_label|js]]' },
+      { key: 'lunch', label: '[[lunch_label|js]]' },
+      { key: 'dinner', label: '[[dinner_label|js]]' }
     ];
 
+    // 只加载、渲染当前选中的餐次，切换时才下载该餐次的分片
+    const activeTab = ref(tabs[0].key);
+    const limit = ref(PAGE_SIZE);
+    const loading = ref(false);
+    const activeFoods = computed(() => foodStore.menu[activeTab.value] || []);
+    const visibleFoods = computed(() => activeFoods.value.slice(0, limit.value));
+
+    const selectTab = (key) => {
+      activeTab.value = key;
+      limit.value = PAGE_SIZE;
+      loading.value = true;
+      foodStore.ensureMeal(key)
+        .catch(err => console.error(`加载 ${key} 菜单失败`, err))
+        .then(() => {
+          if (activeTab.value === key) loading.value = false;
+        });
+    };
+    const showMore = () => {
+      limit.value += PAGE_SIZE;
+    };
+    selectTab(activeTab.value);
+
     const newItem = reactive({
       name: '',
       materialsInput: '', 
@@ -687,7 +1875,8 @@ export default {
         }
     }
 
-    return { foodStore, tabs, newItem, addNewFood, removeFood, resetMenu, isFormValid };
+    return { foodStore, tabs, activeTab, activeFoods, visibleFoods, loading, selectTab, showMore,
+             newItem, addNewFood, removeFood, resetMenu, isFormValid };
   }
 }
 </script>
@@ -699,9 +1888,8 @@ export default {
   padding: 20px 15px;
   text-align: left;
 }
-.h2 { font-size: 24px; color: #ff69b4; text-align: center; margin-bottom: 25px; font-weight: bold; }
+.h2 { font-size: 24px; color: [[primary_color]]; text-align: center; margin-bottom: 25px; font-weight: bold; }
 .h3 { font-size: 18px; color: #333; margin-top: 0; padding-bottom: 5px; font-weight: bold; }
-.h4 { font-size: 16px; color: #ff69b4; margin-top: 15px; margin-bottom: 8px; font-weight: 600; border-left: 3px solid #ff69b4; padding-left: 10px; }
 
 .section-card {
   background: white;
@@ -739,7 +1927,7 @@ export default {
 .select-arrow { position: absolute; right: 10px; top: 50%; transform: translateY(-50%); color: #999; pointer-events: none; }
 
 .add-btn {
-  padding: 12px; border: none; border-radius: 8px; background: #ff69b4; color: white;
+  padding: 12px; border: none; border-radius: 8px; background: [[primary_color]]; color: white;
   transition: transform 0.2s; font-weight: bold;
 }
 .add-btn:active { transform: scale(0.98); }
@@ -749,7 +1937,7 @@ export default {
 .food-items-list { display: flex; flex-direction: column; gap: 10px; }
 .food-item-card {
   display: flex; justify-content: space-between; align-items: center;
-  padding: 10px; background: #fff7fb; border-radius: 8px; border-left: 5px solid #ff69b4;
+  padding: 10px; background: [[background_color]]; border-radius: 8px; border-left: 5px solid [[primary_color]];
 }
 .food-info { flex-grow: 1; }
 .food-name-text { font-weight: 600; font-size: 15px; color: #333; }
@@ -762,16 +1950,26 @@ export default {
 
 .reset-btn {
     display: block; width: 100%; margin-top: 20px; padding: 10px;
-    background: #ffd1dc; color: #ff69b4; border: 1px solid #ff69b4; border-radius: 8px;
+    background: [[accent_color]]; color: [[primary_color]]; border: 1px solid [[primary_color]]; border-radius: 8px;
     font-weight: bold; transition: background 0.2s, color 0.2s;
 }
-.reset-btn:active { background: #ff69b4; color: white; }
+.reset-btn:active { background: [[primary_color]]; color: white; }
 .empty-list {
     text-align: center;
     color: #999;
     padding: 10px;
     font-style: italic;
 }
+.menu-tabs { display: flex; gap: 8px; margin-top: 15px; margin-bottom: 10px; }
+.menu-tab {
+    flex: 1; padding: 8px 0; border: 1px solid [[primary_color]]; border-radius: 8px;
+    background: white; color: [[primary_color]]; font-size: 14px; line-height: normal;
+}
+.menu-tab.active { background: [[primary_color]]; color: white; font-weight: bold; }
+.more-btn {
+    display: block; width: 100%; padding: 8px; border: 1px dashed [[primary_color]]; border-radius: 8px;
+    background: transparent; color: [[primary_color]]; font-size: 13px;
+}
 </style>
 """
 
@@ -786,33 +1984,33 @@ app.use(createPinia())
 app.mount('#app')
 """
 
-PAGES_JSON_CONTENT = """
+PAGES_JSON_TEMPLATE = """
 {
   "pages":[
-    {"path":"pages/index/index","style":{"navigationBarTitleText":"今天吃什么","navigationBarTextStyle":"white","navigationBarBackgroundColor":"#ff69b4","backgroundColor":"#fff7fb"}},
-    {"path":"pages/settings/settings","style":{"navigationBarTitleText":"菜单管理","navigationBarTextStyle":"white","navigationBarBackgroundColor":"#ff69b4","backgroundColor":"#fff7fb"}}
+    {"path":"pages/index/index","style":{"navigationBarTitleText":"[[app_title|json]]","navigationBarTextStyle":"white","navigationBarBackgroundColor":"[[primary_color]]","backgroundColor":"[[background_color]]"}},
+    {"path":"pages/settings/settings","style":{"navigationBarTitleText":"菜单管理","navigationBarTextStyle":"white","navigationBarBackgroundColor":"[[primary_color]]","backgroundColor":"[[background_color]]"}}
   ],
   "globalStyle":{
     "navigationBarTextStyle":"white",
-    "navigationBarTitleText":"今天吃什么",
-    "navigationBarBackgroundColor":"#ff69b4",
-    "backgroundColor":"#fff7fb"
+    "navigationBarTitleText":"[[app_title|json]]",
+    "navigationBarBackgroundColor":"[[primary_color]]",
+    "backgroundColor":"[[background_color]]"
   },
   "uniIdRouter":{}
 }
 """
 
-APP_VUE_CONTENT = """
-<template><slot /></template><script>export default { onLaunch() {console.log('App Launch')}, onShow() {console.log('App Show')}, onHide() {console.log('App Hide')} }</script><style>body,html{margin:0;padding:0;font-family:-apple-system,BlinkMacSystemFont,'PingFang SC';background-color:#fff7fb;}</style>
+APP_VUE_TEMPLATE = """
+<template><slot /></template><script>import { flushMenuStorage } from './src/stores/food'; export default { onLaunch() {console.log('App Launch')}, onShow() {console.log('App Show')}, onHide() {console.log('App Hide'); flushMenuStorage()} }</script><style>body,html{margin:0;padding:0;font-family:-apple-system,BlinkMacSystemFont,'PingFang SC';background-color:[[background_color]];}</style>
 """
 
-INDEX_HTML_CONTENT = """
+INDEX_HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="zh-CN">
 <head>
   <meta charset="UTF-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1.0" />
-  <title>今天吃什么</title>
+  <title>[[app_title|html]]</title>
 </head>
 <body>
   <div id="app"></div>
@@ -827,61 +2025,763 @@ import vue from '@vitejs/plugin-vue'
 export default defineConfig({ base: './', plugins: [vue()], server: { port: 5173 }, build: { target: 'es2015' } })
 """
 
+# 1.10 模板与输出文件的对应关系
+TEMPLATE_MAPPING = {
+    'pages.json': PAGES_JSON_TEMPLATE,
+    'index.html': INDEX_HTML_TEMPLATE,
+    'App.vue': APP_VUE_TEMPLATE,
+    'src/stores/food.js': FOOD_STORE_TEMPLATE,
+    'src/pages/index/index.vue': INDEX_VUE_TEMPLATE,
+    'src/pages/settings/settings.vue': SETTINGS_VUE_TEMPLATE,
+}
+
 PACKAGE_JSON_PATH = 'package.json'
-try:
-    with open(PACKAGE_JSON_PATH, 'r', encoding='utf-8') as f:
-        package_data = json.load(f)
-except FileNotFoundError:
-    package_data = {
-      "name": "optimized-what-to-eat-app",
-      "version": "1.0.0",
-      "scripts": {"dev": "vite", "build": "vite build"},
-      "dependencies": {"vue": "^3.4.0"},
-      "devDependencies": {"vite": "^5.0.0", "@vitejs/plugin-vue": "^5.0.0"}
-    }
-if 'dependencies' not in package_data:
-    package_data['dependencies'] = {}
-package_data['dependencies']['pinia'] = '^2.1.7' 
 
-PACKAGE_JSON_CONTENT = json.dumps(package_data, indent=2, ensure_ascii=False)
+
+def load_package_data(path=PACKAGE_JSON_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            package_data = json.load(f)
+    except FileNotFoundError:
+        package_data = {
+          "name": "optimized-what-to-eat-app",
+          "version": "1.0.0",
+          "scripts": {"dev": "vite", "build": "vite build"},
+          "dependencies": {"vue": "^3.4.0"},
+          "devDependencies": {"vite": "^5.0.0", "@vitejs/plugin-vue": "^5.0.0"}
+        }
+    if 'dependencies' not in package_data:
+        package_data['dependencies'] = {}
+    package_data['dependencies']['pinia'] = '^2.1.7'
+    return package_data
 
 
 # --- 2. 文件路径列表 ---
-FILE_MAPPING = {
-    'main.js': MAIN_JS_CONTENT,
-    'pages.json': PAGES_JSON_CONTENT,
-    'index.html': INDEX_HTML_CONTENT,
-    'vite.config.js': VITE_CONFIG_CONTENT,
-    'App.vue': APP_VUE_CONTENT,
-    'package.json': PACKAGE_JSON_CONTENT,
-    'src/stores/food.js': FOOD_STORE_CONTENT,
-    'src/pages/index/index.vue': INDEX_VUE_CONTENT,
-    'src/pages/settings/settings.vue': SETTINGS_VUE_CONTENT,
+# 以下名称在首次访问时才生成并缓存到模块全局（PEP 562 模块级 __getattr__），
+# 因此 `import daima` 既不渲染模板，也不读取 package.json。模块内部统一通过 _lazy() 取值。
+def _render_default(template):
+    return lambda: render_template(template, _lazy('DEFAULT_TEMPLATE_PARAMS'))
+
+
+def _build_file_mapping():
+    return {
+        'main.js': MAIN_JS_CONTENT,
+        'pages.json': _lazy('PAGES_JSON_CONTENT'),
+        'index.html': _lazy('INDEX_HTML_CONTENT'),
+        'vite.config.js': VITE_CONFIG_CONTENT,
+        'App.vue': _lazy('APP_VUE_CONTENT'),
+        'package.json': _lazy('PACKAGE_JSON_CONTENT'),
+        'src/stores/food.js': _lazy('FOOD_STORE_CONTENT'),
+        'src/pages/index/index.vue': _lazy('INDEX_VUE_CONTENT'),
+        'src/pages/settings/settings.vue': _lazy('SETTINGS_VUE_CONTENT'),
+    }
+
+
+_LAZY_FACTORIES = {
+    'DEFAULT_TEMPLATE_PARAMS': lambda: dict(_BASE_TEMPLATE_PARAMS,
+                                            **menu_template_params(DEFAULT_MENU)),
+    'PAGES_JSON_CONTENT': _render_default(PAGES_JSON_TEMPLATE),
+    'INDEX_HTML_CONTENT': _render_default(INDEX_HTML_TEMPLATE),
+    'APP_VUE_CONTENT': _render_default(APP_VUE_TEMPLATE),
+    'FOOD_STORE_CONTENT': _render_default(FOOD_STORE_TEMPLATE),
+    'INDEX_VUE_CONTENT': _render_default(INDEX_VUE_TEMPLATE),
+    'SETTINGS_VUE_CONTENT': _render_default(SETTINGS_VUE_TEMPLATE),
+    'package_data': load_package_data,
+    'PACKAGE_JSON_CONTENT': lambda: json.dumps(_lazy('package_data'), indent=2, ensure_ascii=False),
+    'FILE_MAPPING': _build_file_mapping,
 }
+_LAZY_LOCK = threading.RLock()
+
+
+def _lazy(name):
+    module_globals = globals()
+    if name in module_globals:
+        return module_globals[name]
+    with _LAZY_LOCK:
+        if name not in module_globals:
+            module_globals[name] = _LAZY_FACTORIES[name]()
+        return module_globals[name]
+
+
+def __getattr__(name):
+    if name in _LAZY_FACTORIES:
+        return _lazy(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_FACTORIES))
+
+
+def get_file_mapping():
+    return _lazy('FILE_MAPPING')
+
+
+def render_file_map(params=None, base_map=None):
+    # 按参数渲染出一份完整的 file_map；params 只需给出与默认值不同的部分。
+    # 各模板按自己用到的参数缓存渲染结果，只改颜色时 food.js 等模板不会重新渲染
+    params = dict(params or {})
+    if 'default_menu' in params and 'default_menu_index' not in params:
+        # 只替换了菜单字面量时，预编译索引已不对应，交给运行时重建
+        params['default_menu_index'] = 'null'
+    merged = dict(_lazy('DEFAULT_TEMPLATE_PARAMS'), **params)
+    file_map = dict(get_file_mapping() if base_map is None else base_map)
+    for filepath, source in TEMPLATE_MAPPING.items():
+        if filepath in file_map:
+            file_map[filepath] = render_template(source, merged)
+    return file_map
+
 
 # --- 3. 核心执行逻辑 ---
-def generate_and_zip_project(file_map):
-    zip_filename = 'optimized_what_to_eat_final_v5.zip'
-    temp_dir = 'temp_optimized_project_v5'
-    
+ZIP_FILENAME = 'optimized_what_to_eat_final_v5.zip'
+TEMP_DIR = 'temp_optimized_project_v5'
+
+_FILE_MODE = None
+
+
+def _encode_content(content, translate_newlines=True):
+    # 与文本模式 open(..., 'w') 写出的字节保持一致（换行符按平台转换）；二进制内容原样返回
+    if isinstance(content, bytes):
+        return content
+    if translate_newlines and os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    return content.encode('utf-8')
+
+
+def _default_file_mode():
+    # 新建文件的权限位 = 0o666 & ~umask，与临时目录模式下落盘文件一致；只读取一次
+    global _FILE_MODE
+    if _FILE_MODE is None:
+        mask = os.umask(0)
+        os.umask(mask)
+        _FILE_MODE = stat.S_IFREG | (0o666 & ~mask)
+    return _FILE_MODE
+
+
+class BuildCancelled(Exception):
+    # 构建在完成前被取消（见 cancel_event 参数）；未写完的压缩包已被删除
+    pass
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise BuildCancelled('构建已取消')
+
+
+def _remove_partial(path):
+    # 写到一半失败或被取消的压缩包已经损坏，不能留给下游当作产物
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _zip_via_temp_dir(file_map, zip_filename, temp_dir=None, policy=None, metrics=None,
+                      cancel_event=None, integrity=True):
+    # 旧流程（兜底）：先写临时目录，再遍历打包，最后删除临时目录。
+    # 未指定 temp_dir 时使用唯一的临时目录，避免并发构建互相覆盖
+    if temp_dir is None:
+        import tempfile
+        temp_dir = tempfile.mkdtemp(prefix=TEMP_DIR + '_', dir='.')
     os.makedirs(temp_dir, exist_ok=True)
-    
-    for filepath, content in file_map.items():
-        full_path = os.path.join(temp_dir, filepath)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-            
-    with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for root, _, files in os.walk(temp_dir):
-            for file in files:
-                full_path = os.path.join(root, file)
-                arcname = os.path.relpath(full_path, temp_dir)
-                zf.write(full_path, arcname)
-
-    import shutil
-    shutil.rmtree(temp_dir)
+
+    if policy is None:
+        policy = CompressionPolicy()
+    if metrics is None:
+        metrics = BuildMetrics()
+
+    entries = []
+    try:
+        with metrics.phase('write'):
+            for filepath, content in file_map.items():
+                _check_cancelled(cancel_event)
+                full_path = os.path.join(temp_dir, filepath)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+                # 与文本模式写出的字节相同；清单条目顺带在这里计算，打包时不再重新读取
+                data = _encode_content(content)
+                with open(full_path, 'wb') as f:
+                    f.write(data)
+                if integrity:
+                    entries.append(_integrity_entry(filepath, data, zlib.crc32(data)))
+
+        try:
+            with metrics.phase('compress'), \
+                    zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for root, _, files in os.walk(temp_dir):
+                    for file in files:
+                        _check_cancelled(cancel_event)
+                        full_path = os.path.join(root, file)
+                        arcname = os.path.relpath(full_path, temp_dir)
+                        compress_type, compresslevel = policy.for_member(arcname)
+                        started = time.perf_counter()
+                        zf.write(full_path, arcname, compress_type, compresslevel)
+                        zinfo = zf.filelist[-1]
+                        metrics.member(zinfo.filename, zinfo.file_size, zinfo.compress_size,
+                                       time.perf_counter() - started)
+                if integrity:
+                    zf.writestr(INTEGRITY_MANIFEST, _integrity_bytes(entries),
+                                *policy.for_member(INTEGRITY_MANIFEST))
+            if integrity:
+                _atomic_write(integrity_sidecar_path(zip_filename), _integrity_bytes(entries))
+        except BaseException:
+            _remove_partial(zip_filename)
+            _remove_partial(integrity_sidecar_path(zip_filename))
+            raise
+    finally:
+        with metrics.phase('cleanup'):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# 3.0 可复现构建：相同输入 -> 字节完全相同的压缩包
+# 成员按路径排序、时间戳固定（可用 SOURCE_DATE_EPOCH 覆盖）、权限固定为 0644、
+# 换行符统一为 \n、压缩级别固定，不受构建时间、平台和 umask 影响
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+REPRODUCIBLE_FILE_MODE = stat.S_IFREG | 0o644
+REPRODUCIBLE_COMPRESSLEVEL = 6
+
+
+def _reproducible_date_time():
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if not epoch:
+        return REPRODUCIBLE_DATE_TIME
+    # zip 的 DOS 时间戳无法表示 1980 年以前的时间
+    return max(tuple(time.gmtime(int(epoch))[:6]), REPRODUCIBLE_DATE_TIME)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 3.1 压缩策略
+# 规格字符串: stored / deflate / deflate-1..9 / bzip2 / bzip2-1..9 / lzma / auto / auto-1..9，
+# 以及预设 fast（开发构建）与 max（发布构建）。
+# auto 按成员选择：已压缩格式（图片、压缩包、svg 等）直接存储，其余文本用 deflate 压缩
+COMPRESSION_METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+COMPRESSION_PRESETS = {'fast': 'auto-1', 'max': 'auto-9'}
+STORED_SUFFIXES = frozenset([
+    '.rar', '.zip', '.7z', '.gz', '.br', '.png', '.jpg', '.jpeg', '.gif', '.webp',
+    '.svg', '.ico', '.woff', '.woff2', '.mp3', '.mp4',
+])
+# 预压缩副本（见第 5 节）本身就是压缩数据，任何策略下都直接存储
+SIDECAR_SUFFIXES = ('.gz', '.br')
+
+
+class CompressionPolicy:
+    def __init__(self, spec='deflate'):
+        self.spec = spec
+        name, _, level = COMPRESSION_PRESETS.get(spec, spec).partition('-')
+        self.auto = name == 'auto'
+        if not self.auto and name not in COMPRESSION_METHODS:
+            raise ValueError(f'未知的压缩策略: {spec}')
+        self.compress_type = zipfile.ZIP_DEFLATED if self.auto else COMPRESSION_METHODS[name]
+        self.compresslevel = None
+        if level:
+            if self.compress_type not in (zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2) \
+                    or not level.isdigit() or not 1 <= int(level) <= 9:
+                raise ValueError(f'无效的压缩级别: {spec}')
+            self.compresslevel = int(level)
+
+    def for_member(self, filepath, reproducible=False):
+        # 返回该成员使用的 (compress_type, compresslevel)
+        if filepath.endswith(SIDECAR_SUFFIXES):
+            return zipfile.ZIP_STORED, None
+        if self.auto and os.path.splitext(filepath)[1].lower() in STORED_SUFFIXES:
+            return zipfile.ZIP_STORED, None
+        level = self.compresslevel
+        if level is None and reproducible and self.compress_type == zipfile.ZIP_DEFLATED:
+            level = REPRODUCIBLE_COMPRESSLEVEL
+        return self.compress_type, level
+
+
+# 3.2 直接写入"已压缩"成员（流式打包与增量缓存共用）
+def _compress(data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=None):
+    # 与 ZipFile 内部使用同一个压缩器构造方式，保证输出字节一致
+    compressor = zipfile._get_compressor(compress_type, compresslevel)
+    if compressor is None:
+        return data
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(raw, compress_type):
+    if compress_type == zipfile.ZIP_STORED:
+        return raw
+    return zipfile._get_decompressor(compress_type).decompress(raw)
+
+
+def _make_zipinfo(filepath, date_time, compress_type=zipfile.ZIP_DEFLATED, reproducible=False):
+    zinfo = zipfile.ZipInfo(filepath, date_time)
+    if reproducible:
+        # 固定权限位与创建系统，不受 umask 和构建平台影响
+        zinfo.external_attr = (REPRODUCIBLE_FILE_MODE & 0xFFFF) << 16
+        zinfo.create_system = 3
+    else:
+        zinfo.external_attr = (_default_file_mode() & 0xFFFF) << 16
+    zinfo.compress_type = compress_type
+    return zinfo
+
+
+# 原样读写已压缩数据用到的 zipfile 内部接口（CPython 3.8 - 3.13 均存在）。
+# 将来的版本缺少其中任何一项时，改走公开的 writestr / read，结果仍是合法的压缩包，只是要重新压缩
+_RAW_WRITE_ATTRS = ('_lock', '_seekable', '_writecheck', '_didModify', 'start_dir', 'fp', 'filelist',
+                    'NameToInfo')
+_RAW_READ_ATTRS = ('structFileHeader', 'sizeFileHeader', '_FH_FILENAME_LENGTH', '_FH_EXTRA_FIELD_LENGTH')
+
+
+def _raw_io_supported(zf, write=True):
+    if write:
+        return hasattr(zipfile.ZipInfo, 'FileHeader') and all(hasattr(zf, name) for name in _RAW_WRITE_ATTRS)
+    return hasattr(zf, '_lock') and hasattr(zf, 'fp') and all(hasattr(zipfile, name) for name in _RAW_READ_ATTRS)
+
+
+def _write_raw_member(zf, zinfo, raw):
+    # zipfile 没有"写入已压缩数据"的公开接口，这里按 ZipFile._open_to_write 的步骤手工写入。
+    # 调用前 zinfo 的 CRC / file_size 必须已填好，raw 为按 zinfo.compress_type 压缩后的数据
+    if not _raw_io_supported(zf):
+        zf.writestr(zinfo, _decompress(raw, zinfo.compress_type))
+        return
+    zinfo.compress_size = len(raw)
+    zinfo.flag_bits = 0x02 if zinfo.compress_type == zipfile.ZIP_LZMA else 0x00
+    zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    with zf._lock:
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader(zip64))
+        zf.fp.write(raw)
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+
+
+# 3.3 基于内容哈希的增量构建缓存
+# objects/<key> 保存单个成员压缩后的数据（前 12 字节为 CRC 与原始大小），
+# outputs/<路径哈希>.json 记录每个输出压缩包对应的指纹，指纹未变且文件未被改动时跳过整个打包。
+# 每个输出一个记录文件、整体原子替换，多进程（build_variants）并发构建时不需要读-改-写，互不覆盖。
+# 命中的对象会刷新修改时间，prune 按修改时间从旧到新删除对象（LRU），命令行构建后自动收缩到 --cache-max-size
+CACHE_DIR = '.daima_cache'
+CACHE_MAX_MB = 512
+_OBJECT_HEADER = struct.Struct('<LQ')
+
+
+def _atomic_write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class BuildCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.outputs_dir = os.path.join(cache_dir, 'outputs')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def member_key(data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=None):
+        level = 'default' if compresslevel is None else compresslevel
+        return f'{hashlib.sha256(data).hexdigest()}-{compress_type}-{level}'
+
+    def load(self, key):
+        path = os.path.join(self.objects_dir, key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        crc, file_size = _OBJECT_HEADER.unpack_from(blob)
+        return blob[_OBJECT_HEADER.size:], crc, file_size
+
+    def store(self, key, raw, crc, file_size):
+        _atomic_write(os.path.join(self.objects_dir, key),
+                      _OBJECT_HEADER.pack(crc, file_size) + raw)
+
+    def _record_path(self, zip_filename):
+        digest = hashlib.sha256(os.path.abspath(zip_filename).encode('utf-8')).hexdigest()
+        return os.path.join(self.outputs_dir, f'{digest[:32]}.json')
+
+    @staticmethod
+    def _load_record(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_fresh(self, zip_filename, fingerprint):
+        record = self._load_record(self._record_path(zip_filename))
+        if not record or record['path'] != os.path.abspath(zip_filename) or record['fingerprint'] != fingerprint:
+            return False
+        try:
+            st = os.stat(zip_filename)
+        except FileNotFoundError:
+            return False
+        return st.st_size == record['size'] and st.st_mtime_ns == record['mtime_ns']
+
+    def record_output(self, zip_filename, fingerprint):
+        st = os.stat(zip_filename)
+        record = {'path': os.path.abspath(zip_filename), 'fingerprint': fingerprint,
+                  'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        _atomic_write(self._record_path(zip_filename),
+                      json.dumps(record, indent=2, ensure_ascii=False).encode('utf-8'))
+
+    def prune(self, max_bytes):
+        # 按最近使用时间从旧到新删除对象，直到对象总大小不超过 max_bytes；顺带删除输出文件已不存在的记录。
+        # 返回 (删除的对象数, 释放的字节数)。并发构建中被删掉的对象只会变成一次未命中
+        objects = []
+        with os.scandir(self.objects_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    st = entry.stat()
+                    objects.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for _, size, _ in objects)
+        removed = freed = 0
+        for _, size, path in sorted(objects):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        with os.scandir(self.outputs_dir) as entries:
+            for entry in entries:
+                record = self._load_record(entry.path) if entry.name.endswith('.json') else None
+                if record is not None and not os.path.exists(record.get('path', '')):
+                    os.remove(entry.path)
+        return removed, freed
+
+
+# 3.4 构建指标：各阶段耗时、每个成员的输入/输出字节与压缩比、峰值内存。
+# 每条指标以 dict 事件的形式交给 on_event 回调（例如 jsonl_writer 写成 JSON Lines）
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows 没有 resource 模块，峰值内存记为 None
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 的单位是字节，Linux 上是 KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class BuildMetrics:
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self.phases = {}
+        self.members = []
+
+    def _emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def member(self, path, bytes_in, bytes_out, seconds, cached=False):
+        record = {
+            'event': 'member', 'path': path, 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+            'ratio': round(bytes_out / bytes_in, 4) if bytes_in else 1.0,
+            'seconds': round(seconds, 6), 'cached': cached,
+        }
+        self.members.append(record)
+        self._emit(record)
+
+    def finish(self, zip_filename, written, seconds):
+        bytes_in = sum(m['bytes_in'] for m in self.members)
+        bytes_out = sum(m['bytes_out'] for m in self.members)
+        summary = {
+            'event': 'build', 'zip': zip_filename, 'written': written,
+            'seconds': round(seconds, 6),
+            'phases': {name: round(value, 6) for name, value in self.phases.items()},
+            'members': len(self.members), 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+            'ratio': round(bytes_out / bytes_in, 4) if bytes_in else 1.0,
+            'peak_rss_kb': _peak_rss_kb(),
+        }
+        self._emit(summary)
+        return summary
+
+
+def jsonl_writer(path):
+    # 返回一个 on_event 回调，把事件逐行追加写入 path；path 为 '-' 时写到标准输出
+    def write_event(event):
+        line = json.dumps(event, ensure_ascii=False)
+        if path == '-':
+            print(line)
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    return write_event
+
+
+# 3.5 完整性清单：每个成员的路径、大小、CRC 与 SHA-256，在打包的同一遍中计算（数据已在内存中，
+# 不需要再读一遍）。清单作为最后一个成员 INTEGRITY_MANIFEST 写入压缩包，落盘构建时另写一份
+# <压缩包>.integrity.json；部署时比较两份清单即可知道哪些文件需要上传，不必解压
+INTEGRITY_FORMAT = 'bundle-integrity'
+INTEGRITY_MANIFEST = 'integrity.json'
+
+
+def integrity_sidecar_path(zip_filename):
+    return f'{zip_filename}.integrity.json'
+
+
+def _integrity_entry(filepath, data, crc, key=None):
+    # 缓存键以内容的 SHA-256 开头（见 BuildCache.member_key），有键时直接复用
+    sha256 = key.partition('-')[0] if key else hashlib.sha256(data).hexdigest()
+    return {'path': filepath, 'size': len(data), 'crc': f'{crc:08x}', 'sha256': sha256}
+
+
+def integrity_manifest(entries):
+    return {'format': INTEGRITY_FORMAT, 'version': 1, 'algorithm': 'sha256', 'members': entries}
+
+
+def _integrity_bytes(entries):
+    return json.dumps(integrity_manifest(entries), ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def read_integrity_manifest(path):
+    # 读取压缩包内嵌的清单，没有时返回 None
+    with zipfile.ZipFile(path) as zf:
+        return _embedded_integrity(zf)
+
+
+def _embedded_integrity(zf):
+    try:
+        manifest = json.loads(zf.read(INTEGRITY_MANIFEST))
+    except KeyError:
+        return None
+    return manifest if manifest.get('format') == INTEGRITY_FORMAT else None
+
+
+def verify_bundle(path, deep=True):
+    # 按内嵌清单核对压缩包，返回发现的问题（空列表表示通过）。
+    # deep=False 时只对照中央目录中的大小与 CRC，耗时与清单长度成正比；deep=True 时再逐个计算 SHA-256
+    problems = []
+    with zipfile.ZipFile(path) as zf:
+        manifest = _embedded_integrity(zf)
+        if manifest is None:
+            return [f'缺少完整性清单 {INTEGRITY_MANIFEST}']
+        infos = {zinfo.filename: zinfo for zinfo in zf.infolist() if not zinfo.is_dir()}
+        listed = {entry['path'] for entry in manifest['members']}
+        problems.extend(f'{name}: 不在清单中' for name in infos if name not in listed and name != INTEGRITY_MANIFEST)
+        for entry in manifest['members']:
+            zinfo = infos.get(entry['path'])
+            if zinfo is None:
+                problems.append(f"{entry['path']}: 压缩包中缺少该成员")
+            elif zinfo.file_size != entry['size'] or f'{zinfo.CRC:08x}' != entry['crc']:
+                problems.append(f"{entry['path']}: 大小或 CRC 与清单不一致")
+            elif deep:
+                digest = hashlib.sha256()
+                with zf.open(zinfo) as f:
+                    for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                if digest.hexdigest() != entry['sha256']:
+                    problems.append(f"{entry['path']}: SHA-256 与清单不一致")
+    return problems
+
+
+def integrity_changes(old, new):
+    # 比较两份清单，返回 (需要上传的路径, 需要删除的路径)，其余文件可以跳过
+    old_hashes = {entry['path']: entry['sha256'] for entry in (old or {}).get('members', ())}
+    new_paths = {entry['path'] for entry in new['members']}
+    upload = [entry['path'] for entry in new['members'] if old_hashes.get(entry['path']) != entry['sha256']]
+    return upload, [path for path in old_hashes if path not in new_paths]
+
+
+def _iter_members(file_map, policy, reproducible=False, metrics=None, with_keys=True):
+    # 逐个编码成员并决定压缩方式，产出 (路径, 字节, 压缩方式, 压缩级别, 缓存键)。
+    # 按需逐个编码，不会同时持有所有成员编码后的副本；不需要缓存键时也不计算哈希
+    if metrics is None:
+        metrics = BuildMetrics()
+    items = sorted(file_map.items()) if reproducible else file_map.items()
+    for filepath, content in items:
+        started = time.perf_counter()
+        data = _encode_content(content, translate_newlines=not reproducible)
+        compress_type, compresslevel = policy.for_member(filepath, reproducible)
+        key = BuildCache.member_key(data, compress_type, compresslevel) if with_keys else None
+        metrics.add_phase('render', time.perf_counter() - started)
+        yield filepath, data, compress_type, compresslevel, key
+
+
+def _write_archive(target, members, reproducible=False, cache=None, metrics=None, integrity=None,
+                   policy=None):
+    # target 可以是文件路径，也可以是任意可写的文件对象（不要求可 seek）。
+    # 生成器：每写完一个成员 yield 一次，调用方可借此及时取走已写出的字节（见 iter_zip_chunks）。
+    # integrity 为列表时，在其中记录每个成员的清单条目，并在最后写入 INTEGRITY_MANIFEST 成员，
+    # 其压缩方式与其他成员一样由 policy 决定
+    if metrics is None:
+        metrics = BuildMetrics()
+    if policy is None:
+        policy = CompressionPolicy()
+    date_time = _reproducible_date_time() if reproducible else time.localtime(time.time())[:6]
+    compress_seconds = write_seconds = 0.0
+
+    zf = zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED)
+    try:
+        for filepath, data, compress_type, compresslevel, key in members:
+            started = time.perf_counter()
+            cached = cache.load(key) if cache is not None else None
+            if cached is not None:
+                raw, crc, _ = cached
+            else:
+                raw, crc = _compress(data, compress_type, compresslevel), zlib.crc32(data)
+                if cache is not None:
+                    cache.store(key, raw, crc, len(data))
+            compressed = time.perf_counter()
+
+            zinfo = _make_zipinfo(filepath, date_time, compress_type, reproducible)
+            zinfo.file_size = len(data)
+            zinfo.CRC = crc
+            _write_raw_member(zf, zinfo, raw)
+            if integrity is not None:
+                if filepath == INTEGRITY_MANIFEST:
+                    raise ValueError(f'{INTEGRITY_MANIFEST} 保留给完整性清单，不能作为项目文件')
+                integrity.append(_integrity_entry(filepath, data, crc, key))
+            finished = time.perf_counter()
+
+            compress_seconds += compressed - started
+            write_seconds += finished - compressed
+            metrics.member(filepath, len(data), len(raw), compressed - started, cached is not None)
+            yield
+        if integrity is not None:
+            data = _integrity_bytes(integrity)
+            compress_type, compresslevel = policy.for_member(INTEGRITY_MANIFEST, reproducible)
+            zinfo = _make_zipinfo(INTEGRITY_MANIFEST, date_time, compress_type, reproducible)
+            zinfo.file_size = len(data)
+            zinfo.CRC = zlib.crc32(data)
+            _write_raw_member(zf, zinfo, _compress(data, compress_type, compresslevel))
+            yield
+    finally:
+        closing = time.perf_counter()
+        zf.close()
+        write_seconds += time.perf_counter() - closing
+        metrics.add_phase('compress', compress_seconds)
+        metrics.add_phase('write', write_seconds)
+
+
+def _drive_archive(archive, cancel_event=None):
+    # 逐个成员推进 _write_archive；每个成员之间检查一次是否已取消
+    try:
+        for _ in archive:
+            _check_cancelled(cancel_event)
+    finally:
+        archive.close()
+
+
+def _zip_streaming(file_map, zip_filename, cache=None, reproducible=False, policy=None,
+                   metrics=None, cancel_event=None, integrity=True):
+    # 流式打包：内存中的字符串直接写入压缩包，不经过磁盘。
+    # 时间戳、权限位、压缩方式与 ZipFile.write 落盘文件时完全相同，成员顺序按 file_map 顺序。
+    # 传入 cache 时复用未变化成员的压缩结果；全部未变化则不重写压缩包，返回 False
+    if policy is None:
+        policy = CompressionPolicy()
+    sidecar = integrity_sidecar_path(zip_filename)
+    if cache is None:
+        members = _iter_members(file_map, policy, reproducible, metrics, with_keys=False)
+    else:
+        members = list(_iter_members(file_map, policy, reproducible, metrics))
+        # 可复现模式下时间戳也是输出的一部分，需要计入指纹
+        fixed_date_time = _reproducible_date_time() if reproducible else None
+        fingerprint = hashlib.sha256(json.dumps(
+            [fixed_date_time, integrity, [(m[0], m[4]) for m in members]]).encode('utf-8')).hexdigest()
+        if cache.is_fresh(zip_filename, fingerprint) and (not integrity or os.path.exists(sidecar)):
+            return False
+
+    _check_cancelled(cancel_event)
+    entries = [] if integrity else None
+    try:
+        _drive_archive(_write_archive(zip_filename, members, reproducible, cache, metrics, entries, policy),
+                       cancel_event)
+        if integrity:
+            _atomic_write(sidecar, _integrity_bytes(entries))
+    except BaseException:
+        _remove_partial(zip_filename)
+        _remove_partial(sidecar)
+        raise
+
+    if cache is not None:
+        cache.record_output(zip_filename, fingerprint)
+    return True
+
+
+def _prepare_build(file_map, compression='deflate', reproducible=False, precompress=False,
+                   on_event=None):
+    # 各构建入口共用的准备步骤：解析压缩策略、创建指标收集器、按需追加预压缩副本
+    policy = compression if isinstance(compression, CompressionPolicy) \
+        else CompressionPolicy(compression)
+    metrics = BuildMetrics(on_event)
+    if precompress:
+        with metrics.phase('render'):
+            file_map = {**file_map,
+                        **precompress_members(file_map, translate_newlines=not reproducible)}
+    return file_map, policy, metrics
+
+
+def generate_and_zip_project(file_map, use_temp_dir=False, zip_filename=ZIP_FILENAME,
+                             temp_dir=None, verbose=True, cache_dir=None, reproducible=False,
+                             compression='deflate', precompress=False, on_event=None,
+                             cancel_event=None, integrity=True):
+    # cancel_event（threading.Event）被置位后，构建在当前成员写完后停止并抛出 BuildCancelled。
+    # integrity=True 时在压缩包内和旁边各写一份完整性清单（见 3.5）
+    if use_temp_dir and reproducible:
+        raise ValueError('可复现模式只支持流式打包，不能与 use_temp_dir 同时使用')
+
+    started = time.perf_counter()
+    file_map, policy, metrics = _prepare_build(file_map, compression, reproducible,
+                                               precompress, on_event)
+    written = True
+    if use_temp_dir:
+        _zip_via_temp_dir(file_map, zip_filename, temp_dir, policy, metrics, cancel_event,
+                          integrity)
+    else:
+        cache = BuildCache(cache_dir) if cache_dir else None
+        written = _zip_streaming(file_map, zip_filename, cache, reproducible, policy, metrics,
+                                 cancel_event, integrity)
+    summary = metrics.finish(zip_filename, written, time.perf_counter() - started)
+
+    if not verbose:
+        return zip_filename
+    if reproducible:
+        print(f"🔒 SHA-256: {file_sha256(zip_filename)}")
+    if integrity:
+        print(f"🧾 完整性清单: {INTEGRITY_MANIFEST}（内嵌）与 '{integrity_sidecar_path(zip_filename)}'")
+    if not written:
+        print(f"✅ 内容未变化，沿用已有的 '{zip_filename}'")
+        return zip_filename
+
+    print(f"📦 压缩策略 {policy.spec}: {summary['members']} 个文件 "
+          f"{summary['bytes_in']} -> {summary['bytes_out']} 字节 "
+          f"({summary['ratio']:.1%})，耗时 {summary['seconds'] * 1000:.1f} ms")
     
     print(f"\n🎉 恭喜！项目已设计并打包完成为 '{zip_filename}'")
     print("---------------------------------------------------------")
@@ -889,7 +2789,2080 @@ def generate_and_zip_project(file_map):
     print("1. **降低** 主页“⚙️ 管理菜单”按钮的位置（`margin-top` 从 `-30px` 调整到 `-10px`）。")
     print("2. 确认标题和按钮都已居中。")
     print("3. 包含完整 Uni-app + Vue3 + Pinia 菜单随机器功能。")
+    return zip_filename
+
+
+# --- 4. 多变体并行构建 ---
+# 变体描述: {'name': 'tenant_a.zip', 'params': {'primary_color': '#3b82f6'},
+#            'overrides': {'src/stores/food.js': '...', 'App.vue': None}}
+# params 为模板参数（见 DEFAULT_TEMPLATE_PARAMS），overrides 中值为 None 表示从该变体中删除此文件
+def apply_overrides(file_map, overrides):
+    merged = dict(file_map)
+    for filepath, content in (overrides or {}).items():
+        if content is None:
+            merged.pop(filepath, None)
+        else:
+            merged[filepath] = content
+    return merged
+
+
+def _build_variant(name, file_map, build_options):
+    # 在子进程中执行：异常转为结果字段返回，单个变体失败不影响其他变体
+    started = time.perf_counter()
+    try:
+        # 变体名可以带目录（如 dist/tenant_a.zip），目录不存在时先创建
+        os.makedirs(os.path.dirname(name) or '.', exist_ok=True)
+        generate_and_zip_project(file_map, zip_filename=name, verbose=False, **build_options)
+    except Exception as e:
+        return {'name': name, 'ok': False, 'error': f'{type(e).__name__}: {e}',
+                'seconds': time.perf_counter() - started, 'size': None, 'sha256': None}
+    return {'name': name, 'ok': True, 'error': None,
+            'seconds': time.perf_counter() - started, 'size': os.path.getsize(name),
+            'sha256': file_sha256(name) if build_options.get('reproducible') else None}
+
+
+def variant_file_map(variant, base_map=None, params=None, optimize=False):
+    # 单个变体的 file_map：公共 params 之上叠加变体自己的 params，再应用 overrides，最后按需优化
+    merged = dict(params or {}, **(variant.get('params') or {}))
+    file_map = apply_overrides(render_file_map(merged, base_map), variant.get('overrides'))
+    return optimize_file_map(file_map) if optimize else file_map
+
+
+def build_variants(variants, base_map=None, max_workers=None, params=None, optimize=False,
+                   **build_options):
+    # 按进程池并行构建多个变体，结果顺序与输入一致；params 为所有变体共用的模板参数，
+    # optimize 见 optimize_file_map；
+    # build_options 原样传给 generate_and_zip_project（use_temp_dir / cache_dir / compression 等）
+    from concurrent.futures import ProcessPoolExecutor
+
+    if base_map is None:
+        base_map = get_file_mapping()
+    names = [v['name'] for v in variants]
+    if len(set(names)) != len(names):
+        raise ValueError('变体的输出文件名 (name) 不能重复')
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_build_variant, v['name'],
+                            variant_file_map(v, base_map, params, optimize),
+                            build_options)
+            for v in variants
+        ]
+        return [future.result() for future in futures]
+
+
+def _print_variant_results(results):
+    for r in results:
+        if r['ok']:
+            sha = f"  sha256={r['sha256']}" if r['sha256'] else ''
+            print(f"✅ {r['name']}  {r['size']} 字节  {r['seconds'] * 1000:.1f} ms{sha}")
+        else:
+            print(f"❌ {r['name']}  {r['error']}")
+    failed = sum(1 for r in results if not r['ok'])
+    print(f"共 {len(results)} 个变体，失败 {failed} 个")
+
+
+# --- 5. 预压缩副本 (.gz / .br) ---
+# 静态服务器可直接返回预先压缩好的字节，请求时不再消耗 CPU 压缩
+TEXT_SUFFIXES = frozenset([
+    '.html', '.htm', '.js', '.mjs', '.css', '.vue', '.json', '.map', '.svg', '.txt', '.xml',
+])
+
+
+def _is_text_member(filepath):
+    return os.path.splitext(filepath)[1].lower() in TEXT_SUFFIXES
+
+
+@functools.lru_cache(maxsize=None)
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _resolve_use_brotli(use_brotli):
+    # None 表示"装了 brotli 就生成 .br"
+    if use_brotli is None:
+        return _brotli() is not None
+    if use_brotli and _brotli() is None:
+        raise RuntimeError('未安装 brotli 模块，无法生成 .br 副本')
+    return use_brotli
+
+
+def _sidecars_for(filepath, data, use_brotli):
+    # mtime=0 保证 .gz 输出稳定，可参与可复现构建与缓存
+    import gzip
+
+    sidecars = [(filepath + '.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if use_brotli:
+        sidecars.append((filepath + '.br', _brotli().compress(data)))
+    return sidecars
+
+
+def precompress_members(file_map, use_brotli=None, max_workers=None, translate_newlines=True):
+    # 为 file_map 中的每个文本成员生成 .gz（及 .br）副本，返回 {副本路径: 压缩后字节}。
+    # zlib / brotli 压缩时会释放 GIL，用线程池即可并行
+    from concurrent.futures import ThreadPoolExecutor
+
+    use_brotli = _resolve_use_brotli(use_brotli)
+    jobs = [(filepath, _encode_content(content, translate_newlines))
+            for filepath, content in file_map.items()
+            if _is_text_member(filepath)]
+
+    sidecars = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(lambda job: _sidecars_for(*job, use_brotli), jobs):
+            sidecars.update(result)
+    return sidecars
+
+
+def _precompress_file(path, use_brotli):
+    # 副本比源文件新时跳过，重复运行只处理有变化的文件
+    targets = [path + '.gz'] + ([path + '.br'] if use_brotli else [])
+    source_mtime = os.stat(path).st_mtime_ns
+    if all(os.path.exists(t) and os.stat(t).st_mtime_ns >= source_mtime for t in targets):
+        return 0
+    with open(path, 'rb') as f:
+        data = f.read()
+    for sidecar_path, payload in _sidecars_for(path, data, use_brotli):
+        _atomic_write(sidecar_path, payload)
+    return 1
+
+
+def precompress_directory(root, use_brotli=None, max_workers=None):
+    # 在 root（例如 dist）下为每个文本文件就地生成 .gz / .br 副本，返回本次处理的文件数
+    from concurrent.futures import ThreadPoolExecutor
+
+    use_brotli = _resolve_use_brotli(use_brotli)
+    paths = [os.path.join(dirpath, name)
+             for dirpath, _, names in os.walk(root)
+             for name in names
+             if _is_text_member(name)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(lambda path: _precompress_file(path, use_brotli), paths))
+
+
+# --- 6. 内存中构建与流式输出 ---
+# 按请求生成压缩包并直接上传/返回给 HTTP 响应时，不需要先落盘：
+# write_zip 写入任意可写对象（不要求可 seek），iter_zip_chunks 逐块产出字节，
+# 输出缓冲区最多只保留一个成员的压缩数据，与压缩包总大小无关
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink:
+    # 只追加、不可 seek 的输出缓冲；ZipFile 发现目标不可 seek 时会自己记录写入位置
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self, chunk_size, final=False):
+        while len(self._buffer) >= chunk_size or (final and self._buffer):
+            chunk = bytes(self._buffer[:chunk_size])
+            del self._buffer[:chunk_size]
+            yield chunk
+
+
+def write_zip(fileobj, file_map, compression='deflate', reproducible=False, precompress=False,
+              cache_dir=None, on_event=None, cancel_event=None, integrity=True):
+    # 把压缩包写入 fileobj（BytesIO、socket 包装、HTTP 响应体等），返回构建摘要；
+    # integrity=True 时清单内嵌在压缩包中，摘要的 'integrity' 字段也带一份
+    started = time.perf_counter()
+    file_map, policy, metrics = _prepare_build(file_map, compression, reproducible,
+                                               precompress, on_event)
+    cache = BuildCache(cache_dir) if cache_dir else None
+    members = _iter_members(file_map, policy, reproducible, metrics, with_keys=cache is not None)
+    entries = [] if integrity else None
+    _drive_archive(_write_archive(fileobj, members, reproducible, cache, metrics, entries, policy),
+                   cancel_event)
+    summary = metrics.finish('<stream>', True, time.perf_counter() - started)
+    if integrity:
+        summary['integrity'] = integrity_manifest(entries)
+    return summary
+
+
+def build_zip_in_memory(file_map, **options):
+    # 在内存中构建压缩包，返回定位到开头的 BytesIO；需要 bytes 时调用 .getvalue()
+    import io
+
+    buffer = io.BytesIO()
+    write_zip(buffer, file_map, **options)
+    buffer.seek(0)
+    return buffer
+
+
+def iter_zip_chunks(file_map, chunk_size=STREAM_CHUNK_SIZE, compression='deflate',
+                    reproducible=False, precompress=False, cache_dir=None, on_event=None,
+                    integrity=True, cancel_event=None):
+    # 生成器：边构建边产出 chunk_size 大小的字节块，可直接交给流式 HTTP 响应或分片上传。
+    # cancel_event 的含义与 generate_and_zip_project 相同：每个成员之间检查一次，置位后抛出 BuildCancelled
+    started = time.perf_counter()
+    file_map, policy, metrics = _prepare_build(file_map, compression, reproducible,
+                                               precompress, on_event)
+    cache = BuildCache(cache_dir) if cache_dir else None
+    members = _iter_members(file_map, policy, reproducible, metrics, with_keys=cache is not None)
+
+    sink = _ChunkSink()
+    archive = _write_archive(sink, members, reproducible, cache, metrics, [] if integrity else None, policy)
+    try:
+        for _ in archive:
+            yield from sink.drain(chunk_size)
+            _check_cancelled(cancel_event)
+    finally:
+        archive.close()
+    yield from sink.drain(chunk_size, final=True)
+    metrics.finish('<stream>', True, time.perf_counter() - started)
+
+
+# --- 7. asyncio 前端 ---
+# 基于 asyncio 的构建服务不能直接调用 generate_and_zip_project：压缩、写文件、删除临时目录
+# 都会阻塞事件循环。这里把整个构建放到线程池执行（zlib 压缩与文件 I/O 会释放 GIL，
+# 多个构建可以真正并行），用信号量限制同时进行的构建数。
+# 调用方取消任务时，工作线程在当前成员写完后停止、删除未写完的压缩包，然后才向上抛出 CancelledError
+def _default_async_concurrency():
+    return os.cpu_count() or 1
+
+
+async def _run_in_executor_cancellable(executor, build, on_event=None):
+    # build(cancel_event, on_event) 在线程池中执行；on_event 回调被转回事件循环线程调用
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    cancel_event = threading.Event()
+    forward = None if on_event is None else (lambda event: loop.call_soon_threadsafe(on_event, event))
+
+    future = loop.run_in_executor(executor, build, cancel_event, forward)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        # 等工作线程清理完再抛出，保证调用方看到取消时磁盘上没有残留的半成品
+        await asyncio.wait([future])
+        if not future.cancelled():
+            future.exception()
+        raise
+
+
+async def generate_and_zip_project_async(file_map, zip_filename=ZIP_FILENAME, executor=None,
+                                         on_event=None, **build_options):
+    # generate_and_zip_project 的异步版本（不打印输出），返回 zip_filename；
+    # executor 为 None 时使用事件循环的默认线程池，build_options 同 generate_and_zip_project
+    def build(cancel_event, forward):
+        return generate_and_zip_project(file_map, zip_filename=zip_filename, verbose=False,
+                                        on_event=forward, cancel_event=cancel_event,
+                                        **build_options)
+
+    return await _run_in_executor_cancellable(executor, build, on_event)
+
+
+async def build_zip_bytes_async(file_map, executor=None, on_event=None, **options):
+    # build_zip_in_memory 的异步版本，返回压缩包字节，适合直接上传
+    def build(cancel_event, forward):
+        return build_zip_in_memory(file_map, on_event=forward, cancel_event=cancel_event,
+                                   **options).getvalue()
+
+    return await _run_in_executor_cancellable(executor, build, on_event)
+
+
+class AsyncBuilder:
+    # 供构建服务长期持有：最多 max_concurrency 个构建同时进行，其余在信号量上排队；
+    # 使用独立的线程池，不挤占事件循环默认线程池（DNS 解析、文件操作等也依赖它）
+    def __init__(self, max_concurrency=None):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.max_concurrency = max_concurrency or _default_async_concurrency()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix='daima-build')
+
+    async def build(self, file_map, zip_filename=ZIP_FILENAME, **build_options):
+        async with self._semaphore:
+            return await generate_and_zip_project_async(file_map, zip_filename, self._executor,
+                                                        **build_options)
+
+    async def build_bytes(self, file_map, **options):
+        async with self._semaphore:
+            return await build_zip_bytes_async(file_map, self._executor, **options)
+
+    async def aclose(self):
+        # 等待已提交的构建结束后关闭线程池；关闭过程本身也不阻塞事件循环
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+# --- 8. 外部菜单数据集 (CSV / JSON / JSONL) ---
+# 十万级菜品不能再作为一个巨大的字面量塞进 food.js：逐条流式读取并校验数据集，
+# 按餐次切成固定大小的 JSON 分片放到 public/menu/ 下，food.js 只内嵌分片清单，运行时按餐次懒加载。
+# 读取过程只保留当前这一条记录、每个餐次未写满的一个分片以及用于去重的菜名集合。
+#   CSV:   表头含 meal,name,materials,tags,calorie,protein,fat；materials / tags 用 "|" 分隔
+#   JSONL: 每行一个菜品对象，含 meal 字段
+#   JSON:  菜品对象数组（含 meal 字段），或与 DEFAULT_MENU 相同的 {餐次: [菜品...]} 结构
+MENU_SHARD_SIZE = 1000
+MENU_SHARD_DIR = 'public/menu'
+MENU_LIST_SEPARATOR = '|'
+MENU_NUTRITION_KEYS = ('calorie', 'protein', 'fat')
+MENU_FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class MenuDataError(ValueError):
+    pass
+
+
+class _JsonStreamReader:
+    # 增量解析 JSON 文本：一次只解码一个值，缓冲区只保留尚未解析的部分
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self, f, chunk_size=64 * 1024):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self._WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise MenuDataError(f"JSON 格式错误：应为 {char!r}，实际为 {found or 'EOF'!r}")
+        self._pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise MenuDataError(f'JSON 格式错误：{e}') from None
+                self._fill()
+                continue
+            # 值恰好结束在缓冲区末尾时（例如数字）可能被截断，读入更多内容后重新解码
+            if end == len(self._buffer) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self._pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise MenuDataError(f"JSON 格式错误：数组元素之间应为 ',' 实际为 {separator or 'EOF'!r}")
+
+    def iter_object_arrays(self):
+        # {键: [元素...], ...} -> 逐个产出 (键, 元素)
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            for item in self.iter_array():
+                yield key, item
+            separator = self.peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise MenuDataError(f"JSON 格式错误：对象成员之间应为 ',' 实际为 {separator or 'EOF'!r}")
+
+
+def _split_list(value):
+    return [item.strip() for item in (value or '').split(MENU_LIST_SEPARATOR) if item.strip()]
+
+
+def _iter_csv_records(f):
+    import csv
+
+    reader = csv.DictReader(f)
+    missing = {'meal', 'name'} - set(reader.fieldnames or ())
+    if missing:
+        raise MenuDataError(f"CSV 表头缺少列: {', '.join(sorted(missing))}")
+    for row in reader:
+        yield reader.line_num, row.get('meal'), {
+            'name': (row.get('name') or '').strip(),
+            'materials': _split_list(row.get('materials')),
+            'nutrition': {key: (row.get(key) or '').strip() for key in MENU_NUTRITION_KEYS},
+            'tags': _split_list(row.get('tags')),
+        }
+
+
+def _iter_jsonl_records(f):
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise MenuDataError(f'第 {line_no} 行: JSON 格式错误：{e}') from None
+        yield line_no, record.get('meal') if isinstance(record, dict) else None, record
+
+
+def _iter_json_records(f):
+    reader = _JsonStreamReader(f)
+    if reader.peek() == '{':
+        for record_no, (meal, record) in enumerate(reader.iter_object_arrays(), 1):
+            yield record_no, meal, record
+    else:
+        for record_no, record in enumerate(reader.iter_array(), 1):
+            yield record_no, record.get('meal') if isinstance(record, dict) else None, record
+
+
+_MENU_READERS = {'csv': _iter_csv_records, 'jsonl': _iter_jsonl_records, 'json': _iter_json_records}
+
+
+def iter_menu_records(path, fmt=None):
+    # 逐条产出 (记录号, 餐次, 原始菜品)；fmt 省略时按扩展名判断（见 MENU_FORMATS）
+    if fmt is None:
+        fmt = MENU_FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise MenuDataError(f"无法根据扩展名判断菜单数据格式: '{path}'")
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        try:
+            yield from _MENU_READERS[fmt](f)
+        except MenuDataError as e:
+            raise MenuDataError(f"'{path}': {e}") from None
+
+
+def _string_list(value, field):
+    if not isinstance(value, list) or not all(isinstance(v, str) and v.strip() for v in value):
+        raise MenuDataError(f'{field} 必须是非空字符串组成的数组')
+    return [v.strip() for v in value]
+
+
+def normalize_dish(record):
+    # 按 addFoodItem 使用的结构校验并规范化一条菜品：
+    # {name: 非空字符串, materials: [字符串], nutrition: {calorie, protein, fat: 等级字符串}, tags: [字符串]}
+    if not isinstance(record, dict):
+        raise MenuDataError('菜品必须是 JSON 对象')
+    name = record.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise MenuDataError('name 必须是非空字符串')
+    nutrition = record.get('nutrition')
+    if not isinstance(nutrition, dict):
+        raise MenuDataError('nutrition 必须是对象')
+    for key in MENU_NUTRITION_KEYS:
+        level = nutrition.get(key)
+        if not isinstance(level, str) or not level.strip():
+            raise MenuDataError(f'nutrition.{key} 必须是非空字符串')
+    return {
+        'name': name.strip(),
+        'materials': _string_list(record.get('materials', []), 'materials'),
+        'nutrition': {key: nutrition[key].strip() for key in MENU_NUTRITION_KEYS},
+        'tags': _string_list(record.get('tags', []), 'tags'),
+    }
+
+
+def iter_menu_dataset(path, fmt=None, meals=None, skip_invalid=False, stats=None):
+    # 逐条产出校验、去重后的 (餐次, 菜品)。同一餐次内菜名重复时保留第一条（与 addFoodItem 一致）。
+    # skip_invalid=True 时跳过不合法的记录而不是报错；stats 字典会累计各类计数
+    meals = tuple(DEFAULT_MENU) if meals is None else tuple(meals)
+    if stats is None:
+        stats = {}
+    for key in ('records', 'dishes', 'duplicates', 'invalid'):
+        stats.setdefault(key, 0)
+    seen = {meal: set() for meal in meals}
+
+    for record_no, meal, record in iter_menu_records(path, fmt):
+        stats['records'] += 1
+        try:
+            if meal not in seen:
+                raise MenuDataError(f"meal 必须是 {' / '.join(meals)} 之一，实际为 {meal!r}")
+            dish = normalize_dish(record)
+        except MenuDataError as e:
+            if not skip_invalid:
+                raise MenuDataError(f"'{path}' 第 {record_no} 条记录: {e}") from None
+            stats['invalid'] += 1
+            continue
+        if dish['name'] in seen[meal]:
+            stats['duplicates'] += 1
+            continue
+        seen[meal].add(dish['name'])
+        stats['dishes'] += 1
+        yield meal, dish
+
+
+def _menu_shard(meal, number, dishes, shard_dir, encoding='compact'):
+    # 分片文件名带内容哈希，可以放心交给 CDN 长期缓存；compact 分片各自带字符串表，可独立解码
+    payload = encode_menu_compact({meal: dishes}) if encoding == 'compact' else dishes
+    content = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+    return f'{shard_dir}/{meal}/{number:05d}-{digest}.json', content
+
+
+def build_menu_shards(dishes, meals=None, shard_size=MENU_SHARD_SIZE, shard_dir=MENU_SHARD_DIR,
+                      encoding='compact', base_url=''):
+    # 把 (餐次, 菜品) 流切成每片 shard_size 道菜的 JSON 分片。
+    # 返回 ({分片路径: 内容}, 清单)；清单中的 URL 相对于站点根目录（public/ 下的文件发布在根目录），
+    # 运行时拼在 base_url 之后（小程序 / App 中没有页面地址，需要给出站点或 CDN 地址）。
+    # version 由全部分片的内容哈希得出，数据集变化时客户端据此丢弃旧的加载记录
+    if shard_size < 1:
+        raise ValueError('shard_size 必须大于 0')
+    if encoding not in MENU_ENCODINGS:
+        raise ValueError(f"未知的菜单编码 '{encoding}'，可选: {', '.join(MENU_ENCODINGS)}")
+    meals = tuple(DEFAULT_MENU) if meals is None else tuple(meals)
+    public_root = shard_dir.split('/', 1)[0] + '/' if shard_dir.startswith('public/') else ''
+    shards = {}
+    manifest = {'shardSize': shard_size, 'baseUrl': base_url,
+                'meals': {meal: {'count': 0, 'shards': []} for meal in meals}}
+    pending = {meal: [] for meal in meals}
+
+    def flush(meal):
+        entry = manifest['meals'][meal]
+        path, content = _menu_shard(meal, len(entry['shards']), pending[meal], shard_dir, encoding)
+        shards[path] = content
+        entry['shards'].append(path[len(public_root):])
+        pending[meal] = []
+
+    for meal, dish in dishes:
+        pending[meal].append(dish)
+        manifest['meals'][meal]['count'] += 1
+        if len(pending[meal]) >= shard_size:
+            flush(meal)
+    for meal in meals:
+        if pending[meal]:
+            flush(meal)
+    manifest['version'] = hashlib.sha256(
+        '\n'.join(sorted(shards)).encode('utf-8')).hexdigest()[:16]
+    return shards, manifest
+
+
+def menu_dataset_params(manifest):
+    # 使用外部数据集时 food.js 的模板参数：defaultMenu 只保留空的餐次，菜品全部来自分片
+    return {'default_menu': menu_to_js({meal: [] for meal in manifest['meals']}),
+            'default_menu_index': 'null',
+            'menu_manifest': menu_index_to_js(manifest)}
+
+
+def load_menu_dataset(path, fmt=None, shard_size=MENU_SHARD_SIZE, skip_invalid=False,
+                      encoding='compact', base_url=''):
+    # 一步完成读取、校验、去重与分片；返回 (分片 file_map, 模板参数, 统计)
+    stats = {}
+    dishes = iter_menu_dataset(path, fmt, skip_invalid=skip_invalid, stats=stats)
+    shards, manifest = build_menu_shards(dishes, shard_size=shard_size, encoding=encoding, base_url=base_url)
+    return shards, menu_dataset_params(manifest), stats
+
+
+# --- 9. 加权随机选菜（food.js 中 pickFood 的 Python 参考实现） ---
+# 与生成的 store 使用同一套算法：每个餐次一棵树状数组，抽样与修改单个权重都是 O(log n)；
+# 最近选过的菜放在环形缓冲区中，期间权重置 0。用于验证 JS 实现与基准测试（见 bench_daima.py）
+RECENT_SIZE = 3
+
+
+def dish_weight(dish, weights=None):
+    # weights 格式同 store.setPickWeights：{'tags': {...}, 'materials': {...}, 'nutrition': {键: {等级: 系数}}}
+    if not weights:
+        return 1.0
+    weight = 1.0
+    for field in ('tags', 'materials'):
+        factors = weights.get(field) or {}
+        for value in dish.get(field, ()):
+            weight *= factors.get(value, 1.0)
+    nutrition = dish.get('nutrition', {})
+    for key, factors in (weights.get('nutrition') or {}).items():
+        if key in nutrition:
+            weight *= factors.get(nutrition[key], 1.0)
+    return weight
+
+
+class FenwickSampler:
+    def __init__(self, weights=()):
+        self._weights = [float(w) for w in weights]
+        self._tree = [0.0] + self._weights
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._weights)
+
+    def weight(self, position):
+        return self._weights[position]
+
+    def _add(self, position, delta):
+        i = position + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, count):
+        total = 0.0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def set(self, position, weight):
+        self._add(position, weight - self._weights[position])
+        self._weights[position] = weight
+
+    def append(self, weight):
+        # 新节点 i 覆盖 (i - lowbit(i), i]，其和 = weight + 前面 lowbit(i) - 1 个元素之和
+        i = len(self._tree)
+        self._weights.append(float(weight))
+        self._tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+
+    def total(self):
+        return self._prefix(len(self._weights))
+
+    def sample(self, random_value):
+        # random_value ∈ [0, 1)；返回按权重抽中的下标，总权重为 0 时返回 -1
+        total = self.total()
+        if total <= 0:
+            return -1
+        target = random_value * total
+        position = 0
+        step = 1 << (len(self._weights).bit_length() - 1)
+        while step:
+            following = position + step
+            if following <= len(self._weights) and self._tree[following] <= target:
+                position = following
+                target -= self._tree[following]
+            step >>= 1
+        # 浮点误差可能让结果落在权重为 0 的位置上，就近找一个有效位置
+        while position < len(self._weights) and self._weights[position] <= 0:
+            position += 1
+        if position >= len(self._weights):
+            position = len(self._weights) - 1
+            while position >= 0 and self._weights[position] <= 0:
+                position -= 1
+        return position
+
+
+class FoodPicker:
+    # 与 useFoodStore 的 pickFood 行为一致：按偏好加权，排除最近 recent_size 次选中的菜，
+    # 候选全部被排除时退回到等概率选择
+    def __init__(self, menu, weights=None, recent_size=RECENT_SIZE, rng=None):
+        import random
+        from collections import deque
+
+        self.menu = menu
+        self.weights = weights
+        self._rng = rng or random.Random()
+        self._recent = deque(maxlen=recent_size)
+        self._recent_counts = {}
+        self._positions = {meal: {dish['name']: i for i, dish in reversed(list(enumerate(dishes)))}
+                           for meal, dishes in menu.items()}
+        self._samplers = {meal: FenwickSampler(dish_weight(d, weights) for d in dishes)
+                          for meal, dishes in menu.items()}
+
+    def _set_recent_weight(self, name, recent):
+        for meal, sampler in self._samplers.items():
+            position = self._positions[meal].get(name)
+            if position is not None:
+                dish = self.menu[meal][position]
+                sampler.set(position, 0.0 if recent else dish_weight(dish, self.weights))
+
+    def _push_recent(self, name):
+        if len(self._recent) == self._recent.maxlen:
+            evicted = self._recent[0]
+            self._recent_counts[evicted] -= 1
+            if not self._recent_counts[evicted]:
+                del self._recent_counts[evicted]
+                self._set_recent_weight(evicted, False)
+        self._recent.append(name)
+        self._recent_counts[name] = self._recent_counts.get(name, 0) + 1
+        if self._recent_counts[name] == 1:
+            self._set_recent_weight(name, True)
+
+    def add(self, meal, dish):
+        if dish['name'] in self._positions.setdefault(meal, {}):
+            return False
+        dishes = self.menu.setdefault(meal, [])
+        self._positions[meal][dish['name']] = len(dishes)
+        dishes.append(dish)
+        weight = 0.0 if dish['name'] in self._recent_counts else dish_weight(dish, self.weights)
+        self._samplers.setdefault(meal, FenwickSampler()).append(weight)
+        return True
+
+    def pick(self, meal):
+        dishes = self.menu.get(meal) or []
+        if not dishes:
+            return None
+        position = self._samplers[meal].sample(self._rng.random())
+        if position == -1:
+            position = self._rng.randrange(len(dishes))
+        choice = dishes[position]
+        self._push_recent(choice['name'])
+        return choice
+
+
+# --- 10. 买菜清单（food.js 中 _ShoppingList 的 Python 参考实现） ---
+# 倒排索引：规范化食材名 -> 出现次数与来源菜品；加入 / 移除一道菜只处理它自己的食材
+QUANTITY_PREFIXES = ('少量', '适量', '少许', '若干')
+
+
+def normalize_material(name):
+    # 全角转半角（NFKC）、合并空白、英文小写，并去掉“少量 / 适量”等用量前缀
+    import unicodedata
+
+    key = ' '.join(unicodedata.normalize('NFKC', str(name)).split()).lower()
+    for prefix in QUANTITY_PREFIXES:
+        if len(key) > len(prefix) and key.startswith(prefix):
+            return key[len(prefix):].strip()
+    return key
+
+
+class ShoppingList:
+    def __init__(self, dishes=()):
+        self._items = {}
+        self._dishes = {}
+        self.dish_count = 0
+        for dish in dishes:
+            self.add(dish)
+
+    def add(self, dish):
+        entry = self._dishes.get(dish['name'])
+        if entry is None:
+            keys = dict.fromkeys(k for k in map(normalize_material, dish.get('materials', ())) if k)
+            entry = self._dishes[dish['name']] = {'keys': list(keys), 'times': 0}
+        entry['times'] += 1
+        self.dish_count += 1
+        for key in entry['keys']:
+            item = self._items.setdefault(key, {'count': 0, 'dishes': {}})
+            item['count'] += 1
+            item['dishes'][dish['name']] = item['dishes'].get(dish['name'], 0) + 1
+
+    def remove(self, name):
+        # 移除一次；没有加入过这道菜时返回 False
+        entry = self._dishes.get(name)
+        if entry is None:
+            return False
+        for key in entry['keys']:
+            item = self._items[key]
+            item['count'] -= 1
+            item['dishes'][name] -= 1
+            if not item['dishes'][name]:
+                del item['dishes'][name]
+            if not item['count']:
+                del self._items[key]
+        entry['times'] -= 1
+        self.dish_count -= 1
+        if not entry['times']:
+            del self._dishes[name]
+        return True
+
+    def items(self):
+        # [{'name', 'count', 'dishes'}]，按出现次数从多到少，同次数按名称排序
+        return sorted(({'name': key, 'count': item['count'], 'dishes': list(item['dishes'])}
+                       for key, item in self._items.items()),
+                      key=lambda item: (-item['count'], item['name']))
+
+
+# --- 11. 监视模式 ---
+# 进程常驻，轮询 daima.py（以及 --params / --menu 指定的文件）的修改时间。源码变化时在新的模块对象中
+# 重新执行它得到新的模板，与上一次的 FILE_MAPPING 逐个比较，只重写内容变化的文件；
+# 压缩包不随每次修改重建，在终端按回车时才打包（配合构建缓存，未变化的成员直接复用压缩结果）
+WATCH_DIR = 'watch_project_v5'
+WATCH_INTERVAL = 0.02
+
+
+def _load_generator(path):
+    # 重新执行 daima.py 源码，不影响当前进程中已导入的模块；语法错误等异常交给调用方处理
+    import types
+
+    with open(path, 'rb') as f:
+        code = compile(f.read(), path, 'exec')
+    module = types.ModuleType('daima')
+    module.__file__ = path
+    exec(code, module.__dict__)
+    return module
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def sync_tree(file_map, out_dir, previous=None):
+    # 把 file_map 同步到 out_dir：只写内容有变化的文件，删除 previous 中有而 file_map 中没有的文件。
+    # previous 为上一次同步的 file_map；为 None 时与磁盘上的现有文件比较。返回 (写入的路径, 删除的路径)
+    written = []
+    for filepath, content in file_map.items():
+        if previous is not None and previous.get(filepath) == content:
+            continue
+        full_path = os.path.join(out_dir, filepath)
+        data = _encode_content(content)
+        if previous is None:
+            try:
+                with open(full_path, 'rb') as f:
+                    if f.read() == data:
+                        continue
+            except OSError:
+                pass
+        os.makedirs(os.path.dirname(full_path) or '.', exist_ok=True)
+        _atomic_write(full_path, data)
+        written.append(filepath)
+    removed = []
+    for filepath in (previous or {}):
+        if filepath not in file_map:
+            try:
+                os.remove(os.path.join(out_dir, filepath))
+            except FileNotFoundError:
+                pass
+            removed.append(filepath)
+    return written, removed
+
+
+def _watch_requests(requests):
+    # 终端中每按一次回车请求打包一次；标准输入关闭时线程结束
+    for _ in sys.stdin:
+        requests.set()
+
+
+def watch(args, out_dir=WATCH_DIR, interval=WATCH_INTERVAL):
+    import random
+
+    source = os.path.abspath(__file__)
+    if args.meal_plan and args.plan_seed is None:
+        # 固定种子，否则每次重新生成都会排出不同的计划，food.js 总被当成有变化
+        args.plan_seed = random.randrange(2 ** 32)
+    module = sys.modules[__name__]
+    menu = _load_menu_option(args) if args.menu else None
+    if args.menu and menu is None:
+        return 1
+    file_map = _project_file_map(args, module, menu)
+    written, _ = sync_tree(file_map, out_dir)
+    print(f"👀 监视中: {len(file_map)} 个文件同步到 '{out_dir}'（写入 {len(written)} 个），"
+          f"按回车打包，Ctrl+C 退出", file=sys.stderr)
+
+    requests = threading.Event()
+    threading.Thread(target=_watch_requests, args=(requests,), daemon=True).start()
+    watched = [path for path in (source, args.params, args.menu) if path]
+    mtimes = {path: _mtime(path) for path in watched}
+    stale = True
+    try:
+        while True:
+            if requests.wait(interval):
+                requests.clear()
+                started = time.perf_counter()
+                module.generate_and_zip_project(file_map, zip_filename=module.ZIP_FILENAME,
+                                                cache_dir=args.cache_dir or CACHE_DIR,
+                                                reproducible=args.reproducible,
+                                                compression=args.compression,
+                                                precompress=args.precompress,
+                                                integrity=not args.no_integrity)
+                stale = False
+                print(f"📦 已打包 '{module.ZIP_FILENAME}'（{(time.perf_counter() - started) * 1000:.0f} ms）",
+                      file=sys.stderr)
+                continue
+
+            changed = [path for path in watched if _mtime(path) != mtimes[path]]
+            if not changed:
+                continue
+            started = time.perf_counter()
+            for path in changed:
+                mtimes[path] = _mtime(path)
+            try:
+                if source in changed:
+                    module = _load_generator(source)
+                if args.menu in changed:
+                    menu = _load_menu_option(args, module) or menu
+                new_map = _project_file_map(args, module, menu)
+            except Exception as e:
+                # 编辑到一半的源码可能暂时无法执行，保留上一次的结果，等下一次修改
+                print(f"⚠️ 重新生成失败，沿用上一次的结果: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            written, removed = sync_tree(new_map, out_dir, file_map)
+            file_map = new_map
+            if written or removed:
+                stale = True
+                print(f"⚡ 更新 {len(written)} 个、删除 {len(removed)} 个文件"
+                      f"（{(time.perf_counter() - started) * 1000:.0f} ms）: {', '.join(written + removed)}",
+                      file=sys.stderr)
+    except KeyboardInterrupt:
+        if stale:
+            print('ℹ️ 压缩包不是最新的，需要时重新运行并按回车打包', file=sys.stderr)
+    return 0
+
+
+# --- 12. 产物优化（压缩、清理无用 CSS、提取公共样式） ---
+# 可选的后处理（--optimize），只作用于渲染后的 file_map：
+#   * 去掉 JS / CSS / HTML 注释与缩进。JS 只做保守处理：保留换行（不依赖分号推断），字符串、
+#     模板字符串和正则字面量原样保留；
+#   * 删除选择器中引用了从未出现过的类名的规则。不带 scoped 的样式是全局生效的，要对照所有页面、
+#     脚本判断；scoped 样式只对照本组件。类名出现在任何位置（包括脚本字符串）都算用到，宁可少删；
+#     :class 绑定中拼接出的类名（'lvl-' + level）按字面量前缀保留；
+#   * 多个页面的全局样式中完全相同的规则只保留一份，放到入口 main.js 一定会加载的位置：入口挂载的
+#     根组件有全局样式块时放进该块（与根组件中重复的规则直接删去），否则放进 SHARED_STYLE_PATH 并在入口中导入。
+# 被改动过的样式块按规则重新输出，因此总是紧凑格式
+OPTIMIZE_SKIP = frozenset(['package.json'])
+ENTRY_SCRIPT = 'main.js'
+SHARED_STYLE_PATH = 'src/styles/shared.css'
+TRANSITION_CLASS_SUFFIXES = ('enter-from', 'enter-active', 'enter-to', 'leave-from', 'leave-active', 'leave-to')
+_NESTED_AT_RULES = ('@media', '@supports', '@keyframes', '@-webkit-keyframes', '@layer', '@container')
+_SFC_BLOCK = re.compile(r'<(script|style)\b([^>]*)>(.*?)</\1>', re.S)
+_CSS_COMMENT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+_CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+_CSS_CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_CLASS_WORD = re.compile(r'-?[_a-zA-Z][\w-]*')
+_HTML_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_TRANSITION_NAME = re.compile(r'<transition\b([^>]*)>')
+_CLASS_BINDING = re.compile(r'''(?:\bv-bind|(?<![\w-])):class\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+_JS_STRING_LITERAL = re.compile(r"'((?:\\.|[^'\\])*)'|\"((?:\\.|[^\"\\])*)\"|`((?:\\.|[^`\\])*)`")
+_ENTRY_IMPORT = re.compile(r'''^import\s+(\w+)\s+from\s+['"](\.{1,2}/[^'"]+\.vue)['"]''', re.M)
+_IMPORT_LINE = re.compile(r'^import\b.*$', re.M)
+_CREATE_APP = re.compile(r'\bcreateApp\(\s*(\w+)')
+_JS_REGEX_PRECEDERS = frozenset('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = frozenset(['return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                                'void', 'throw', 'instanceof', 'yield', 'await'])
+
+
+def _skip_quoted(src, i):
+    # src[i] 为引号，返回结束引号之后的位置
+    quote = src[i]
+    i += 1
+    while i < len(src) and src[i] != quote:
+        i += 2 if src[i] == '\\' else 1
+    return i + 1
+
+
+def _skip_regex(src, i):
+    # src[i] 为 '/'，返回正则字面量（含标志）之后的位置；同一行内没有结束的 '/' 时返回 None
+    in_class = False
+    i += 1
+    while i < len(src) and src[i] != '\n':
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < len(src) and (src[i].isalnum() or src[i] in '_$'):
+                i += 1
+            return i
+        i += 1
+    return None
+
+
+def _scan_template_literal(src, i, out):
+    # src[i] 为反引号；文本部分原样输出，${...} 内部按代码处理
+    start = i
+    i += 1
+    while i < len(src) and src[i] != '`':
+        if src[i] == '\\':
+            i += 2
+        elif src.startswith('${', i):
+            out.append(src[start:i + 2])
+            i = _scan_js(src, i + 2, out, nested=True)
+            start = i
+        else:
+            i += 1
+    out.append(src[start:i + 1])
+    return i + 1
+
+
+def _scan_js(src, i, out, nested=False):
+    # 去掉注释、把连续空白压成一个空格（含换行时为一个换行）。nested=True 时在同层的 '}' 前返回
+    depth = 0
+    last = ''
+    pending = ''
+    n = len(src)
+    while i < n:
+        c = src[i]
+        if c in ' \t\r\n':
+            j = i
+            while j < n and src[j] in ' \t\r\n':
+                j += 1
+            pending = '\n' if '\n' in src[i:j] or pending == '\n' else ' '
+            i = j
+            continue
+        if src.startswith('//', i):
+            j = src.find('\n', i)
+            i = n if j == -1 else j
+            continue
+        if src.startswith('/*', i):
+            j = src.find('*/', i + 2)
+            j = n if j == -1 else j + 2
+            pending = '\n' if '\n' in src[i:j] or pending == '\n' else (pending or ' ')
+            i = j
+            continue
+        if nested and c == '}' and depth == 0:
+            return i
+        if pending and out:
+            out.append(pending)
+        pending = ''
+        if c in '"\'':
+            j = _skip_quoted(src, i)
+            out.append(src[i:j])
+            last, i = '"', j
+        elif c == '`':
+            i = _scan_template_literal(src, i, out)
+            last = '`'
+        elif c == '/' and (not last or last in _JS_REGEX_PRECEDERS or last in _JS_REGEX_KEYWORDS) \
+                and _skip_regex(src, i) is not None:
+            j = _skip_regex(src, i)
+            out.append(src[i:j])
+            last, i = '/', j
+        elif c.isalnum() or c in '_$':
+            j = i
+            while j < n and (src[j].isalnum() or src[j] in '_$'):
+                j += 1
+            out.append(src[i:j])
+            last, i = src[i:j], j
+        else:
+            if nested and c == '{':
+                depth += 1
+            elif nested and c == '}':
+                depth -= 1
+            out.append(c)
+            last, i = c, i + 1
+    return i
+
+
+def minify_js(src):
+    out = []
+    _scan_js(src, 0, out)
+    return ''.join(out).strip()
+
+
+def minify_markup(html):
+    # 与 Vue 编译模板时的 whitespace: 'condense' 等价：去掉标签之间只含换行的空白，其余换行压成一个空格
+    html = _HTML_COMMENT.sub('', html)
+    html = re.sub(r'>\s*\n\s*<', '><', html)
+    return re.sub(r'\s*\n\s*', ' ', html).strip()
+
+
+def _strip_css_comments(css):
+    return _CSS_COMMENT.sub(lambda m: m.group(1) or '', css)
+
+
+def _find_block_end(css, i):
+    # 从 '{' 之后的 i 开始，返回与之配对的 '}' 的位置（跳过字符串）
+    while i < len(css) and css[i] != '}':
+        i = _skip_quoted(css, i) if css[i] in '"\'' else i + 1
+    return i
+
+
+def parse_css(css, i=0):
+    # 返回 ([(前导, 主体)], 结束位置)。主体为声明字符串；@media / @keyframes 等为嵌套的规则列表；
+    # @import 之类的语句规则主体为 None
+    rules = []
+    start = i
+    while i < len(css):
+        c = css[i]
+        if c in '"\'':
+            i = _skip_quoted(css, i)
+        elif c == '{':
+            prelude = css[start:i].strip()
+            if prelude.startswith(_NESTED_AT_RULES):
+                body, i = parse_css(css, i + 1)
+            else:
+                end = _find_block_end(css, i + 1)
+                body, i = css[i + 1:end], end + 1
+            rules.append((prelude, body))
+            start = i
+        elif c == '}':
+            return rules, i + 1
+        elif c == ';' and css[start:i].strip().startswith('@'):
+            rules.append((css[start:i].strip(), None))
+            i += 1
+            start = i
+        else:
+            i += 1
+    return rules, i
+
+
+def _squeeze_css(text, around):
+    # 压缩字符串以外的空白，并去掉 around 中符号两侧的空格
+    parts = _CSS_STRING.split(text)
+    for k in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[k])
+        if around:
+            part = re.sub(r'\s*([' + re.escape(around) + r'])\s*', r'\1', part)
+        parts[k] = part
+    return ''.join(parts).strip()
+
+
+def _split_top_level(text, separator):
+    # 按 separator 切分，忽略括号和字符串内的分隔符（如 url(data:...;base64,...)、:is(.a, .b)）
+    parts = []
+    depth = 0
+    start = i = 0
+    while i < len(text):
+        c = text[i]
+        if c in '"\'':
+            i = _skip_quoted(text, i)
+            continue
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif c == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _minify_declarations(body):
+    declarations = []
+    for declaration in _split_top_level(body, ';'):
+        name, colon, value = declaration.partition(':')
+        if colon and name.strip():
+            value = _squeeze_css(value, ',').replace(' !', '!')
+            declarations.append(f'{name.strip()}:{value}')
+    return ';'.join(declarations)
+
+
+def _minify_prelude(prelude):
+    if prelude.startswith('@'):
+        return _squeeze_css(prelude, '')
+    return ','.join(_squeeze_css(selector, '>+~') for selector in _split_top_level(prelude, ','))
+
+
+def emit_css(rules):
+    out = []
+    for prelude, body in rules:
+        if body is None:
+            out.append(_squeeze_css(prelude, '') + ';')
+        elif isinstance(body, list):
+            out.append(f'{_minify_prelude(prelude)}{{{emit_css(body)}}}')
+        else:
+            declarations = _minify_declarations(body)
+            if declarations:
+                out.append(f'{_minify_prelude(prelude)}{{{declarations}}}')
+    return ''.join(out)
+
+
+def used_class_names(markup):
+    # markup 中出现过的所有可能的类名，加上 <transition> 自动添加的过渡类名
+    used = set(_CLASS_WORD.findall(markup))
+    for attrs in _TRANSITION_NAME.findall(markup):
+        match = re.search(r'\bname="([^"]+)"', attrs)
+        name = match.group(1) if match else 'v'
+        used.update(f'{name}-{suffix}' for suffix in TRANSITION_CLASS_SUFFIXES)
+    return used
+
+
+def dynamic_class_prefixes(markup):
+    # :class / v-bind:class 表达式中拼接类名用到的字符串字面量（如 'lvl-' + level、`lvl-${level}`）。
+    # 以其中任何一个开头的类名都可能在运行时出现，清理时一律保留
+    prefixes = set()
+    for match in _CLASS_BINDING.finditer(markup):
+        expression = match.group(1) if match.group(1) is not None else match.group(2)
+        for literal in _JS_STRING_LITERAL.finditer(expression):
+            if literal.group(3) is not None:
+                # 模板字符串：每个 ${...} 之前的静态部分都是前缀
+                segments = re.split(r'\$\{[^}]*\}', literal.group(3))[:-1]
+            else:
+                segments = [literal.group(1) if literal.group(1) is not None else literal.group(2)]
+            for segment in segments:
+                if segment and not segment[-1].isspace():
+                    prefixes.add(segment.split()[-1])
+    return tuple(sorted(prefixes))
+
+
+def prune_css(rules, used, stats=None, prefixes=()):
+    # 删除选择器引用了 used 以外类名的规则；选择器列表只保留还能匹配的部分。@keyframes 等不处理。
+    # 以 prefixes（见 dynamic_class_prefixes）中任一字符串开头的类名视为用到
+    kept = []
+    for prelude, body in rules:
+        if isinstance(body, list):
+            if not prelude.startswith(('@keyframes', '@-webkit-keyframes')):
+                body = prune_css(body, used, stats, prefixes)
+                if not body:
+                    continue
+        elif body is not None and not prelude.startswith('@'):
+            selectors = _split_top_level(prelude, ',')
+            alive = [s for s in selectors
+                     if '(' in s or all(name in used or name.startswith(prefixes) for name in _CSS_CLASS.findall(s))]
+            if stats is not None:
+                stats['pruned'] = stats.get('pruned', 0) + len(selectors) - len(alive)
+            if not alive:
+                continue
+            prelude = ','.join(s.strip() for s in alive)
+        kept.append((prelude, body))
+    return kept
+
+
+def _split_sfc(content):
+    # [[类型, 属性, 内容]]；类型为 'text' / 'template' / 'script' / 'style'，顶层 <template> 可以嵌套
+    parts = []
+    start = content.find('<template')
+    end = content.rfind('</template>')
+    pos = 0
+    if start != -1 and end > start:
+        open_end = content.index('>', start) + 1
+        parts.append(['text', '', content[:start]])
+        parts.append(['template', content[start + len('<template'):open_end - 1], content[open_end:end]])
+        pos = end + len('</template>')
+    for match in _SFC_BLOCK.finditer(content, pos):
+        parts.append(['text', '', content[pos:match.start()]])
+        parts.append([match.group(1), match.group(2), match.group(3)])
+        pos = match.end()
+    parts.append(['text', '', content[pos:]])
+    return parts
+
+
+def _join_sfc(parts, minify):
+    out = []
+    for kind, attrs, body in parts:
+        if kind == 'text':
+            out.append(body.strip() if minify else body)
+        elif kind == 'style' and not body.strip():
+            continue
+        else:
+            out.append(f'<{kind}{attrs}>{body}</{kind}>')
+    return ''.join(out) + '\n' if minify else ''.join(out)
+
+
+def _rule_key(prelude, body):
+    return _minify_prelude(prelude), _minify_declarations(body)
+
+
+def _mounted_root(file_map, entry=ENTRY_SCRIPT):
+    # 入口脚本中 createApp(X) 挂载的根组件路径；找不到时返回 None
+    import posixpath
+
+    source = file_map.get(entry)
+    mounted = _CREATE_APP.search(source) if isinstance(source, str) else None
+    if mounted is None:
+        return None
+    for name, spec in _ENTRY_IMPORT.findall(source):
+        if name == mounted.group(1):
+            return posixpath.normpath(posixpath.join(posixpath.dirname(entry), spec))
+    return None
+
+
+def _import_stylesheet(source, entry, stylesheet):
+    # 在入口脚本最后一条 import 之后导入 stylesheet
+    import posixpath
+
+    spec = posixpath.relpath(stylesheet, posixpath.dirname(entry) or '.')
+    line = f"import '{spec if spec.startswith('.') else './' + spec}'"
+    imports = list(_IMPORT_LINE.finditer(source))
+    if not imports:
+        return f'{line}\n{source}'
+    at = imports[-1].end()
+    return f'{source[:at]}\n{line}{source[at:]}'
+
+
+def _hoist_shared_rules(styles, target, stats=None):
+    # styles: {路径: [全局样式块的规则列表]}（就地修改）。多个页面中完全相同的规则，或与 target 重复的规则，
+    # 只在 target 的第一个全局样式块中保留一份；target 不在 styles 中时（独立样式表）新建一个块。
+    # 同一样式表中还有同选择器的其他规则时不移动，避免改变层叠顺序；target 中已有同选择器的规则时也不移动
+    # （放到 target 末尾会覆盖 target 自己的规则），只有它是 target 中该选择器唯一的规则且完全相同时才去重
+    target_selectors = {}
+    for rules in styles.get(target, ()):
+        for prelude, body in rules:
+            if isinstance(body, str) and not prelude.startswith('@'):
+                selector = _minify_prelude(prelude)
+                target_selectors[selector] = target_selectors.get(selector, 0) + 1
+    app_keys = {_rule_key(p, b) for rules in styles.get(target, ()) for p, b in rules
+                if isinstance(b, str) and not p.startswith('@')
+                and target_selectors[_minify_prelude(p)] == 1}
+    owners = {}
+    movable = {}
+    for path, blocks in styles.items():
+        if path == target:
+            continue
+        selectors = {}
+        for rules in blocks:
+            for prelude, body in rules:
+                if isinstance(body, str) and not prelude.startswith('@'):
+                    selector = _minify_prelude(prelude)
+                    selectors[selector] = selectors.get(selector, 0) + 1
+        movable[path] = {selector for selector, count in selectors.items() if count == 1}
+        for rules in blocks:
+            for prelude, body in rules:
+                if isinstance(body, str) and not prelude.startswith('@'):
+                    key = _rule_key(prelude, body)
+                    if key[0] in movable[path] and (key in app_keys or key[0] not in target_selectors):
+                        owners.setdefault(key, set()).add(path)
+    shared = {key for key, paths in owners.items() if len(paths) > 1 or key in app_keys}
+    if not shared:
+        return 0
+    hoisted = []
+    for path, blocks in styles.items():
+        if path == target:
+            continue
+        for rules in blocks:
+            remaining = []
+            for prelude, body in rules:
+                key = _rule_key(prelude, body) if isinstance(body, str) and not prelude.startswith('@') else None
+                if key in shared:
+                    if key not in app_keys:
+                        app_keys.add(key)
+                        hoisted.append((prelude, body))
+                else:
+                    remaining.append((prelude, body))
+            rules[:] = remaining
+    styles.setdefault(target, [[]])[0].extend(hoisted)
+    if stats is not None:
+        stats['hoisted'] = stats.get('hoisted', 0) + len(shared)
+    return len(shared)
+
+
+def optimize_file_map(file_map, minify=True, prune=True, hoist=True, stats=None):
+    # 返回优化后的新 file_map（不修改传入的字典）。stats 字典会记录优化前后的字节数、
+    # 删除的选择器数（pruned）与提取出的公共规则数（hoisted）
+    if stats is None:
+        stats = {}
+    stats.setdefault('pruned', 0)
+    stats.setdefault('hoisted', 0)
+    result = dict(file_map)
+    components = {path: _split_sfc(content) for path, content in file_map.items()
+                  if path.endswith('.vue') and isinstance(content, str)}
+    markup = [content for path, content in file_map.items()
+              if isinstance(content, str) and path.endswith(('.js', '.html'))]
+    for parts in components.values():
+        markup.extend(body for kind, _, body in parts if kind in ('template', 'script'))
+    used_globally = used_class_names('\n'.join(markup))
+    prefixes_globally = dynamic_class_prefixes('\n'.join(markup))
+
+    styles = {}
+    parsed = []
+    for path, parts in components.items():
+        markup_here = '\n'.join(body for kind, _, body in parts if kind in ('template', 'script'))
+        used_here = used_class_names(markup_here)
+        prefixes_here = dynamic_class_prefixes(markup_here)
+        for part in parts:
+            if part[0] != 'style':
+                continue
+            scoped = re.search(r'\bscoped\b', part[1]) is not None
+            rules, _ = parse_css(_strip_css_comments(part[2]))
+            if prune:
+                if scoped:
+                    rules = prune_css(rules, used_here, stats, prefixes_here)
+                else:
+                    rules = prune_css(rules, used_globally, stats, prefixes_globally)
+            parsed.append((part, rules))
+            if not scoped:
+                styles.setdefault(path, []).append(rules)
+    stylesheet = None
+    if hoist:
+        # 只有入口挂载的根组件的样式一定会被加载；根组件没有全局样式块时改用独立样式表
+        root = _mounted_root(file_map)
+        if root in styles:
+            _hoist_shared_rules(styles, root, stats)
+        elif root is not None and SHARED_STYLE_PATH not in file_map:
+            if _hoist_shared_rules(styles, SHARED_STYLE_PATH, stats):
+                stylesheet = styles[SHARED_STYLE_PATH][0]
+    if minify or prune or hoist:
+        for part, rules in parsed:
+            part[2] = emit_css(rules)
+
+    for path, parts in components.items():
+        for part in parts:
+            if minify and part[0] == 'template':
+                part[2] = minify_markup(part[2])
+            elif minify and part[0] == 'script':
+                part[2] = minify_js(part[2])
+        result[path] = _join_sfc(parts, minify)
+    if minify:
+        for path, content in file_map.items():
+            if not isinstance(content, str) or path in components or os.path.basename(path) in OPTIMIZE_SKIP:
+                continue
+            if path.endswith('.js'):
+                result[path] = minify_js(content) + '\n'
+            elif path.endswith('.html'):
+                result[path] = minify_markup(content) + '\n'
+            elif path.endswith('.json') and '\n' in content:
+                result[path] = json.dumps(json.loads(content), ensure_ascii=False, separators=(',', ':'))
+    if stylesheet is not None:
+        result[SHARED_STYLE_PATH] = emit_css(stylesheet) + '\n'
+        result[ENTRY_SCRIPT] = _import_stylesheet(result[ENTRY_SCRIPT], ENTRY_SCRIPT, SHARED_STYLE_PATH)
+
+    stats['bytes_in'] = sum(len(_encode_content(c, False)) for c in file_map.values())
+    stats['bytes_out'] = sum(len(_encode_content(c, False)) for c in result.values())
+    return result
+
+
+# --- 13. 体积报告与预算 ---
+# 每次构建统计每个成员（以及 dist/assets 下的构建产物）的原始、deflate、brotli 大小，.vue 再按
+# template / script / style 拆开；与上一次的报告比较，超出预算时让构建失败。
+# deflate 使用与压缩包相同的级别，结果与压缩包中的成员大小一致；未安装 brotli 时该列为 None
+SIZE_REPORT_PATH = 'size_report.json'
+SIZE_METRICS = ('raw', 'deflate', 'brotli')
+SIZE_DIST_DIR = 'dist'
+
+
+def _sizes(data, use_brotli):
+    compressor = zlib.compressobj(REPRODUCIBLE_COMPRESSLEVEL, zlib.DEFLATED, -15)
+    sizes = {'raw': len(data), 'deflate': len(compressor.compress(data) + compressor.flush()),
+             'brotli': len(_brotli().compress(data)) if use_brotli else None}
+    return sizes
+
+
+def _add_sizes(total, sizes):
+    for metric in SIZE_METRICS:
+        if sizes[metric] is None or total.get(metric, 0) is None:
+            total[metric] = None
+        else:
+            total[metric] = total.get(metric, 0) + sizes[metric]
+
+
+def size_report(file_map, dist_dir=SIZE_DIST_DIR, use_brotli=None):
+    # {'members': {路径: 大小}, 'sections': {.vue 路径: {template/script/style: 大小}}, 'total': 大小}；
+    # 大小为 {'raw', 'deflate', 'brotli'}。dist_dir/assets 存在时其中的文件以 'dist/assets/...' 计入
+    use_brotli = _resolve_use_brotli(use_brotli)
+    members = {}
+    sections = {}
+    for filepath, content in file_map.items():
+        members[filepath] = _sizes(_encode_content(content, False), use_brotli)
+        if filepath.endswith('.vue') and isinstance(content, str):
+            blocks = {}
+            for kind, _, body in _split_sfc(content):
+                if kind != 'text':
+                    blocks[kind] = blocks.get(kind, '') + body
+            sections[filepath] = {kind: _sizes(body.encode('utf-8'), use_brotli) for kind, body in blocks.items()}
+    assets = os.path.join(dist_dir, 'assets') if dist_dir else None
+    if assets and os.path.isdir(assets):
+        for root, _, files in os.walk(assets):
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                with open(full_path, 'rb') as f:
+                    data = f.read()
+                key = 'dist/' + os.path.relpath(full_path, dist_dir).replace(os.sep, '/')
+                members[key] = _sizes(data, use_brotli)
+    total = {}
+    for sizes in members.values():
+        _add_sizes(total, sizes)
+    return {'version': 1, 'members': dict(sorted(members.items())), 'sections': sections,
+            'total': total or dict.fromkeys(SIZE_METRICS, 0)}
+
+
+def check_size_budget(report, budget):
+    # budget: {'total': {指标: 上限}, 'members': {路径或通配符: {指标: 上限}},
+    #          'sections': {路径或通配符: {template/script/style: {指标: 上限}}}}
+    # 返回超出预算的项 [(名称, 指标, 实际, 上限)]；未统计的指标（如没有 brotli）不检查
+    import fnmatch
+
+    violations = []
+
+    def check(name, sizes, limits):
+        for metric, limit in limits.items():
+            if metric not in SIZE_METRICS:
+                raise ValueError(f'未知的体积指标 {metric!r}（可用: {", ".join(SIZE_METRICS)}）')
+            actual = sizes.get(metric)
+            if actual is not None and actual > limit:
+                violations.append((name, metric, actual, limit))
+
+    check('total', report['total'], budget.get('total', {}))
+    for pattern, limits in budget.get('members', {}).items():
+        for filepath in fnmatch.filter(report['members'], pattern):
+            check(filepath, report['members'][filepath], limits)
+    for pattern, kinds in budget.get('sections', {}).items():
+        for filepath in fnmatch.filter(report['sections'], pattern):
+            for kind, limits in kinds.items():
+                if kind in report['sections'][filepath]:
+                    check(f'{filepath} <{kind}>', report['sections'][filepath][kind], limits)
+    return violations
+
+
+def diff_size_reports(previous, report, metric='deflate'):
+    # 与上一次报告相比的变化 [(名称, 之前, 现在)]，新增成员的“之前”为 None、删除的“现在”为 None，
+    # 按变化量绝对值从大到小排列
+    def flatten(data):
+        sizes = {'total': data['total'][metric]}
+        sizes.update((path, value[metric]) for path, value in data['members'].items())
+        for path, blocks in data.get('sections', {}).items():
+            sizes.update((f'{path} <{kind}>', value[metric]) for kind, value in blocks.items())
+        return sizes
+
+    old, new = flatten(previous), flatten(report)
+    changes = [(name, old.get(name), new.get(name)) for name in sorted(set(old) | set(new))
+               if old.get(name) != new.get(name)]
+    return sorted(changes, key=lambda change: -abs((change[2] or 0) - (change[1] or 0)))
+
+
+def _format_size(value):
+    return '-' if value is None else f'{value / 1024:.1f}K'
+
+
+def print_size_report(report, previous=None, violations=(), file=None, top=10):
+    file = file or sys.stderr
+    print('📏 体积报告（原始 / deflate / brotli）', file=file)
+    rows = sorted(report['members'].items(), key=lambda item: -item[1]['raw'])
+    for filepath, sizes in rows[:top]:
+        print(f"  {filepath:<44} " + ' / '.join(_format_size(sizes[m]) for m in SIZE_METRICS), file=file)
+        for kind, section in report['sections'].get(filepath, {}).items():
+            label = f'<{kind}>'
+            print(f"    {label:<42} " + ' / '.join(_format_size(section[m]) for m in SIZE_METRICS), file=file)
+    if len(rows) > top:
+        print(f"  …… 另有 {len(rows) - top} 个文件", file=file)
+    print(f"  {'合计':<42} " + ' / '.join(_format_size(report['total'][m]) for m in SIZE_METRICS), file=file)
+    if previous is not None:
+        changes = diff_size_reports(previous, report)
+        if not changes:
+            print('  与上一次构建相比没有变化', file=file)
+        for name, old, new in changes[:top]:
+            delta = (new or 0) - (old or 0)
+            state = '新增' if old is None else '删除' if new is None else f'{delta:+d} 字节'
+            print(f"  Δ {name}: {state}（deflate {_format_size(old)} -> {_format_size(new)}）", file=file)
+    for name, metric, actual, limit in violations:
+        print(f"❌ 超出体积预算: {name} 的 {metric} 为 {actual} 字节，上限 {limit} 字节", file=file)
+
+
+# --- 14. 增量更新包 ---
+# 按成员的 SHA-256 比较两个压缩包，增量包（本身也是 zip）只包含新增和改动的成员、删除列表与
+# .delta/manifest.json。改动的 deflate 成员只记录与旧版本不同的中间一段（相同的前缀、后缀只记长度，
+# 中间段以旧版本被替换的部分作 zlib 预置字典压缩），小改动只需几百字节；应用时拼出新内容后按原压缩
+# 级别重新压缩，构建增量包时已确认能得到与目标完全相同的字节。
+# 应用前核对基础包的哈希，写出的每个改动成员都核对 SHA-256；基础包与目标都是可复现构建时，
+# 应用结果与目标压缩包逐字节相同。完整性清单（INTEGRITY_MANIFEST）由其他成员派生，不参与基础包核对：
+# 基础包重新打包过时按应用结果重新生成；输出旁同时写 .integrity.json
+DELTA_FORMAT = 'bundle-delta'
+DELTA_MANIFEST = '.delta/manifest.json'
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def bundle_manifest(path):
+    # {成员: {'size', 'crc', 'sha256'}}，顺序与压缩包中一致。SHA-256 总是由成员内容算出，
+    # 不采用压缩包自带的完整性清单：增量包的核对依赖它，不能只靠 CRC32 与包内自证
+    manifest = {}
+    with zipfile.ZipFile(path) as zf:
+        for zinfo in zf.infolist():
+            if zinfo.is_dir():
+                continue
+            digest = hashlib.sha256()
+            with zf.open(zinfo) as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            manifest[zinfo.filename] = {'size': zinfo.file_size, 'crc': zinfo.CRC, 'sha256': digest.hexdigest()}
+    return manifest
+
+
+def _members_digest(manifest):
+    # 按顺序对 (成员, SHA-256) 列表求哈希：内容相同的压缩包即使时间戳不同，摘要也相同
+    pairs = [[name, entry['sha256']] for name, entry in manifest.items()]
+    return hashlib.sha256(json.dumps(pairs, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _read_raw_member(zf, zinfo):
+    # 读取成员压缩后的数据（不解压），用于原样转存；内部接口不可用时解压后按相同方式重新压缩
+    if not _raw_io_supported(zf, write=False):
+        level = REPRODUCIBLE_COMPRESSLEVEL if zinfo.compress_type == zipfile.ZIP_DEFLATED else None
+        return _compress(zf.read(zinfo), zinfo.compress_type, level)
+    with zf._lock:
+        zf.fp.seek(zinfo.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, zf.fp.read(zipfile.sizeFileHeader))
+        zf.fp.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+        return zf.fp.read(zinfo.compress_size)
+
+
+def _zinfo_fields(zinfo):
+    return {'date_time': list(zinfo.date_time), 'compress_type': zinfo.compress_type,
+            'external_attr': zinfo.external_attr, 'create_system': zinfo.create_system}
+
+
+def _zinfo_from(name, entry):
+    zinfo = zipfile.ZipInfo(name, tuple(entry['zinfo']['date_time']))
+    zinfo.compress_type = entry['zinfo']['compress_type']
+    zinfo.external_attr = entry['zinfo']['external_attr']
+    zinfo.create_system = entry['zinfo']['create_system']
+    zinfo.file_size = entry['size']
+    zinfo.CRC = entry['crc']
+    return zinfo
+
+
+def _deflate_level(data, raw):
+    # 找出能把 data 压成 raw 的 deflate 级别；找不到（例如换了 zlib 版本）时返回 None
+    for level in (REPRODUCIBLE_COMPRESSLEVEL, zlib.Z_DEFAULT_COMPRESSION, *range(10)):
+        if _compress(data, zipfile.ZIP_DEFLATED, level) == raw:
+            return level
+    return None
+
+
+_SPLICE_HEADER = struct.Struct('<QQ')
+
+
+def _common_length(a, b, from_end=False):
+    # 二分查找最长公共前缀（from_end=True 时为后缀）的长度，每步一次切片比较
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        same = a[-middle:] == b[-middle:] if from_end else a[:middle] == b[:middle]
+        if same:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _splice_patch(data, base):
+    prefix = _common_length(data, base)
+    suffix = _common_length(data[prefix:], base[prefix:], from_end=True)
+    replaced = base[prefix:len(base) - suffix]
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=replaced[-32768:]) if replaced \
+        else zlib.compressobj(9, zlib.DEFLATED, -15)
+    middle = data[prefix:len(data) - suffix]
+    return _SPLICE_HEADER.pack(prefix, suffix) + compressor.compress(middle) + compressor.flush()
+
+
+def _apply_splice(patch, base):
+    prefix, suffix = _SPLICE_HEADER.unpack_from(patch)
+    replaced = base[prefix:len(base) - suffix]
+    decompressor = zlib.decompressobj(-15, zdict=replaced[-32768:]) if replaced else zlib.decompressobj(-15)
+    middle = decompressor.decompress(patch[_SPLICE_HEADER.size:]) + decompressor.flush()
+    return base[:prefix] + middle + base[len(base) - suffix:]
+
+
+def _hashed_stem(name):
+    # 内容哈希命名的文件（如菜单分片 00004-<哈希>.json）去掉哈希后的部分；内容一变文件名就变，
+    # 按它把新文件与被删除的旧版本对应起来
+    root, ext = os.path.splitext(name)
+    stem, dash, _ = root.rpartition('-')
+    return (stem, ext) if dash else None
+
+
+def build_delta(base_path, target_path, delta_path):
+    # 生成从 base_path 升级到 target_path 的增量包，返回其清单
+    base = bundle_manifest(base_path)
+    target = bundle_manifest(target_path)
+    changed = [name for name, entry in target.items() if base.get(name, {}).get('sha256') != entry['sha256']]
+    renamed = {_hashed_stem(name): name for name in base if name not in target and _hashed_stem(name)}
+    manifest = {
+        'format': DELTA_FORMAT, 'version': 1,
+        'base': {'sha256': file_sha256(base_path), 'members': len(base)},
+        'target': {'sha256': file_sha256(target_path), 'members': len(target),
+                   'digest': _members_digest(target)},
+        'order': list(target),
+        'changed': {},
+        'deleted': {name: entry['sha256'] for name, entry in base.items() if name not in target},
+    }
+    try:
+        with zipfile.ZipFile(base_path) as base_zf, zipfile.ZipFile(target_path) as target_zf, \
+                zipfile.ZipFile(delta_path, 'w', zipfile.ZIP_STORED) as delta_zf:
+            for name in changed:
+                zinfo = target_zf.getinfo(name)
+                raw = _read_raw_member(target_zf, zinfo)
+                source = name if name in base else renamed.get(_hashed_stem(name))
+                entry = dict(target[name], base_sha256=base[source]['sha256'] if source else None,
+                             zinfo=_zinfo_fields(zinfo), patch='raw')
+                if source and zinfo.compress_type == zipfile.ZIP_DEFLATED:
+                    data = target_zf.read(name)
+                    patch = _splice_patch(data, base_zf.read(source))
+                    level = _deflate_level(data, raw) if len(patch) < len(raw) else None
+                    if level is not None:
+                        entry.update(patch='splice', level=level, source=source)
+                        raw = patch
+                manifest['changed'][name] = entry
+                delta_zf.writestr(name, raw)
+            delta_zf.writestr(DELTA_MANIFEST, json.dumps(manifest, ensure_ascii=False, indent=1),
+                              compress_type=zipfile.ZIP_DEFLATED)
+    except BaseException:
+        _remove_partial(delta_path)
+        raise
+    return manifest
+
+
+def _regenerated_integrity(manifest, base, base_zf, delta_zf):
+    # 按应用结果的成员（改动的取增量包清单，其余取基础包）重新生成完整性清单，返回 (zinfo, 压缩后数据)。
+    # 清单也改动过时，生成结果必须与目标中的清单一致，再按目标的压缩级别压缩（与目标逐字节相同）
+    import copy
+
+    entries = []
+    for name in manifest['order']:
+        if name == INTEGRITY_MANIFEST:
+            continue
+        info = manifest['changed'].get(name) or base.get(name)
+        if info is None:
+            raise DeltaError(f"基础包中缺少 {name}")
+        entries.append({'path': name, 'size': info['size'], 'crc': f"{info['crc']:08x}", 'sha256': info['sha256']})
+    data = _integrity_bytes(entries)
+    entry = manifest['changed'].get(INTEGRITY_MANIFEST)
+    if entry is not None:
+        if hashlib.sha256(data).hexdigest() != entry['sha256']:
+            raise DeltaError(f"{INTEGRITY_MANIFEST} 与应用后的成员不一致")
+        zinfo = _zinfo_from(INTEGRITY_MANIFEST, entry)
+        if entry['patch'] == 'splice':
+            return zinfo, _compress(data, zinfo.compress_type, entry['level'])
+        return zinfo, delta_zf.read(INTEGRITY_MANIFEST)
+    try:
+        zinfo = copy.copy(base_zf.getinfo(INTEGRITY_MANIFEST))
+    except KeyError:
+        raise DeltaError(f"基础包中缺少 {INTEGRITY_MANIFEST}") from None
+    # 沿用基础包中清单的压缩方式与级别（级别由 --compression 决定，不一定是可复现构建的默认值）
+    level = None
+    if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+        level = _deflate_level(base_zf.read(zinfo), _read_raw_member(base_zf, zinfo))
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+    return zinfo, _compress(data, zinfo.compress_type, level)
+
+
+def apply_delta(base_path, delta_path, output_path):
+    # 把增量包应用到 base_path，写出 output_path。返回 {'changed', 'deleted', 'identical'}，
+    # identical 表示结果与生成增量包时的目标压缩包逐字节相同
+    import copy
+
+    with zipfile.ZipFile(delta_path) as delta_zf:
+        try:
+            manifest = json.loads(delta_zf.read(DELTA_MANIFEST))
+        except KeyError:
+            raise DeltaError(f"'{delta_path}' 不是增量包（缺少 {DELTA_MANIFEST}）") from None
+        if manifest.get('format') != DELTA_FORMAT:
+            raise DeltaError(f"'{delta_path}' 的格式 {manifest.get('format')!r} 不受支持")
+        same_base = file_sha256(base_path) == manifest['base']['sha256']
+        if not same_base:
+            # 基础包不是生成增量包时用的那一个（例如重新打包过）：先核对要修改、删除的成员，
+            # 写完后再核对结果中全部成员的哈希
+            base = bundle_manifest(base_path)
+            expected = {entry.get('source', name): entry['base_sha256'] for name, entry in manifest['changed'].items()
+                        if entry['base_sha256'] is not None and name != INTEGRITY_MANIFEST}
+            expected.update((name, sha256) for name, sha256 in manifest['deleted'].items()
+                            if name != INTEGRITY_MANIFEST)
+            for name, sha256 in expected.items():
+                if base.get(name, {}).get('sha256') != sha256:
+                    raise DeltaError(f"基础包与增量包不匹配: {name}")
+        try:
+            with zipfile.ZipFile(base_path) as base_zf, \
+                    zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as out_zf:
+                for name in manifest['order']:
+                    entry = manifest['changed'].get(name)
+                    if name == INTEGRITY_MANIFEST and not same_base:
+                        _write_raw_member(out_zf, *_regenerated_integrity(manifest, base, base_zf, delta_zf))
+                        continue
+                    if entry is None:
+                        try:
+                            zinfo = base_zf.getinfo(name)
+                        except KeyError:
+                            raise DeltaError(f"基础包中缺少 {name}") from None
+                        _write_raw_member(out_zf, copy.copy(zinfo), _read_raw_member(base_zf, zinfo))
+                        continue
+                    patch = delta_zf.read(name)
+                    zinfo = _zinfo_from(name, entry)
+                    if entry['patch'] == 'splice':
+                        data = _apply_splice(patch, base_zf.read(entry['source']))
+                        raw = _compress(data, zinfo.compress_type, entry['level'])
+                    else:
+                        raw = patch
+                        data = _decompress(raw, zinfo.compress_type)
+                    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+                        raise DeltaError(f"{name} 的 SHA-256 与增量包清单不一致")
+                    _write_raw_member(out_zf, zinfo, raw)
+            if not same_base and _members_digest(bundle_manifest(output_path)) != manifest['target']['digest']:
+                raise DeltaError('应用后的内容与目标压缩包不一致')
+            if INTEGRITY_MANIFEST in manifest['order']:
+                with zipfile.ZipFile(output_path) as out_zf:
+                    _atomic_write(integrity_sidecar_path(output_path), out_zf.read(INTEGRITY_MANIFEST))
+        except BaseException:
+            _remove_partial(output_path)
+            _remove_partial(integrity_sidecar_path(output_path))
+            raise
+    return {'changed': len(manifest['changed']), 'deleted': len(manifest['deleted']),
+            'identical': file_sha256(output_path) == manifest['target']['sha256']}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='生成并打包“今天吃什么”项目')
+    parser.add_argument('--params', metavar='PARAMS.json',
+                        help='模板参数 JSON 对象（颜色、标题、餐次名称等），覆盖 DEFAULT_TEMPLATE_PARAMS')
+    parser.add_argument('--use-temp-dir', action='store_true',
+                        help='使用旧的临时目录流程打包（兜底方案）')
+    parser.add_argument('--variants', metavar='SPECS.json',
+                        help='批量构建：JSON 数组，每项为 {"name": 输出文件名, "overrides": {路径: 内容}}')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='批量构建的进程数（默认等于 CPU 核数）')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='可复现构建：固定成员顺序、时间戳、权限与压缩级别，并输出 SHA-256')
+    parser.add_argument('--compression', default='deflate', metavar='SPEC',
+                        help='压缩策略: stored / deflate[-1..9] / bzip2[-1..9] / lzma / auto[-1..9]，'
+                             '或预设 fast（开发）/ max（发布），默认 deflate')
+    parser.add_argument('--cache-dir', nargs='?', const=CACHE_DIR, default=None,
+                        help=f'启用增量构建缓存（默认目录 {CACHE_DIR}），内容未变化时不重写压缩包')
+    parser.add_argument('--cache-max-size', type=int, default=CACHE_MAX_MB, metavar='MB',
+                        help=f'构建后把缓存中最久未用的对象删到不超过 MB 兆字节（默认 {CACHE_MAX_MB}，0 表示不限制）')
+    parser.add_argument('--precompress', action='store_true',
+                        help='为每个文本成员在压缩包中附带 .gz（已安装 brotli 时还有 .br）副本')
+    parser.add_argument('--no-integrity', action='store_true',
+                        help=f'不生成完整性清单（默认内嵌 {INTEGRITY_MANIFEST}，并在压缩包旁写 .integrity.json）')
+    parser.add_argument('--verify', metavar='BUNDLE.zip',
+                        help='按压缩包内嵌的完整性清单核对每个成员的大小、CRC 与 SHA-256')
+    parser.add_argument('--stdout', action='store_true',
+                        help='不写文件，把压缩包字节流直接输出到标准输出（可管道给上传工具）')
+    parser.add_argument('--menu', metavar='DISHES',
+                        help='使用外部菜单数据集（.csv / .json / .jsonl），按餐次分片后懒加载，替换默认菜单')
+    parser.add_argument('--menu-shard-size', type=int, default=MENU_SHARD_SIZE, metavar='N',
+                        help=f'菜单分片大小（每片菜品数，默认 {MENU_SHARD_SIZE}）')
+    parser.add_argument('--menu-encoding', choices=MENU_ENCODINGS, default='compact',
+                        help='菜单分片的编码：compact（列式 + 字典编码，默认）或 json（菜品对象数组，便于排查）')
+    parser.add_argument('--menu-base-url', default='', metavar='URL',
+                        help='菜单分片的基地址（站点或 CDN，如 https://cdn.example.com/）；'
+                             '小程序 / App 中必须设置，H5 默认按页面地址请求')
+    parser.add_argument('--skip-invalid', action='store_true',
+                        help='跳过菜单数据集中不合法的记录（默认遇到即报错退出）')
+    parser.add_argument('--watch', nargs='?', const=WATCH_DIR, default=None, metavar='DIR',
+                        help=f'监视模式：修改 daima.py 后只把变化的文件重写到 DIR（默认 {WATCH_DIR}），'
+                             '按回车时才打包')
+    parser.add_argument('--optimize', action='store_true',
+                        help='压缩 JS / CSS / HTML（去注释与缩进），删除没有用到的 CSS 规则，合并各页面的公共样式')
+    parser.add_argument('--size-report', nargs='?', const=SIZE_REPORT_PATH, default=None, metavar='PATH',
+                        help=f'统计每个文件的原始 / deflate / brotli 大小，与 PATH（默认 {SIZE_REPORT_PATH}）中'
+                             '上一次的报告比较后覆盖写入')
+    parser.add_argument('--size-budget', metavar='BUDGET.json',
+                        help='体积预算（格式见 check_size_budget），超出时不打包并以非 0 状态退出')
+    parser.add_argument('--meal-plan', type=int, metavar='DAYS',
+                        help='用 meal_planner.py 预先排好 DAYS 天的三餐并嵌入应用，首页直接展示当天计划')
+    parser.add_argument('--plan-start', default=None, metavar='YYYY-MM-DD',
+                        help='计划的第一天（默认今天）')
+    parser.add_argument('--plan-seed', type=int, default=None,
+                        help='排菜的随机数种子（默认随机；配合 --reproducible 时请指定）')
+    parser.add_argument('--make-delta', nargs=3, metavar=('BASE.zip', 'TARGET.zip', 'DELTA.zip'),
+                        help='生成从 BASE 升级到 TARGET 的增量包（只含新增 / 改动的成员与删除列表）')
+    parser.add_argument('--apply-delta', nargs=3, metavar=('BASE.zip', 'DELTA.zip', 'OUT.zip'),
+                        help='把增量包应用到 BASE，核对哈希后写出 OUT')
+    parser.add_argument('--precompress-dir', metavar='DIR',
+                        help='为 DIR（例如 dist）下的文本文件就地生成 .gz / .br 副本')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="把构建指标以 JSON Lines 追加写入 PATH（'-' 表示标准输出）")
+    parser.add_argument('--profile', metavar='PATH',
+                        help='用 cProfile 分析本次运行，并把结果写入 PATH（可用 pstats 查看）')
+    args = parser.parse_args(argv)
+    if args.variants and (args.size_report or args.size_budget):
+        # 体积报告与预算针对单个构建，批量构建时请对各变体分别运行
+        parser.error('--size-report / --size-budget 不能与 --variants 同时使用')
+    if args.reproducible and args.use_temp_dir:
+        parser.error('--reproducible 只支持流式打包，不能与 --use-temp-dir 同时使用')
+    if args.stdout and args.use_temp_dir:
+        parser.error('--stdout 直接输出字节流，不能与 --use-temp-dir 同时使用')
+    if args.stdout and args.metrics == '-':
+        # 标准输出已被压缩包占用，指标需要写到文件
+        parser.error("--stdout 时 --metrics 不能为 '-'")
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        status = _run(args)
+        if args.cache_dir and args.cache_max_size > 0:
+            _prune_cache(args.cache_dir, args.cache_max_size)
+        return status
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+
+def _prune_cache(cache_dir, max_mb):
+    removed, freed = BuildCache(cache_dir).prune(max_mb * 1024 * 1024)
+    if removed:
+        print(f"🧹 缓存超过 {max_mb} MB，已删除 {removed} 个最久未用的对象（{freed} 字节）", file=sys.stderr)
+
+
+def _meal_plan_params(args):
+    import random
+    import meal_planner
+
+    if args.menu:
+        # 边读边交给排菜器，只保留排菜用到的字段
+        planner = meal_planner.MealPlanner.from_records(iter_menu_dataset(args.menu, skip_invalid=args.skip_invalid))
+    else:
+        planner = meal_planner.MealPlanner(DEFAULT_MENU)
+    indices = planner.plan_indices(args.meal_plan, random.Random(args.plan_seed))
+    start = args.plan_start or time.strftime('%Y-%m-%d')
+    print(f"📅 已排好从 {start} 起 {args.meal_plan} 天的菜单计划", file=sys.stderr)
+    return meal_planner.plan_template_params(meal_planner.plan_payload(planner, indices, start))
+
+
+def _load_menu_option(args, module=None):
+    # --menu：返回 (分片, 模板参数)；数据集有误时打印原因并返回 None
+    module = module or sys.modules[__name__]
+    try:
+        shards, menu_params, stats = module.load_menu_dataset(args.menu, shard_size=args.menu_shard_size,
+                                                              skip_invalid=args.skip_invalid,
+                                                              encoding=args.menu_encoding,
+                                                              base_url=args.menu_base_url)
+    except module.MenuDataError as e:
+        print(f"❌ 菜单数据集有误: {e}", file=sys.stderr)
+        return None
+    print(f"🍱 菜单数据集: {stats['dishes']} 道菜，{len(shards)} 个分片"
+          f"（重复 {stats['duplicates']}，跳过 {stats['invalid']}）", file=sys.stderr)
+    return shards, menu_params
+
+
+def _project_params(args, module, menu=None):
+    # --params / --menu / --meal-plan 对应的模板参数
+    params = {}
+    if args.params:
+        with open(args.params, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+    if menu:
+        params.update(menu[1])
+    if args.meal_plan:
+        params.update(module._meal_plan_params(args))
+    return params
+
+
+def _project_file_map(args, module, menu=None):
+    # 按命令行参数组合出要打包的文件。module 提供模板与渲染函数（监视模式下是重新执行源码得到的模块），
+    # menu 为 _load_menu_option 的结果
+    params = _project_params(args, module, menu)
+    file_map = module.render_file_map(params) if params else module.get_file_mapping()
+    if menu:
+        file_map.update(menu[0])
+    if args.optimize:
+        stats = {}
+        file_map = module.optimize_file_map(file_map, stats=stats)
+        print(f"🧹 产物优化: {stats['bytes_in']} -> {stats['bytes_out']} 字节，删除 {stats['pruned']} 个无用选择器，"
+              f"合并 {stats['hoisted']} 条公共样式", file=sys.stderr)
+    return file_map
+
+
+def _run_delta(args):
+    try:
+        if args.make_delta:
+            base_path, target_path, delta_path = args.make_delta
+            manifest = build_delta(base_path, target_path, delta_path)
+            size, full = os.path.getsize(delta_path), os.path.getsize(target_path)
+            print(f"🧩 增量包 '{delta_path}': 改动 {len(manifest['changed'])} 个、删除 {len(manifest['deleted'])} 个成员，"
+                  f"{size} 字节（完整包 {full} 字节，节省 {1 - size / full:.1%}）")
+        if args.apply_delta:
+            base_path, delta_path, output_path = args.apply_delta
+            result = apply_delta(base_path, delta_path, output_path)
+            state = '与目标压缩包逐字节相同' if result['identical'] else '内容哈希一致'
+            print(f"✅ 已写出 '{output_path}': 改动 {result['changed']} 个、删除 {result['deleted']} 个成员，{state}")
+    except (DeltaError, zipfile.BadZipFile) as e:
+        print(f"❌ 增量更新失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _run_variants(args):
+    # --params / --menu / --meal-plan 作为所有变体共用的参数，--optimize 作用于每个变体
+    with open(args.variants, 'r', encoding='utf-8') as f:
+        variants = json.load(f)
+    menu = None
+    if args.menu:
+        menu = _load_menu_option(args)
+        if menu is None:
+            return 1
+    base_map = dict(get_file_mapping(), **menu[0]) if menu else None
+    results = build_variants(variants, base_map, max_workers=args.jobs,
+                             params=_project_params(args, sys.modules[__name__], menu),
+                             optimize=args.optimize, use_temp_dir=args.use_temp_dir,
+                             cache_dir=args.cache_dir, reproducible=args.reproducible,
+                             compression=args.compression, precompress=args.precompress,
+                             integrity=not args.no_integrity)
+    _print_variant_results(results)
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+def _size_gate(args, file_map):
+    # 生成体积报告并检查预算；超出预算时返回 False
+    report = size_report(file_map)
+    previous = None
+    if args.size_report:
+        try:
+            with open(args.size_report, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except FileNotFoundError:
+            pass
+    violations = []
+    if args.size_budget:
+        with open(args.size_budget, 'r', encoding='utf-8') as f:
+            violations = check_size_budget(report, json.load(f))
+    print_size_report(report, previous, violations)
+    if args.size_report:
+        _atomic_write(args.size_report, json.dumps(report, ensure_ascii=False, indent=1).encode('utf-8'))
+    return not violations
+
+
+def _run(args):
+    if args.precompress_dir:
+        count = precompress_directory(args.precompress_dir)
+        print(f"🗜️ 已为 '{args.precompress_dir}' 中的 {count} 个文件生成预压缩副本")
+
+    if args.make_delta or args.apply_delta:
+        return _run_delta(args)
+
+    if args.verify:
+        problems = verify_bundle(args.verify)
+        for problem in problems:
+            print(f"❌ {problem}", file=sys.stderr)
+        if not problems:
+            print(f"✅ '{args.verify}' 与完整性清单一致")
+        return 1 if problems else 0
+
+    if args.variants:
+        return _run_variants(args)
+
+    if args.watch:
+        return watch(args, args.watch)
+
+    menu = None
+    if args.menu:
+        menu = _load_menu_option(args)
+        if menu is None:
+            return 1
+    file_map = _project_file_map(args, sys.modules[__name__], menu)
+    if (args.size_report or args.size_budget) and not _size_gate(args, file_map):
+        return 1
+
+    if args.stdout:
+        for chunk in iter_zip_chunks(file_map, compression=args.compression,
+                                     reproducible=args.reproducible, precompress=args.precompress,
+                                     cache_dir=args.cache_dir, integrity=not args.no_integrity,
+                                     on_event=jsonl_writer(args.metrics) if args.metrics else None):
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        return 0
+
+    generate_and_zip_project(file_map, use_temp_dir=args.use_temp_dir,
+                             cache_dir=args.cache_dir, reproducible=args.reproducible,
+                             compression=args.compression, precompress=args.precompress,
+                             on_event=jsonl_writer(args.metrics) if args.metrics else None,
+                             integrity=not args.no_integrity)
+    return 0
 
 
 if __name__ == '__main__':
-    generate_and_zip_project(FILE_MAPPING)
\ No newline at end of file
+    raise SystemExit(main())
@@ -0,0 +1,270 @@
+import sys
+import json
+import time
+import random
+import argparse
+from bisect import bisect_right
+
+import daima
+
+# --- 批量生成每日菜单计划 ---
+# 离线为 N 天 × 三餐排好菜单，生成的应用直接读取计划，不必现场抽。约束（每个餐次独立）：
+#   * 最近 window 天内同一餐次不重复；
+#   * 营养上限，例如 7 天内“极高”热量的晚餐最多 1 顿；
+#   * 标签均衡：与最近 window 天重合的标签越多，权重越低（每重合一次乘以 tag_decay）。
+# 偏好权重与 store.setPickWeights 格式相同（见 daima.dish_weight）。
+#
+# 每个餐次的约束状态只有 (最近 window 道菜, 各上限规则窗口内命中的天数) 这几项，小菜单时把
+# “状态 -> 累积权重 + 下一状态”记在表里，之后每天只需一次 bisect 和一次指针跳转；大菜单（超过
+# TABLE_MAX_DISHES 道）时状态太多，改为按基础权重拒绝采样。
+
+PLAN_MEALS = ('breakfast', 'lunch', 'dinner')
+PLAN_FORMAT = 'meal-plan'
+REPEAT_WINDOW = 2
+CAP_WINDOW = 7
+TAG_DECAY = 0.5
+# 餐次 -> 营养项 -> 等级 -> cap_window 天内最多几顿
+DEFAULT_CAPS = {'dinner': {'calorie': {'极高': 1}}}
+TABLE_MAX_DISHES = 64
+REJECTION_TRIES = 32
+
+
+class _MealChain:
+    # 单个餐次的约束与采样；状态为 (最近选中的下标元组, 每条上限规则窗口内命中距今天数的元组)。
+    # 菜品逐道 add 进来，只保留菜名、基础权重、标签与上限规则命中的下标，不保留完整的菜品对象
+    def __init__(self, weights, window, caps, cap_window, tag_decay):
+        self.weights = weights
+        self.window = window
+        self.cap_window = cap_window
+        self.tag_decay = tag_decay
+        self.names = []
+        self.base = []
+        self.tags = []
+        self._caps = [(key, level, limit, set()) for key, levels in (caps or {}).items()
+                      for level, limit in levels.items()]
+        self.finish()
+
+    def add(self, dish):
+        i = len(self.names)
+        self.names.append(dish['name'])
+        self.base.append(daima.dish_weight(dish, self.weights))
+        self.tags.append(tuple(dish.get('tags', ())))
+        nutrition = dish.get('nutrition', {})
+        for key, level, _, members in self._caps:
+            if nutrition.get(key) == level:
+                members.add(i)
+
+    def finish(self):
+        # 菜品加完后调用：整理上限规则与累积权重，清空转移表
+        self.rules = [(frozenset(members), limit) for _, _, limit, members in self._caps if members]
+        self.initial = ((), tuple(() for _ in self.rules))
+        self.use_table = len(self.names) <= TABLE_MAX_DISHES
+        self._nodes = {}
+        self._cum = []
+        total = 0.0
+        for weight in self.base:
+            total += weight
+            self._cum.append(total)
+
+    def weight(self, state, i):
+        recent, ages = state
+        if i in recent:
+            return 0.0
+        for (members, limit), rule_ages in zip(self.rules, ages):
+            if i in members and len(rule_ages) >= limit:
+                return 0.0
+        weight = self.base[i]
+        if weight and recent and self.tags[i]:
+            overlap = sum(self.tags[j].count(tag) for j in recent for tag in self.tags[i])
+            weight *= self.tag_decay ** overlap
+        return weight
+
+    def advance(self, state, i):
+        recent, ages = state
+        recent = (recent + (i,))[-self.window:] if self.window else ()
+        ages = tuple(tuple(age + 1 for age in rule_ages if age + 1 < self.cap_window)
+                     + ((1,) if i in members and self.cap_window > 1 else ())
+                     for (members, _), rule_ages in zip(self.rules, ages))
+        return recent, ages
+
+    def _distribution(self, state):
+        # 约束全部满足的候选；都被排除时先放开不重复（上限仍保留），再退回等概率
+        choices = [i for i in range(len(self.names)) if self.weight(state, i) > 0]
+        if choices:
+            weights = [self.weight(state, i) for i in choices]
+        else:
+            relaxed = ((), state[1])
+            choices = [i for i in range(len(self.names)) if self.weight(relaxed, i) > 0]
+            weights = [self.weight(relaxed, i) for i in choices]
+        if not choices:
+            choices = list(range(len(self.names)))
+            weights = [1.0] * len(choices)
+        return choices, weights
+
+    def node(self, state):
+        # 表中的节点：[归一化累积权重, 候选下标, 下一节点（用到时才建）, 状态]
+        node = self._nodes.get(state)
+        if node is None:
+            choices, weights = self._distribution(state)
+            total = sum(weights)
+            cum = []
+            acc = 0.0
+            for weight in weights:
+                acc += weight
+                cum.append(acc / total)
+            cum[-1] = 1.0
+            node = self._nodes[state] = [cum, choices, [None] * len(choices), state]
+        return node
+
+    def _walk_table(self, days, rand):
+        node = self.node(self.initial)
+        out = []
+        append = out.append
+        for _ in range(days):
+            cum, choices, nexts, state = node
+            k = bisect_right(cum, rand())
+            append(choices[k])
+            following = nexts[k]
+            if following is None:
+                following = nexts[k] = self.node(self.advance(state, choices[k]))
+            node = following
+        return out
+
+    def _sample(self, state, rand):
+        # 以基础权重为提议分布拒绝采样，接受率 = 实际权重 / 基础权重，结果与精确分布一致
+        total = self._cum[-1] if self._cum else 0.0
+        if total > 0:
+            for _ in range(REJECTION_TRIES):
+                i = bisect_right(self._cum, rand() * total)
+                weight = self.weight(state, i)
+                if weight > 0 and rand() * self.base[i] < weight:
+                    return i
+        choices, weights = self._distribution(state)
+        target = rand() * sum(weights)
+        for i, weight in zip(choices, weights):
+            target -= weight
+            if target < 0:
+                return i
+        return choices[-1]
+
+    def walk(self, days, rand):
+        if not self.names:
+            return []
+        if self.use_table:
+            return self._walk_table(days, rand)
+        state = self.initial
+        out = []
+        for _ in range(days):
+            i = self._sample(state, rand)
+            out.append(i)
+            state = self.advance(state, i)
+        return out
+
+
+class MealPlanner:
+    def __init__(self, menu=None, meals=PLAN_MEALS, weights=None, window=REPEAT_WINDOW,
+                 caps=DEFAULT_CAPS, cap_window=CAP_WINDOW, tag_decay=TAG_DECAY):
+        if window < 0 or cap_window < 1:
+            raise ValueError('window 不能为负数，cap_window 至少为 1')
+        if not 0 <= tag_decay <= 1:
+            raise ValueError('tag_decay 应在 [0, 1] 之间')
+        menu = daima.DEFAULT_MENU if menu is None else menu
+        caps = caps or {}
+        self.meals = [meal for meal in meals if meal in menu]
+        self._chains = {meal: _MealChain(weights, window, caps.get(meal), cap_window, tag_decay)
+                        for meal in self.meals}
+        self._extend((meal, dish) for meal in self.meals for dish in menu[meal])
+
+    @classmethod
+    def from_records(cls, records, meals=PLAN_MEALS, **options):
+        # records 为 (餐次, 菜品) 的可迭代对象（例如 daima.iter_menu_dataset），只遍历一遍，
+        # 大数据集不必先整体读进列表
+        planner = cls({meal: () for meal in meals}, meals, **options)
+        planner._extend(records)
+        return planner
+
+    def _extend(self, records):
+        for meal, dish in records:
+            chain = self._chains.get(meal)
+            if chain is not None:
+                chain.add(dish)
+        for chain in self._chains.values():
+            chain.finish()
+
+    def names(self, meal):
+        return self._chains[meal].names
+
+    def plan_indices(self, days, rng=None):
+        # {餐次: [每天的菜品下标]}，下标对应 menu[餐次]
+        rand = (rng or random.Random()).random
+        return {meal: chain.walk(days, rand) for meal, chain in self._chains.items()}
+
+    def plan(self, days, rng=None):
+        # [{餐次: 菜名}]，每天一项
+        indices = self.plan_indices(days, rng)
+        names = {meal: [self.names(meal)[i] for i in picks] for meal, picks in indices.items()}
+        return [{meal: names[meal][day] for meal in self.meals} for day in range(days)]
+
+    def plan_batch(self, users, days, seed=0):
+        # 依次产出 (用户序号, plan_indices)；每个用户的随机数种子由 seed 与序号决定，可单独重算
+        for user in range(users):
+            yield user, self.plan_indices(days, random.Random(f'{seed}/{user}'))
+
+
+def plan_payload(planner, indices, start):
+    # 嵌入 food.js 的格式：dishes 为每个餐次用到的菜名表，days 为每天的菜名下标
+    dishes = {}
+    days = {}
+    for meal, picks in indices.items():
+        used = {}
+        days[meal] = [used.setdefault(i, len(used)) for i in picks]
+        dishes[meal] = [planner.names(meal)[i] for i in used]
+    return {'format': PLAN_FORMAT, 'start': start, 'dishes': dishes, 'days': days}
+
+
+def plan_template_params(payload):
+    return {'meal_plan': daima.menu_index_to_js(payload)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线批量生成每日菜单计划（JSON Lines，每行一个用户）')
+    parser.add_argument('--days', type=int, default=365, help='计划天数（默认 365）')
+    parser.add_argument('--users', type=int, default=1, help='用户数（默认 1）')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子（默认 0）')
+    parser.add_argument('--start', default=time.strftime('%Y-%m-%d'), help='第一天的日期 YYYY-MM-DD（默认今天）')
+    parser.add_argument('--window', type=int, default=REPEAT_WINDOW,
+                        help=f'同一餐次几天内不重复（默认 {REPEAT_WINDOW}）')
+    parser.add_argument('--caps', metavar='CAPS.json',
+                        help='营养上限 JSON：{餐次: {营养项: {等级: 最多几顿}}}，默认晚餐“极高”热量每周最多 1 顿')
+    parser.add_argument('--cap-window', type=int, default=CAP_WINDOW,
+                        help=f'营养上限统计的天数（默认 {CAP_WINDOW}）')
+    parser.add_argument('--weights', metavar='WEIGHTS.json', help='偏好权重 JSON，格式同 store.setPickWeights')
+    parser.add_argument('--out', default='-', help="输出路径（默认 '-' 表示标准输出）")
+    args = parser.parse_args(argv)
+
+    options = {}
+    for name in ('caps', 'weights'):
+        path = getattr(args, name)
+        if path:
+            with open(path, 'r', encoding='utf-8') as f:
+                options[name] = json.load(f)
+    planner = MealPlanner(window=args.window, cap_window=args.cap_window, **options)
+
+    started = time.perf_counter()
+    out = sys.stdout if args.out == '-' else open(args.out, 'w', encoding='utf-8')
+    try:
+        header = {'format': PLAN_FORMAT, 'start': args.start, 'days': args.days, 'seed': args.seed,
+                  'dishes': {meal: planner.names(meal) for meal in planner.meals}}
+        out.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for user, indices in planner.plan_batch(args.users, args.days, args.seed):
+            out.write(json.dumps({'user': user, 'days': indices}, separators=(',', ':')) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"📅 已为 {args.users} 个用户生成 {args.days} 天的菜单计划，"
+          f"用时 {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
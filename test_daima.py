@@ -0,0 +1,681 @@
+import io
+import os
+import json
+import re
+import random
+import zlib
+import hashlib
+import zipfile
+import posixpath
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import daima
+import meal_planner
+
+
+class RawMemberTest(unittest.TestCase):
+    # _write_raw_member / _read_raw_member 依赖 zipfile 内部接口，分别在内部接口与公开接口兜底两条路径上往返
+    DATA = ''.join(f'第 {i} 行：今天吃什么\n' for i in range(400)).encode('utf-8')
+
+    def _write(self, compress_type, level=None):
+        buf = io.BytesIO()
+        raw = daima._compress(self.DATA, compress_type, level)
+        with zipfile.ZipFile(buf, 'w') as zf:
+            zinfo = daima._make_zipinfo('a.txt', (2024, 1, 1, 0, 0, 0), compress_type, reproducible=True)
+            zinfo.file_size = len(self.DATA)
+            zinfo.CRC = zlib.crc32(self.DATA)
+            daima._write_raw_member(zf, zinfo, raw)
+            zf.writestr('b.txt', b'after')
+        return buf, raw
+
+    def _check(self, compress_type, level=None, same_raw=True):
+        buf, raw = self._write(compress_type, level)
+        with zipfile.ZipFile(buf) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('a.txt'), self.DATA)
+            self.assertEqual(zf.read('b.txt'), b'after')
+            if len(self.DATA) > zipfile.ZIP64_LIMIT:
+                # 中央目录带 zip64 扩展字段（头部 ID 0x0001）
+                self.assertEqual(zf.getinfo('a.txt').extra[:2], b'\x01\x00')
+            read = daima._read_raw_member(zf, zf.getinfo('a.txt'))
+        self.assertEqual(daima._decompress(read, compress_type), self.DATA)
+        if same_raw:
+            self.assertEqual(read, raw)
+
+    def _round_trips(self, same_raw=True):
+        self._check(zipfile.ZIP_STORED, same_raw=same_raw)
+        self._check(zipfile.ZIP_DEFLATED, daima.REPRODUCIBLE_COMPRESSLEVEL, same_raw=same_raw)
+        # 调低 ZIP64_LIMIT，让小文件也按 zip64 格式写出本地文件头与中央目录
+        with mock.patch.object(zipfile, 'ZIP64_LIMIT', 1024):
+            self._check(zipfile.ZIP_DEFLATED, daima.REPRODUCIBLE_COMPRESSLEVEL, same_raw=same_raw)
+            self._check(zipfile.ZIP_STORED, same_raw=same_raw)
+
+    def test_internal_round_trip(self):
+        self._round_trips()
+
+    def test_public_api_fallback(self):
+        with mock.patch.object(daima, '_RAW_WRITE_ATTRS', daima._RAW_WRITE_ATTRS + ('_missing',)), \
+                mock.patch.object(daima, '_RAW_READ_ATTRS', daima._RAW_READ_ATTRS + ('_missing',)):
+            self.assertFalse(daima._raw_io_supported(zipfile.ZipFile(io.BytesIO(), 'w')))
+            self._round_trips(same_raw=False)
+
+    def test_unseekable_target(self):
+        class Unseekable(io.RawIOBase):
+            def __init__(self):
+                self.buf = io.BytesIO()
+
+            def writable(self):
+                return True
+
+            def write(self, b):
+                return self.buf.write(b)
+
+        out = Unseekable()
+        with zipfile.ZipFile(out, 'w') as zf:
+            zinfo = daima._make_zipinfo('a.txt', (2024, 1, 1, 0, 0, 0))
+            zinfo.file_size = len(self.DATA)
+            zinfo.CRC = zlib.crc32(self.DATA)
+            daima._write_raw_member(zf, zinfo, daima._compress(self.DATA))
+        with zipfile.ZipFile(io.BytesIO(out.buf.getvalue())) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('a.txt'), self.DATA)
+
+
+class BuildCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+
+    def test_parallel_variants_keep_every_record(self):
+        # 多个进程同时记录输出，不能互相覆盖；第二次构建全部命中，不重写任何压缩包
+        variants = [{'name': os.path.join(self.tmp.name, f'v{i}.zip'), 'params': {'app_title': f'T{i}'}}
+                    for i in range(8)]
+        daima.build_variants(variants, max_workers=4, cache_dir=self.cache_dir)
+        cache = daima.BuildCache(self.cache_dir)
+        self.assertEqual(len(os.listdir(cache.outputs_dir)), len(variants))
+        mtimes = [os.stat(v['name']).st_mtime_ns for v in variants]
+        results = daima.build_variants(variants, max_workers=4, cache_dir=self.cache_dir)
+        self.assertTrue(all(r['ok'] for r in results))
+        self.assertEqual([os.stat(v['name']).st_mtime_ns for v in variants], mtimes)
+
+    def test_variant_output_directory_is_created(self):
+        name = os.path.join(self.tmp.name, 'dist', 'tenant', 'a.zip')
+        results = daima.build_variants([{'name': name}], max_workers=1)
+        self.assertTrue(results[0]['ok'], results[0]['error'])
+        self.assertTrue(zipfile.is_zipfile(name))
+
+    def test_prune_evicts_least_recently_used(self):
+        cache = daima.BuildCache(self.cache_dir)
+        # 按 a、b、c 的顺序写入，之后读取 a，最久未用的就是 b
+        for i, key in enumerate('abc'):
+            cache.store(key, b'x' * 100, 0, 100)
+            os.utime(os.path.join(cache.objects_dir, key), ns=(i * 10 ** 9, i * 10 ** 9))
+        cache.load('a')
+        self.assertEqual(cache.prune(250), (1, 112))
+        self.assertEqual(sorted(os.listdir(cache.objects_dir)), ['a', 'c'])
+        self.assertEqual(cache.prune(0), (2, 224))
+
+
+class HoistSharedRulesTest(unittest.TestCase):
+    # 提取出的公共样式必须仍能被入口 main.js 加载到：在挂载的根组件里，或在入口导入的样式表里
+    MAIN_JS = ("import { createApp } from 'vue'\n"
+               "import App from './src/pages/index/index.vue'\n\n"
+               "createApp(App).mount('#app')\n")
+
+    def _page(self, cls, style_attrs=''):
+        return (f'<template>\n  <view class="{cls} shared dup">x</view>\n</template>\n\n'
+                f'<style{style_attrs}>\n.{cls} {{ color: blue; }}\n.shared {{ color: red; }}\n</style>\n')
+
+    def _file_map(self, root_style_attrs=''):
+        return {
+            'main.js': self.MAIN_JS,
+            # App.vue 不是入口挂载的根组件，它的样式不会被加载
+            'App.vue': '<template><view class="dup"></view></template>\n<style>\n.dup { margin: 0; }\n</style>\n',
+            'src/pages/index/index.vue': self._page('root', root_style_attrs).replace(
+                '</style>', '.dup { margin: 0; }\n</style>'),
+            'src/pages/settings/settings.vue': self._page('settings'),
+            'src/pages/history/history.vue': self._page('history'),
+        }
+
+    def _entry_selectors(self, file_map):
+        # 入口加载到的全部样式：根组件的样式块与 main.js 导入的 .css
+        root = daima._mounted_root(file_map)
+        css = [body for kind, _, body in daima._split_sfc(file_map[root]) if kind == 'style']
+        for spec in re.findall(r"^import '(\./[^']+\.css)'", file_map['main.js'], re.M):
+            css.append(file_map[posixpath.normpath(spec)])
+        rules, _ = daima.parse_css(daima._strip_css_comments(''.join(css)))
+        return {daima._minify_prelude(prelude) for prelude, _ in rules}
+
+    def test_hoists_into_mounted_root(self):
+        stats = {}
+        result = daima.optimize_file_map(self._file_map(), stats=stats)
+        self.assertGreater(stats['hoisted'], 0)
+        self.assertLessEqual({'.shared', '.dup'}, self._entry_selectors(result))
+        self.assertNotIn('.shared', result['src/pages/settings/settings.vue'])
+        self.assertNotIn(daima.SHARED_STYLE_PATH, result)
+
+    def test_hoists_into_imported_stylesheet(self):
+        # 根组件只有 scoped 样式时，公共规则放进独立样式表并由 main.js 导入
+        stats = {}
+        result = daima.optimize_file_map(self._file_map(' scoped'), stats=stats)
+        self.assertGreater(stats['hoisted'], 0)
+        self.assertIn(daima.SHARED_STYLE_PATH, result)
+        self.assertIn("import './src/styles/shared.css'", result['main.js'])
+        self.assertLessEqual({'.shared', '.dup'}, self._entry_selectors(result))
+
+    def test_keeps_root_cascade(self):
+        # 根组件自己的 .title 规则不能被其他页面提取上来的同选择器规则覆盖
+        file_map = self._file_map()
+        file_map['src/pages/index/index.vue'] = file_map['src/pages/index/index.vue'].replace(
+            '</style>', '.title { color: red; }\n</style>')
+        for path in ('src/pages/settings/settings.vue', 'src/pages/history/history.vue'):
+            file_map[path] = file_map[path].replace('shared dup', 'shared dup title').replace(
+                '</style>', '.title { color: blue; }\n</style>')
+        result = daima.optimize_file_map(file_map)
+        self.assertNotIn('.title{color:blue}', result['src/pages/index/index.vue'])
+        self.assertIn('.title{color:blue}', result['src/pages/settings/settings.vue'])
+        self.assertIn('.shared{color:red}', result['src/pages/index/index.vue'])
+
+    def test_default_project(self):
+        file_map = daima.get_file_mapping()
+        optimized = daima.optimize_file_map(file_map, prune=False)
+        self.assertLessEqual(self._entry_selectors(file_map), self._entry_selectors(optimized))
+
+
+class PruneCssTest(unittest.TestCase):
+    def _optimize(self, template):
+        page = (f'<template>\n{template}\n</template>\n\n'
+                '<style scoped>\n.lvl-high { color: red; }\n.tone-dark { color: black; }\n.unused { color: blue; }\n</style>\n')
+        stats = {}
+        result = daima.optimize_file_map({'src/pages/index/index.vue': page}, hoist=False, stats=stats)
+        return result['src/pages/index/index.vue'], stats
+
+    def test_keeps_dynamic_classes(self):
+        css, stats = self._optimize('''  <view :class="'lvl-' + level" v-bind:class="`tone-${tone}`">x</view>''')
+        self.assertIn('.lvl-high', css)
+        self.assertIn('.tone-dark', css)
+        self.assertNotIn('.unused', css)
+        self.assertEqual(stats['pruned'], 1)
+
+    def test_prunes_without_binding(self):
+        css, stats = self._optimize('''  <view class="lvl-">x</view>''')
+        self.assertNotIn('.lvl-high', css)
+        self.assertEqual(stats['pruned'], 3)
+
+
+class IntegrityTest(unittest.TestCase):
+    FILE_MAP = {'a.txt': 'alpha\n' * 100, 'b/c.js': 'export const c = 1\n'}
+
+    def _lying_bundle(self):
+        # 改动 a.txt，内嵌清单中的大小与 CRC 跟着改，SHA-256 仍是原来的
+        buf = io.BytesIO()
+        summary = daima.write_zip(buf, self.FILE_MAP, reproducible=True)
+        entries = summary['integrity']['members']
+        tampered = b'omega\n' * 100
+        entries[0].update(size=len(tampered), crc=f'{zlib.crc32(tampered):08x}')
+        out = io.BytesIO()
+        with zipfile.ZipFile(buf) as src, zipfile.ZipFile(out, 'w') as dst:
+            for zinfo in src.infolist():
+                if zinfo.filename == 'a.txt':
+                    dst.writestr(zinfo, tampered)
+                elif zinfo.filename == daima.INTEGRITY_MANIFEST:
+                    dst.writestr(zinfo, daima._integrity_bytes(entries))
+                else:
+                    dst.writestr(zinfo, src.read(zinfo))
+        out.seek(0)
+        return out, tampered
+
+    def test_bundle_manifest_hashes_content(self):
+        bundle, tampered = self._lying_bundle()
+        self.assertEqual(daima.bundle_manifest(bundle)['a.txt']['sha256'], hashlib.sha256(tampered).hexdigest())
+
+    def test_verify_bundle(self):
+        buf = io.BytesIO()
+        daima.write_zip(buf, self.FILE_MAP)
+        self.assertEqual(daima.verify_bundle(buf), [])
+        bundle, _ = self._lying_bundle()
+        self.assertEqual(daima.verify_bundle(bundle, deep=False), [])
+        self.assertEqual(len(daima.verify_bundle(bundle)), 1)
+
+    def test_manifest_follows_compression(self):
+        # 清单与其他文本成员一样按压缩策略写入，而不是固定 deflate 级别 6
+        for spec in ('stored', 'lzma', 'max'):
+            buf = io.BytesIO()
+            daima.write_zip(buf, self.FILE_MAP, compression=spec, reproducible=True)
+            with zipfile.ZipFile(buf) as zf:
+                zinfo = zf.getinfo(daima.INTEGRITY_MANIFEST)
+                compress_type, level = daima.CompressionPolicy(spec).for_member('a.txt', True)
+                self.assertEqual(zinfo.compress_type, compress_type)
+                raw = daima._read_raw_member(zf, zinfo)
+                self.assertEqual(raw, daima._compress(zf.read(zinfo), compress_type, level))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'a.zip')
+            daima._zip_via_temp_dir(self.FILE_MAP, path, os.path.join(tmp, 'work'),
+                                    daima.CompressionPolicy('stored'))
+            with zipfile.ZipFile(path) as zf:
+                self.assertEqual(zf.getinfo(daima.INTEGRITY_MANIFEST).compress_type, zipfile.ZIP_STORED)
+
+
+class DeltaTest(unittest.TestCase):
+    FILE_MAP = {f'src/page{i}.js': f'// page {i}\n' + 'export const x = 1\n' * 200 for i in range(5)}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def _build(self, name, file_map, reproducible=True):
+        path = self._path(name)
+        daima.generate_and_zip_project(file_map, zip_filename=path, reproducible=reproducible, verbose=False)
+        return path
+
+    def _delta(self):
+        target_map = dict(self.FILE_MAP, **{'src/page2.js': self.FILE_MAP['src/page2.js'] + '// changed\n'})
+        base = self._build('base.zip', self.FILE_MAP)
+        target = self._build('target.zip', target_map)
+        delta = self._path('update.delta')
+        daima.build_delta(base, target, delta)
+        return base, target, delta
+
+    def test_same_base_is_byte_identical(self):
+        base, target, delta = self._delta()
+        result = daima.apply_delta(base, delta, self._path('out.zip'))
+        self.assertTrue(result['identical'])
+
+    def test_repacked_base(self):
+        # 同一份源文件重新打包：成员顺序不同、非可复现，内嵌的完整性清单与原基础包不同
+        _, target, delta = self._delta()
+        repacked = self._build('repacked.zip', dict(reversed(list(self.FILE_MAP.items()))), reproducible=False)
+        out = self._path('out.zip')
+        daima.apply_delta(repacked, delta, out)
+        self.assertEqual(daima._members_digest(daima.bundle_manifest(out)),
+                         daima._members_digest(daima.bundle_manifest(target)))
+        self.assertEqual(daima.verify_bundle(out), [])
+        with open(daima.integrity_sidecar_path(out), 'rb') as f:
+            self.assertEqual(f.read(), zipfile.ZipFile(out).read(daima.INTEGRITY_MANIFEST))
+
+    def test_mismatched_base(self):
+        _, _, delta = self._delta()
+        other = self._build('other.zip', dict(self.FILE_MAP, **{'src/page2.js': '// other\n'}))
+        with self.assertRaises(daima.DeltaError):
+            daima.apply_delta(other, delta, self._path('out.zip'))
+
+
+class FenwickSamplerTest(unittest.TestCase):
+    def _counts(self, sampler, n=10000):
+        # 在 [0, 1) 上均匀取 n 个点，每个下标被抽中的次数应与权重成正比
+        counts = [0] * len(sampler)
+        for i in range(n):
+            counts[sampler.sample((i + 0.5) / n)] += 1
+        return counts
+
+    def _assert_proportional(self, sampler, weights, n=10000):
+        total = sum(weights)
+        for count, weight in zip(self._counts(sampler, n), weights):
+            self.assertAlmostEqual(count, n * weight / total, delta=1)
+
+    def test_distribution(self):
+        weights = [1, 2, 3, 0, 4]
+        sampler = daima.FenwickSampler(weights)
+        self.assertEqual(sampler.total(), 10)
+        self._assert_proportional(sampler, weights)
+        self.assertEqual(self._counts(sampler)[3], 0)
+
+    def test_updates(self):
+        rng = random.Random(7)
+        weights = [rng.randint(0, 5) for _ in range(37)]
+        sampler = daima.FenwickSampler(weights)
+        for _ in range(200):
+            if rng.random() < 0.3:
+                weights.append(rng.randint(0, 5))
+                sampler.append(weights[-1])
+            else:
+                position = rng.randrange(len(weights))
+                weights[position] = rng.randint(0, 5)
+                sampler.set(position, weights[position])
+            self.assertEqual(sampler.total(), sum(weights))
+        self._assert_proportional(sampler, weights)
+
+    def test_all_zero(self):
+        self.assertEqual(daima.FenwickSampler([0, 0]).sample(0.5), -1)
+        self.assertEqual(daima.FenwickSampler().sample(0.5), -1)
+
+    def test_picker_skips_recent(self):
+        window = daima.RECENT_SIZE + 1
+        menu = {'lunch': [{'name': f'菜{i}'} for i in range(window)]}
+        picker = daima.FoodPicker(menu, rng=random.Random(1))
+        picks = [picker.pick('lunch')['name'] for _ in range(50)]
+        # 最近 RECENT_SIZE 次选过的菜不会再选到：任意连续 window 次都各不相同
+        for i in range(len(picks) - window + 1):
+            self.assertEqual(len(set(picks[i:i + window])), window)
+        # 候选都在最近列表中时退回等概率选择，仍然有结果
+        small = daima.FoodPicker({'lunch': [{'name': '甲'}]}, rng=random.Random(1))
+        self.assertEqual([small.pick('lunch')['name'] for _ in range(3)], ['甲'] * 3)
+
+
+class ShoppingListTest(unittest.TestCase):
+    DISHES = [
+        {'name': '番茄炒蛋', 'materials': ['番茄', '鸡蛋', '适量 盐', '鸡蛋']},
+        {'name': '蛋炒饭', 'materials': ['鸡蛋', '米饭', '葱']},
+        {'name': '葱油面', 'materials': ['面条', ' 葱 ']},
+    ]
+
+    @staticmethod
+    def _summary(shopping):
+        # 来源菜品按加入顺序排列，与加入 / 移除的历史有关，这里只比较集合
+        return [(item['name'], item['count'], sorted(item['dishes'])) for item in shopping.items()]
+
+    def test_aggregates(self):
+        items = {item['name']: item for item in daima.ShoppingList(self.DISHES).items()}
+        # 同一道菜里重复的食材只算一次，用量前缀与空白被规范化掉
+        self.assertEqual(items['鸡蛋']['count'], 2)
+        self.assertEqual(items['鸡蛋']['dishes'], ['番茄炒蛋', '蛋炒饭'])
+        self.assertEqual(items['葱']['count'], 2)
+        self.assertIn('盐', items)
+
+    def test_incremental_add_and_remove(self):
+        rng = random.Random(3)
+        shopping = daima.ShoppingList()
+        added = []
+        for _ in range(200):
+            if added and rng.random() < 0.4:
+                dish = added.pop(rng.randrange(len(added)))
+                self.assertTrue(shopping.remove(dish['name']))
+            else:
+                dish = rng.choice(self.DISHES)
+                added.append(dish)
+                shopping.add(dish)
+            self.assertEqual(shopping.dish_count, len(added))
+            # 与从头逐个加入得到的清单一致
+            self.assertEqual(self._summary(shopping), self._summary(daima.ShoppingList(added)))
+        self.assertFalse(daima.ShoppingList().remove('番茄炒蛋'))
+
+    def test_remove_uses_materials_when_added(self):
+        dish = dict(self.DISHES[0])
+        shopping = daima.ShoppingList([dish])
+        dish['materials'] = ['别的']
+        shopping.remove(dish['name'])
+        self.assertEqual(shopping.items(), [])
+
+
+class MenuCompactTest(unittest.TestCase):
+    def test_round_trip_default_menu(self):
+        payload = daima.encode_menu_compact(daima.DEFAULT_MENU)
+        self.assertEqual(payload['format'], daima.MENU_COMPACT_FORMAT)
+        self.assertEqual(daima.decode_menu_compact(payload), daima.DEFAULT_MENU)
+
+    def test_round_trip_edge_cases(self):
+        menu = {
+            'breakfast': [
+                {'name': '白粥', 'materials': [], 'nutrition': {}, 'tags': []},
+                # 重复的食材与部分营养项缺失
+                {'name': '葱油饼', 'materials': ['面粉', '葱', '葱'], 'nutrition': {'fat': '高'}, 'tags': ['葱']},
+                {'name': '豆浆', 'materials': ['黄豆'], 'nutrition': {'calorie': '低', 'protein': '中'}, 'tags': []},
+            ],
+            'lunch': [],
+        }
+        payload = json.loads(json.dumps(daima.encode_menu_compact(menu)))
+        self.assertEqual(daima.decode_menu_compact(payload), menu)
+
+    def test_passes_through_plain_menus(self):
+        self.assertIs(daima.decode_menu_compact(daima.DEFAULT_MENU), daima.DEFAULT_MENU)
+        self.assertIsNone(daima.decode_menu_compact(None))
+
+
+class MenuDatasetTest(unittest.TestCase):
+    DISHES = [
+        {'meal': 'lunch', 'name': '宫保鸡丁', 'materials': ['鸡腿肉', '花生米'],
+         'nutrition': {'calorie': '高', 'protein': '高', 'fat': '中'}, 'tags': ['川菜'], 'price': 12345},
+        {'meal': 'dinner', 'name': 'say "hi"\\', 'materials': ['\u8471'], 'nutrition': {'calorie': '低', 'protein': '低', 'fat': '低'},
+         'tags': [], 'price': 1.5e3},
+        {'meal': 'lunch', 'name': '宫保鸡丁', 'materials': [], 'nutrition': {'calorie': '低', 'protein': '低', 'fat': '低'},
+         'tags': []},
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_stream_reader_chunk_boundaries(self):
+        # 每一种块大小下，数字、转义字符串、多字节字符都会在某个位置被切开，结果必须与一次性解析相同
+        text = ' [ ' + ' , '.join(json.dumps(d, ensure_ascii=False) for d in self.DISHES) + ' , 7, 123456789 ] '
+        expected = json.loads(text)
+        for chunk_size in range(1, len(text) + 2):
+            reader = daima._JsonStreamReader(io.StringIO(text), chunk_size=chunk_size)
+            self.assertEqual(list(reader.iter_array()), expected, chunk_size)
+
+    def test_stream_reader_object_arrays(self):
+        menu = {'lunch': [1, 22, 333], 'dinner': [], 'breakfast': [{'a': [4444]}]}
+        text = json.dumps(menu, ensure_ascii=False, indent=1)
+        expected = [(meal, item) for meal, items in menu.items() for item in items]
+        for chunk_size in range(1, len(text) + 2):
+            reader = daima._JsonStreamReader(io.StringIO(text), chunk_size=chunk_size)
+            self.assertEqual(list(reader.iter_object_arrays()), expected, chunk_size)
+
+    def test_stream_reader_errors(self):
+        for text in ('[1, 2', '[1 2]', '[{"a": 1]', ''):
+            with self.assertRaises(daima.MenuDataError, msg=text):
+                list(daima._JsonStreamReader(io.StringIO(text), chunk_size=2).iter_array())
+        with self.assertRaises(daima.MenuDataError):
+            list(daima._JsonStreamReader(io.StringIO('{"lunch": [1]'), chunk_size=2).iter_object_arrays())
+
+    def test_iter_menu_dataset(self):
+        path = self._write('menu.json', json.dumps(self.DISHES + [{'meal': 'lunch', 'name': ''}], ensure_ascii=False))
+        stats = {}
+        dishes = list(daima.iter_menu_dataset(path, skip_invalid=True, stats=stats))
+        # 同一餐次重名时保留第一条；多余字段被丢弃
+        self.assertEqual([(meal, dish['name']) for meal, dish in dishes], [('lunch', '宫保鸡丁'), ('dinner', 'say "hi"\\')])
+        self.assertEqual(dishes[0][1]['materials'], ['鸡腿肉', '花生米'])
+        self.assertNotIn('price', dishes[0][1])
+        self.assertEqual(stats, {'records': 4, 'dishes': 2, 'duplicates': 1, 'invalid': 1})
+        with self.assertRaises(daima.MenuDataError):
+            list(daima.iter_menu_dataset(path))
+
+    def test_formats_agree(self):
+        jsonl = self._write('menu.jsonl', ''.join(json.dumps(d, ensure_ascii=False) + '\n' for d in self.DISHES))
+        grouped = {}
+        for dish in self.DISHES:
+            grouped.setdefault(dish['meal'], []).append({k: v for k, v in dish.items() if k != 'meal'})
+        by_meal = self._write('menu.json', json.dumps(grouped, ensure_ascii=False))
+        self.assertEqual(sorted(map(str, daima.iter_menu_dataset(jsonl))), sorted(map(str, daima.iter_menu_dataset(by_meal))))
+
+
+class MealPlannerTest(unittest.TestCase):
+    DAYS = 120
+
+    @staticmethod
+    def _menu(size):
+        # 每 4 道菜里有一道“极高”热量，标签在几个值之间轮换
+        return {meal: [{'name': f'{meal}{i}', 'materials': [], 'tags': [f'tag{i % 3}'],
+                        'nutrition': {'calorie': '极高' if i % 4 == 0 else '中'}} for i in range(size)]
+                for meal in meal_planner.PLAN_MEALS}
+
+    def _check_invariants(self, planner, menu, window, caps, cap_window):
+        indices = planner.plan_indices(self.DAYS, random.Random(5))
+        for meal, picks in indices.items():
+            self.assertEqual(len(picks), self.DAYS)
+            # 任意连续 window + 1 天内同一餐次不重复
+            for day in range(self.DAYS - window):
+                self.assertEqual(len(set(picks[day:day + window + 1])), window + 1, (meal, day))
+            # 任意连续 cap_window 天内命中上限规则的顿数不超过上限
+            for key, levels in (caps.get(meal) or {}).items():
+                for level, limit in levels.items():
+                    hits = [menu[meal][i]['nutrition'].get(key) == level for i in picks]
+                    for day in range(self.DAYS - cap_window + 1):
+                        self.assertLessEqual(sum(hits[day:day + cap_window]), limit, (meal, day))
+
+    def test_constraints_table(self):
+        menu = self._menu(12)
+        caps = {'dinner': {'calorie': {'极高': 1}}, 'lunch': {'calorie': {'极高': 2}}}
+        planner = meal_planner.MealPlanner(menu, window=3, caps=caps, cap_window=7)
+        self.assertTrue(all(chain.use_table for chain in planner._chains.values()))
+        self._check_invariants(planner, menu, 3, caps, 7)
+
+    def test_constraints_rejection_sampling(self):
+        menu = self._menu(meal_planner.TABLE_MAX_DISHES + 36)
+        caps = {'dinner': {'calorie': {'极高': 1}}}
+        planner = meal_planner.MealPlanner(menu, window=5, caps=caps, cap_window=7)
+        self.assertFalse(any(chain.use_table for chain in planner._chains.values()))
+        self._check_invariants(planner, menu, 5, caps, 7)
+
+    def test_zero_weight_never_planned(self):
+        menu = self._menu(10)
+        planner = meal_planner.MealPlanner(menu, window=1, weights={'tags': {'tag0': 0}})
+        for meal, picks in planner.plan_indices(self.DAYS, random.Random(1)).items():
+            self.assertFalse(any(menu[meal][i]['tags'] == ['tag0'] for i in picks))
+
+    def test_from_records_matches_menu(self):
+        menu = self._menu(20)
+        records = ((meal, dish) for meal, dishes in menu.items() for dish in dishes)
+        streamed = meal_planner.MealPlanner.from_records(records)
+        loaded = meal_planner.MealPlanner(menu)
+        self.assertEqual(streamed.plan(30, random.Random(9)), loaded.plan(30, random.Random(9)))
+        self.assertEqual(list(streamed.plan_batch(2, 10, seed=4)), list(loaded.plan_batch(2, 10, seed=4)))
+
+
+class SizeBudgetTest(unittest.TestCase):
+    FILE_MAP = {
+        'main.js': 'console.log(1)\n' * 50,
+        'src/pages/index/index.vue': ('<template>\n  <view>x</view>\n</template>\n<script>\nexport default {}\n</script>\n'
+                                      '<style>\n.a { color: red; }\n</style>\n'),
+    }
+
+    def _report(self):
+        return daima.size_report(self.FILE_MAP, dist_dir=None, use_brotli=False)
+
+    def test_report_matches_archive(self):
+        # deflate 列与可复现压缩包中的成员压缩后大小一致
+        report = self._report()
+        buf = io.BytesIO()
+        daima.write_zip(buf, self.FILE_MAP, reproducible=True, integrity=False)
+        with zipfile.ZipFile(buf) as zf:
+            for zinfo in zf.infolist():
+                self.assertEqual(report['members'][zinfo.filename]['deflate'], zinfo.compress_size)
+        self.assertEqual(set(report['sections']['src/pages/index/index.vue']), {'template', 'script', 'style'})
+        self.assertIsNone(report['total']['brotli'])
+
+    def test_violations(self):
+        report = self._report()
+        raw = report['members']['main.js']['raw']
+        budget = {
+            'total': {'raw': report['total']['raw'] - 1, 'brotli': 1},
+            'members': {'*.js': {'raw': raw}, 'src/**': {'deflate': 1}},
+            'sections': {'*.vue': {'style': {'raw': 1}, 'missing': {'raw': 1}}},
+        }
+        violations = daima.check_size_budget(report, budget)
+        # 恰好等于上限不算超出；没有统计的 brotli 不检查；不存在的区块跳过
+        self.assertEqual(sorted(name for name, *_ in violations),
+                         ['src/pages/index/index.vue', 'src/pages/index/index.vue <style>', 'total'])
+        self.assertEqual(daima.check_size_budget(report, {}), [])
+        with self.assertRaises(ValueError):
+            daima.check_size_budget(report, {'total': {'gzip': 1}})
+
+    def test_diff(self):
+        previous = self._report()
+        file_map = dict(self.FILE_MAP, **{'new.js': 'x'})
+        del file_map['main.js']
+        changes = {name: (old, new) for name, old, new in
+                   daima.diff_size_reports(previous, daima.size_report(file_map, dist_dir=None, use_brotli=False))}
+        self.assertIsNone(changes['main.js'][1])
+        self.assertIsNone(changes['new.js'][0])
+        self.assertIn('total', changes)
+
+    def test_budget_blocks_build(self):
+        # 超出预算时不打包，以非 0 状态退出
+        with tempfile.TemporaryDirectory() as tmp:
+            budget = os.path.join(tmp, 'budget.json')
+            with open(budget, 'w', encoding='utf-8') as f:
+                json.dump({'total': {'raw': 1}}, f)
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                with mock.patch('sys.stderr', io.StringIO()) as err:
+                    self.assertEqual(daima.main(['--size-budget', budget, '--size-report']), 1)
+            finally:
+                os.chdir(cwd)
+            self.assertIn('超出体积预算', err.getvalue())
+            self.assertFalse(os.path.exists(os.path.join(tmp, daima.ZIP_FILENAME)))
+            self.assertTrue(os.path.exists(os.path.join(tmp, daima.SIZE_REPORT_PATH)))
+
+
+class IterZipChunksTest(unittest.TestCase):
+    FILE_MAP = {f'src/{i}.js': f'export default {i}\n' * 200 for i in range(5)}
+
+    def test_matches_write_zip(self):
+        buf = io.BytesIO()
+        daima.write_zip(buf, self.FILE_MAP, reproducible=True)
+        self.assertEqual(b''.join(daima.iter_zip_chunks(self.FILE_MAP, chunk_size=100, reproducible=True)),
+                         buf.getvalue())
+
+    def test_cancel_between_members(self):
+        cancel = threading.Event()
+        chunks = daima.iter_zip_chunks(self.FILE_MAP, chunk_size=1, cancel_event=cancel)
+        next(chunks)
+        cancel.set()
+        with self.assertRaises(daima.BuildCancelled):
+            for _ in chunks:
+                pass
+
+
+class ReproducibleTest(unittest.TestCase):
+    FILE_MAP = {
+        'pages.json': '{"pages": []}\r\n',
+        'main.js': 'import App from "./App"\n' * 20,
+        'src/pages/index/index.vue': '<template>\n  <view>x</view>\n</template>\n',
+    }
+
+    def _build(self, path, file_map, now):
+        with mock.patch('time.time', return_value=now):
+            daima.generate_and_zip_project(file_map, zip_filename=path, verbose=False, reproducible=True)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_byte_identical(self):
+        # 不同时刻、不同插入顺序、不同 umask 的两次构建逐字节相同
+        with tempfile.TemporaryDirectory() as tmp:
+            first = self._build(os.path.join(tmp, 'a.zip'), self.FILE_MAP, 1_000_000_000)
+            old_umask = os.umask(0o077)
+            try:
+                second = self._build(os.path.join(tmp, 'b.zip'), dict(reversed(list(self.FILE_MAP.items()))),
+                                     1_700_000_000)
+            finally:
+                os.umask(old_umask)
+            self.assertEqual(first, second)
+            self.assertEqual(daima.file_sha256(os.path.join(tmp, 'a.zip')),
+                             daima.file_sha256(os.path.join(tmp, 'b.zip')))
+            with zipfile.ZipFile(io.BytesIO(first)) as zf:
+                names = [zinfo.filename for zinfo in zf.infolist() if zinfo.filename != daima.INTEGRITY_MANIFEST]
+                self.assertEqual(names, sorted(self.FILE_MAP))
+                # 可复现模式不转换换行符
+                self.assertEqual(zf.read('pages.json'), b'{"pages": []}\r\n')
+
+    def test_source_date_epoch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'a.zip')
+            default = self._build(path, self.FILE_MAP, 1_000_000_000)
+            with mock.patch.dict(os.environ, {'SOURCE_DATE_EPOCH': '1700000000'}):
+                pinned = self._build(path, self.FILE_MAP, 1_000_000_000)
+            self.assertNotEqual(default, pinned)
+
+    def test_rejects_temp_dir(self):
+        with self.assertRaises(ValueError):
+            daima.generate_and_zip_project(self.FILE_MAP, use_temp_dir=True, reproducible=True, verbose=False)
+        with mock.patch('sys.stderr', io.StringIO()) as err, self.assertRaises(SystemExit):
+            daima.main(['--reproducible', '--use-temp-dir'])
+        self.assertIn('--use-temp-dir', err.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()